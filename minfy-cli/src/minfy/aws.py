@@ -0,0 +1,111 @@
+"""
+Shared AWS session and clients.
+
+All commands get their clients from here, so the credentials saved by
+`minfy auth` are honoured everywhere and each client is built once per
+process. The session comes from `.minfy/config.yaml` (its profile when that
+profile exists locally, otherwise its keys) or, without one, from boto3's
+default credential chain. Clients are cached per service and region. Their
+connection pool is sized for the caller's worker pool, and they use adaptive
+retries so throttling backs off instead of failing.
+
+S3-compatible stand-ins (MinIO, LocalStack) are reached by setting
+`endpoint_url` in the global config or `MINFY_ENDPOINT_URL`.
+"""
+import os
+import threading
+
+import boto3
+from botocore.config import Config
+
+from .config import load_global
+
+DEFAULT_REGION = "ap-south-1"
+# older regions name their website endpoint s3-website-<region> instead of s3-website.<region>
+DASH_WEBSITE_REGIONS = {"us-east-1", "us-west-1", "us-west-2", "ap-southeast-1", "ap-southeast-2",
+                        "ap-northeast-1", "eu-west-1", "sa-east-1", "us-gov-west-1"}
+DEFAULT_POOL = 32
+RETRIES = {"max_attempts": 10, "mode": "adaptive"}
+
+_lock = threading.Lock()
+_session: boto3.Session | None = None
+_clients: dict[tuple[str, str], tuple[int, object]] = {}
+
+
+def region() -> str:
+    """`AWS_REGION`/`AWS_DEFAULT_REGION` first, as in the AWS CLI, then the saved config."""
+    cfg = load_global()
+    return (os.environ.get("AWS_REGION") or os.environ.get("AWS_DEFAULT_REGION")
+            or getattr(cfg, "region", None) or DEFAULT_REGION)
+
+
+def website_url(bucket: str, region_name: str) -> str:
+    sep = "-" if region_name in DASH_WEBSITE_REGIONS else "."
+    return f"http://{bucket}.s3-website{sep}{region_name}.amazonaws.com"
+
+
+def bucket_location(region_name: str) -> dict:
+    """`create_bucket` arguments for `region_name`; us-east-1 rejects an explicit LocationConstraint."""
+    if region_name == "us-east-1":
+        return {}
+    return {"CreateBucketConfiguration": {"LocationConstraint": region_name}}
+
+
+def endpoint_url() -> str | None:
+    cfg = load_global()
+    return os.environ.get("MINFY_ENDPOINT_URL") or getattr(cfg, "endpoint_url", None)
+
+
+def session() -> boto3.Session:
+    global _session
+    with _lock:
+        if _session is None:
+            cfg = load_global()
+            if cfg is None:
+                _session = boto3.Session(region_name=region())
+            elif cfg.profile and cfg.profile in boto3.Session().available_profiles:
+                _session = boto3.Session(profile_name=cfg.profile, region_name=region())
+            else:
+                _session = boto3.Session(
+                    aws_access_key_id=cfg.access_key,
+                    aws_secret_access_key=cfg.secret_key,
+                    aws_session_token=cfg.session_token,
+                    region_name=region(),
+                )
+        return _session
+
+
+def client(service: str = "s3", region_name: str | None = None, max_pool: int = DEFAULT_POOL):
+    """Cached client for `service`; rebuilt only if a caller needs a larger connection pool."""
+    sess = session()
+    region_name = region_name or sess.region_name or DEFAULT_REGION
+    key = (service, region_name)
+    with _lock:
+        cached = _clients.get(key)
+        if cached and cached[0] >= max_pool:
+            return cached[1]
+        pool = max(max_pool, cached[0] if cached else 0, 10)
+        options = {"max_pool_connections": pool, "retries": RETRIES}
+        endpoint = endpoint_url() if service == "s3" else None
+        if endpoint:
+            # stand-ins rarely resolve virtual-hosted bucket names
+            options["s3"] = {"addressing_style": "path"}
+        new = sess.client(service, region_name=region_name, endpoint_url=endpoint,
+                          config=Config(**options))
+        _clients[key] = (pool, new)
+        return new
+
+
+def credentials_env() -> dict[str, str]:
+    """The session's credentials as environment variables, for Terraform and other tools."""
+    sess = session()
+    env = {"AWS_REGION": sess.region_name or DEFAULT_REGION,
+           "AWS_DEFAULT_REGION": sess.region_name or DEFAULT_REGION}
+    creds = sess.get_credentials()
+    if creds is None:
+        return env
+    frozen = creds.get_frozen_credentials()
+    env |= {"AWS_ACCESS_KEY_ID": frozen.access_key, "AWS_SECRET_ACCESS_KEY": frozen.secret_key}
+    if frozen.token:
+        env["AWS_SESSION_TOKEN"] = frozen.token
+    return env
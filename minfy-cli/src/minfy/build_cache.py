@@ -0,0 +1,228 @@
+"""
+Content-addressed cache of build output.
+
+The key covers the git trees of the app folder and of the local packages it
+depends on (see `mirrors.sparse_paths`), the files at the repository root
+(lockfiles, workspace manifests), the resolved build env vars, the build plan
+and the builder (Dockerfile or Node version). The value is the packed
+output folder, kept under `.minfy/cache/builds` with LRU eviction and optionally
+mirrored to a shared S3 prefix so CI runners can reuse each other's builds:
+
+    "build_cache": {"max_entries": 10, "s3": "s3://my-ci-cache/minfy"}
+
+Hits and eviction take a lock on the cache folder, and entries used in the
+last `EVICT_MIN_AGE` seconds are never evicted: another deploy may still be
+uploading from them.
+"""
+import contextlib
+import hashlib
+import json
+import os
+import posixpath
+import shutil
+import subprocess
+import tarfile
+import threading
+import time
+from pathlib import Path
+
+import click
+
+from .aws import client
+from .config import HOME_DIR
+from .mirrors import sparse_paths
+
+try:
+    import fcntl
+except ImportError:  # Windows: only deploys within one process are serialised
+    fcntl = None
+
+CACHE_DIR = HOME_DIR / "cache" / "builds"
+LOCK_FILE = CACHE_DIR / "cache.lock"
+EVICT_MIN_AGE = 3600
+DEFAULT_BUILD_CACHE = {"enabled": True, "max_entries": 10, "s3": None}
+# build.json blocks that only affect the upload, not what the build produces
+UPLOAD_SETTINGS = ("transfer", "compression", "cache_control", "build_cache")
+_thread_lock = threading.Lock()
+
+
+def _git(repo: Path, *args: str) -> str:
+    return subprocess.check_output(["git", "-C", str(repo), *args], text=True,
+                                   stderr=subprocess.DEVNULL).strip()
+
+
+def source_tree(repo: Path, subdir: str, ignore: tuple[str, ...] = ()) -> str | None:
+    """Git tree hash of `subdir`, or None when it has uncommitted changes outside `ignore`."""
+    rel = "" if subdir in ("", ".") else subdir.strip("/")
+    excludes = [f":(exclude){(Path(rel) / p).as_posix()}" for p in ("node_modules", *ignore)]
+    try:
+        if _git(repo, "status", "--porcelain", "--", rel or ".", *excludes):
+            return None
+        return _git(repo, "rev-parse", f"HEAD:{rel}")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def root_files(repo: Path) -> dict[str, str] | None:
+    """Blob ids of the files at the repository root, or None when one of them has uncommitted changes."""
+    try:
+        if _git(repo, "status", "--porcelain", "--", ":(top,glob)*"):
+            return None
+        entries = _git(repo, "ls-tree", "HEAD").splitlines()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    files = {}
+    for entry in entries:
+        meta, _, name = entry.partition("\t")
+        _, kind, oid = meta.split()
+        if kind == "blob":
+            files[name] = oid
+    return files
+
+
+@contextlib.contextmanager
+def _locked():
+    """Exclusive use of the cache folder, across threads and processes."""
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    with _thread_lock, open(LOCK_FILE, "a") as fh:
+        if fcntl:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+def _builder_id(project_path: Path, use_docker: bool) -> str:
+    if use_docker:
+        dockerfile = project_path / "Dockerfile.build"
+        return "docker:" + (hashlib.sha256(dockerfile.read_bytes()).hexdigest()
+                            if dockerfile.exists() else "none")
+    try:
+        return "node:" + subprocess.check_output(["node", "--version"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "node:unknown"
+
+
+def build_key(project_info: dict, build_plan: dict, env_vars: dict, use_docker: bool) -> str | None:
+    repo, app = Path(project_info["local_path"]), project_info["app_subdir"]
+    tree = source_tree(repo, app, (build_plan.get("output_dir", ""),))
+    if tree is None:
+        return None
+    # workspace and file: packages the app builds against; None when the app is the whole repo
+    deps = sparse_paths(repo, "HEAD", [app], tuple(project_info.get("sparse_paths") or ())) or []
+    trees = {}
+    for path in deps:
+        if path != posixpath.normpath(app):
+            trees[path] = source_tree(repo, path) if (repo / path).exists() else "absent"
+            if trees[path] is None:
+                return None
+    root = root_files(repo)
+    if root is None:
+        return None
+    project_path = repo / app
+    payload = json.dumps({
+        "tree": tree,
+        "deps": trees,
+        "root": root,
+        "env": env_vars,
+        "plan": {k: v for k, v in build_plan.items() if k not in UPLOAD_SETTINGS},
+        "builder": _builder_id(project_path, use_docker),
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class BuildCache:
+    def __init__(self, settings: dict | None = None):
+        cfg = {**DEFAULT_BUILD_CACHE, **(settings or {})}
+        self.enabled = bool(cfg["enabled"])
+        self.max_entries = max(1, int(cfg["max_entries"]))
+        self.s3_uri = cfg["s3"]
+
+    def _archive(self, key: str) -> Path:
+        return CACHE_DIR / f"{key}.tar.gz"
+
+    def _unpacked(self, key: str) -> Path:
+        return CACHE_DIR / "out" / key
+
+    def _s3_location(self, key: str) -> tuple[str, str]:
+        bucket, _, prefix = self.s3_uri.removeprefix("s3://").partition("/")
+        return bucket, f"{prefix.strip('/')}/{key}.tar.gz".lstrip("/")
+
+    def lookup(self, key: str) -> Path | None:
+        """Return an unpacked output folder for `key`, fetching it from S3 if needed."""
+        if not self.enabled:
+            return None
+        archive, out = self._archive(key), self._unpacked(key)
+        if not archive.exists() and self.s3_uri:
+            bucket, s3_key = self._s3_location(key)
+            CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            tmp = archive.with_name(f"{key}.{os.getpid()}-{threading.get_ident()}.part")
+            try:
+                client("s3").download_file(bucket, s3_key, str(tmp))
+                tmp.replace(archive)
+                click.secho(f"Fetched build {key[:12]} from {self.s3_uri}", fg="cyan")
+            except Exception:
+                tmp.unlink(missing_ok=True)
+        with _locked():
+            if not archive.exists():
+                return None
+            if not out.exists():
+                staging = out.with_name(out.name + ".tmp")
+                shutil.rmtree(staging, ignore_errors=True)
+                with tarfile.open(archive, "r:gz") as tar:
+                    tar.extractall(staging, filter="data")
+                staging.replace(out)
+            # marks the entry as in use, so no other deploy evicts it now
+            os.utime(archive)
+        return out
+
+    def store(self, key: str, folder: Path):
+        with self.writer(key) as tar:
+            if tar is not None:
+                tar.add(folder, arcname=".")
+
+    @contextlib.contextmanager
+    def writer(self, key: str):
+        """Yield an open tar to pack the entry for `key` into, or None if there is nothing to do.
+
+        The entry only appears once the block finishes without an error.
+        """
+        if not self.enabled or self._archive(key).exists():
+            yield None
+            return
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        archive = self._archive(key)
+        # several environments may publish the same streamed build at once
+        tmp = archive.with_name(f"{key}.{os.getpid()}-{threading.get_ident()}.part")
+        try:
+            with tarfile.open(tmp, "w:gz", compresslevel=6) as tar:
+                yield tar
+        except BaseException:
+            tmp.unlink(missing_ok=True)
+            raise
+        tmp.replace(archive)
+        if self.s3_uri:
+            bucket, s3_key = self._s3_location(key)
+            try:
+                client("s3").upload_file(str(archive), bucket, s3_key)
+            except Exception as err:
+                click.secho(f"Warning: could not share build cache entry: {err}", fg="yellow")
+        self._evict()
+
+    def _evict(self):
+        """Keep the `max_entries` most recently used entries, and any used in the last `EVICT_MIN_AGE`."""
+        with _locked():
+            archives = []
+            for path in CACHE_DIR.glob("*.tar.gz"):
+                with contextlib.suppress(OSError):
+                    archives.append((path.stat().st_mtime, path))
+            archives.sort(key=lambda a: a[0], reverse=True)
+            cutoff = time.time() - EVICT_MIN_AGE
+            for mtime, stale in archives[self.max_entries:]:
+                if mtime >= cutoff:
+                    continue
+                key = stale.name.removesuffix(".tar.gz")
+                stale.unlink(missing_ok=True)
+                shutil.rmtree(self._unpacked(key), ignore_errors=True)
@@ -0,0 +1,105 @@
+"""
+Batched, parallel deletion of S3 object versions.
+
+Versions and delete markers are listed page by page and handed out in
+`DeleteObjects` batches of 1000 keys to a worker pool while listing continues.
+Keys a batch reports as failed (throttling, internal errors) are retried with
+backoff. Used by `minfy cleanup` and release pruning.
+"""
+import random
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+
+BATCH_SIZE = 1000
+DEFAULT_WORKERS = 8
+MAX_ATTEMPTS = 5
+
+
+@dataclass
+class DeleteStats:
+    objects: int = 0
+    bytes: int = 0
+    failed: dict[str, str] = field(default_factory=dict)
+
+    @property
+    def ok(self) -> bool:
+        return not self.failed
+
+
+def iter_versions(s3, bucket: str, prefix: str = ""):
+    """Yield `{Key, VersionId, Size, IsLatest, LastModified}` for every version and delete marker."""
+    paginator = s3.get_paginator("list_object_versions")
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for v in page.get("Versions", []) + page.get("DeleteMarkers", []):
+            yield {"Key": v["Key"], "VersionId": v["VersionId"], "Size": v.get("Size", 0),
+                   "IsLatest": v.get("IsLatest", False), "LastModified": v.get("LastModified")}
+
+
+def _batches(entries, size: int = BATCH_SIZE):
+    batch = []
+    for entry in entries:
+        batch.append(entry)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _delete_batch(s3, bucket: str, batch: list[dict]) -> DeleteStats:
+    stats = DeleteStats()
+    pending = {(e["Key"], e["VersionId"]): e for e in batch}
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        try:
+            resp = s3.delete_objects(Bucket=bucket, Delete={
+                "Objects": [{"Key": k, "VersionId": v} for k, v in pending],
+                "Quiet": True,
+            })
+            errors = resp.get("Errors", [])
+        except Exception as err:
+            errors = [{"Key": k, "VersionId": v, "Message": str(err)} for k, v in pending]
+        failed = {(e["Key"], e.get("VersionId")): e.get("Message", e.get("Code", "error")) for e in errors}
+        for ident, entry in list(pending.items()):
+            if ident not in failed:
+                stats.objects += 1
+                stats.bytes += entry["Size"]
+                del pending[ident]
+        if not pending:
+            break
+        if attempt == MAX_ATTEMPTS:
+            stats.failed.update({f"{k}@{v}": failed.get((k, v), "error") for k, v in pending})
+            break
+        time.sleep(min(0.2 * 2 ** attempt, 5) + random.uniform(0, 0.2))
+    return stats
+
+
+def delete_versions(s3, bucket: str, entries, workers: int = DEFAULT_WORKERS,
+                    dry_run: bool = False, on_batch=None) -> DeleteStats:
+    """Delete `entries` (as yielded by `iter_versions`); `on_batch(stats)` is called per finished batch."""
+    total = DeleteStats()
+
+    def _collect(stats: DeleteStats):
+        total.objects += stats.objects
+        total.bytes += stats.bytes
+        total.failed.update(stats.failed)
+        if on_batch:
+            on_batch(stats)
+
+    if dry_run:
+        for batch in _batches(entries):
+            _collect(DeleteStats(objects=len(batch), bytes=sum(e["Size"] for e in batch)))
+        return total
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        in_flight = set()
+        for batch in _batches(entries):
+            # keep listing ahead of the workers without buffering the whole bucket
+            if len(in_flight) >= workers * 2:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    _collect(fut.result())
+            in_flight.add(pool.submit(_delete_batch, s3, bucket, batch))
+        for fut in in_flight:
+            _collect(fut.result())
+    return total
@@ -0,0 +1,76 @@
+"""
+Cache-Control planner.
+
+Content-hashed filenames never change content, so they are served as
+`immutable` for a year. Entry HTML and minfy's own marker files must always be
+revalidated, and everything else gets a short max-age. Each builder from
+`detect.py` contributes the fingerprint patterns its bundler emits; `build.json`
+can override the policies and add glob rules of its own:
+
+    "cache_control": {
+      "default": "public, max-age=600",
+      "rules": [{"pattern": "fonts/*", "value": "public, max-age=86400"}]
+    }
+"""
+import re
+from fnmatch import fnmatch
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+NO_CACHE = "no-cache"
+NO_STORE = "no-store"
+SHORT = "public, max-age=300, must-revalidate"
+
+BUILDER_PATTERNS = {
+    # assets/index-BxK3pQ9z.js, assets/logo-4f2a9c1d.svg
+    "vite": [r"^assets/.+-[A-Za-z0-9_-]{8}\.[A-Za-z0-9]+$"],
+    # static/js/main.3f2a9c1d.js, static/js/787.1a2b3c4d.chunk.js, static/media/logo.6ce24c58.svg
+    "cra": [r"^static/(?:js|css|media)/.+\.[0-9a-f]{8}(?:\.chunk)?\.[A-Za-z0-9]+$"],
+    # main.8f2c7a91d3e4b5a6.js (webpack), main-2ZLXKQ7B.js / chunk-ABCDEFGH.js (esbuild)
+    "angular": [r"(?:^|/)[^/]+\.[0-9a-f]{16,20}\.[A-Za-z0-9]+$",
+                r"(?:^|/)[^/]+-[A-Z0-9]{8}\.(?:js|css)$"],
+    # _next/static/chunks/app-1a2b3c4d5e6f7a8b.js, _next/static/<buildId>/...
+    "next": [r"^_next/static/"],
+}
+# a hash-looking token right before the extension, as emitted by most bundlers
+_GENERIC = re.compile(r"[.-](?P<hash>[A-Za-z0-9_]{8,32})(?:\.chunk)?\.[A-Za-z0-9]+$")
+_NO_CACHE_NAMES = {"index.html", "service-worker.js", "sw.js", "ngsw.json", "ngsw-worker.js"}
+
+
+def _looks_like_hash(token: str) -> bool:
+    if any(c.isdigit() for c in token):
+        return True
+    # Vite's 8-char base64url hashes sometimes contain no digits
+    return len(token) == 8 and token != token.lower() and token != token.upper()
+
+
+class CachePolicy:
+    def __init__(self, builder: str | None = None, overrides: dict | None = None):
+        cfg = overrides or {}
+        self.immutable = cfg.get("immutable", IMMUTABLE)
+        self.html = cfg.get("html", NO_CACHE)
+        self.default = cfg.get("default", SHORT)
+        self.rules = [(r["pattern"], r["value"]) for r in cfg.get("rules", [])]
+        self.patterns = [re.compile(p) for p in BUILDER_PATTERNS.get(builder or "", [])]
+
+    def is_fingerprinted(self, key: str) -> bool:
+        if any(p.search(key) for p in self.patterns):
+            return True
+        m = _GENERIC.search(key)
+        return bool(m) and _looks_like_hash(m.group("hash"))
+
+    def for_key(self, key: str) -> str:
+        for pattern, value in self.rules:
+            if fnmatch(key, pattern):
+                return value
+        name = key.rsplit("/", 1)[-1]
+        if name.startswith("__minfy_"):
+            return NO_STORE
+        if name in _NO_CACHE_NAMES or name.endswith((".html", ".htm")):
+            return self.html
+        if self.is_fingerprinted(key):
+            return self.immutable
+        return self.default
+
+    def apply(self, jobs):
+        for job in jobs:
+            job.extra_args = {**job.extra_args, "CacheControl": self.for_key(job.key)}
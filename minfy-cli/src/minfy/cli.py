@@ -1,27 +1,52 @@
+import importlib
 import click
-from .commands.init import init_cmd
-from .commands.deploy import deploy_cmd
-from .commands.config_cmd import config_grp
-from .commands.auth import auth_cmd
-from .commands.detect import detect_cmd
-from .commands.status import status_cmd
-from .commands.rollback import rollback_cmd
-from .commands.monitor import monitor_grp
-from .commands.cleanup import cleanup_cmd
-
-@click.group()
-def cli():
-    """minfy – simple deploy helper created for Minfy By Syed Sofiyan"""
-    pass
 
+# name -> (module, attribute, short help); modules are imported only when their command runs
+COMMANDS = {
+    "init": ("minfy.commands.init", "init_cmd", "Clone the repository and save initial project configuration."),
+    "update": ("minfy.commands.update", "update_cmd", "Fetch new commits and move the workspace to them."),
+    "detect": ("minfy.commands.detect", "detect_cmd", "Detect the framework and write build.json."),
+    "deploy": ("minfy.commands.deploy", "deploy_cmd", "Build the app and publish it as a new release."),
+    "status": ("minfy.commands.status", "status_cmd", "Show current deployment URL and version history."),
+    "rollback": ("minfy.commands.rollback", "rollback_cmd", "Revert deployment to a previous version."),
+    "config": ("minfy.commands.config_cmd", "config_grp", "Manage environments, variables and retention."),
+    "auth": ("minfy.commands.auth", "auth_cmd", "Save AWS credentials for minfy."),
+    "monitor": ("minfy.commands.monitor", "monitor_grp", "Prometheus/Grafana monitoring stack."),
+    "cleanup": ("minfy.commands.cleanup", "cleanup_cmd", "Delete all AWS S3 buckets created by minfy for this project."),
+    "ledger": ("minfy.commands.ledger", "ledger_grp", "Manage the deployment history kept in the bucket."),
+    "prune": ("minfy.commands.prune", "prune_cmd", "Delete releases older than the newest N, never the live one."),
+}
+
+
+class LazyGroup(click.Group):
+    """Click group that imports a command's module only when that command is invoked."""
+
+    def __init__(self, *args, lazy_commands: dict | None = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lazy_commands = lazy_commands or {}
 
-cli.add_command(init_cmd, name="init")
-cli.add_command(deploy_cmd, name="deploy")
-cli.add_command(status_cmd, name="status")
-cli.add_command(rollback_cmd, name="rollback")
-cli.add_command(config_grp, name="config")
-cli.add_command(auth_cmd, name="auth")
-cli.add_command(detect_cmd, name="detect")
-cli.add_command(monitor_grp, name="monitor")
-cli.add_command(cleanup_cmd, name="cleanup")
+    def list_commands(self, ctx):
+        return sorted(set(super().list_commands(ctx)) | set(self.lazy_commands))
 
+    def get_command(self, ctx, cmd_name):
+        if cmd_name in self.commands or cmd_name not in self.lazy_commands:
+            return super().get_command(ctx, cmd_name)
+        module, attr, _ = self.lazy_commands[cmd_name]
+        command = getattr(importlib.import_module(module), attr)
+        self.add_command(command, name=cmd_name)
+        return command
+
+    def format_commands(self, ctx, formatter):
+        # static help strings, so `minfy --help` does not import every command
+        rows = [(name, self.lazy_commands[name][2] if name in self.lazy_commands and name not in self.commands
+                 else self.commands[name].get_short_help_str())
+                for name in self.list_commands(ctx)]
+        if rows:
+            with formatter.section("Commands"):
+                formatter.write_dl(rows)
+
+
+@click.group(cls=LazyGroup, lazy_commands=COMMANDS)
+def cli():
+    """minfy – simple deploy helper created for Minfy By Syed Sofiyan"""
+    pass
@@ -1,32 +1,91 @@
 import json
+import re
+import sys
 import click
-import boto3
 from pathlib import Path
-from ..commands.config_cmd import config_file
-from ..commands.deploy import _bucket_name
-from ..config import load_global
+from rich.progress import Progress
+from ..bulk_delete import DEFAULT_WORKERS, delete_versions, iter_versions
+from ..aws import client
+from ..commands.config_cmd import DEFAULT_ENVIRONMENTS, _project_slug, config_file
+from ..ledger import LOCAL_DIR
 
-def _region():
-    cfg = load_global()
-    return getattr(cfg, "region", None) or "ap-south-1"
+def _project_apps(proj: dict) -> set[str]:
+    """The primary app and every app `minfy deploy --all` publishes."""
+    apps = {proj["app_subdir"], *(proj.get("apps") or [])}
+    try:
+        apps |= set(json.loads(Path("build.json").read_text()).get("apps") or {})
+    except (OSError, ValueError):
+        pass
+    return apps
+
+def _project_buckets(s3, proj: dict) -> list[str]:
+    """Every minfy bucket of this project, across its apps and the configured and any leftover envs."""
+    slugs = {_project_slug({**proj, "app_subdir": sub}) for sub in _project_apps(proj)}
+    envs = set(proj.get("envs", DEFAULT_ENVIRONMENTS)) | {proj.get("current_env", "dev")}
+    # env names with a hyphen are only matched when configured, so 'minfy-dev-x-<slug>'
+    # of another project whose slug ends in ours is never picked up
+    pattern = re.compile(rf"^minfy-([a-z0-9]+)-(?:{'|'.join(map(re.escape, slugs))})$")
+    wanted = {f"minfy-{env}-{slug}" for env in envs for slug in slugs}
+    names = [b["Name"] for b in s3.list_buckets().get("Buckets", [])]
+    return sorted(n for n in names if pattern.match(n) or n in wanted)
+
+def _size(n: float) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if n < 1024 or unit == "GB":
+            return f"{n:.1f} {unit}"
+        n /= 1024
 
 @click.command("cleanup")
-def cleanup_cmd():
+@click.option("--dry-run", is_flag=True, help="Only report what would be deleted")
+@click.option("--workers", "-w", type=click.IntRange(1, 64), default=DEFAULT_WORKERS,
+              show_default=True, help="Parallel DeleteObjects batches")
+@click.option("--yes", "-y", is_flag=True, help="Do not ask for confirmation")
+def cleanup_cmd(dry_run, workers, yes):
     """Delete all AWS S3 buckets created by minfy for this project."""
     if not config_file.exists():
         click.secho("No minfy project found. "
         "Run 'minfy init' to create a new project.", fg="red")
         return
     proj = json.loads(config_file.read_text())
-    bucket = _bucket_name(proj)
-    region = _region()
-    s3 = boto3.resource('s3', region_name=region)
-    bucket_obj = s3.Bucket(bucket)
-    click.secho(f"Deleting all objects and versions in bucket: {bucket}", fg="yellow")
-    try:
-        bucket_obj.object_versions.delete()
-        bucket_obj.delete()
-        click.secho(f"Bucket {bucket} deleted.", fg="green")
-    except Exception as e:
-        click.secho(f"Error deleting bucket {bucket}: {e}", fg="red")
+    s3 = client('s3', max_pool=workers)
+    buckets = _project_buckets(s3, proj)
+    if not buckets:
+        click.secho("No minfy buckets found for this project.", fg="yellow")
+        return
+    click.secho(f"Buckets: {', '.join(buckets)}", fg="yellow")
+    if not (dry_run or yes):
+        if not sys.stdin.isatty():
+            click.secho("Not deleting without confirmation; pass --yes in scripts and CI.", fg="red")
+            sys.exit(1)
+        if not click.confirm("Delete these buckets and every version in them?"):
+            return
+
+    with Progress() as progress:
+        for bucket in buckets:
+            task = progress.add_task(f"{'Scanning' if dry_run else 'Deleting'} {bucket}", total=None)
+
+            def _advance(stats, task=task):
+                progress.update(task, advance=stats.objects)
+
+            try:
+                stats = delete_versions(s3, bucket, iter_versions(s3, bucket), workers,
+                                        dry_run=dry_run, on_batch=_advance)
+            except Exception as e:
+                progress.console.print(f"[red]Error emptying bucket {bucket}: {e}[/]")
+                continue
+            progress.update(task, total=stats.objects, completed=stats.objects)
+            if dry_run:
+                progress.console.print(f"{bucket}: {stats.objects} versions, {_size(stats.bytes)}")
+                continue
+            if not stats.ok:
+                progress.console.print(f"[red]{len(stats.failed)} version(s) in {bucket} could not be deleted; "
+                                       f"bucket kept.[/]")
+                continue
+            try:
+                s3.delete_bucket(Bucket=bucket)
+                (LOCAL_DIR / f"{bucket}.json").unlink(missing_ok=True)
+                progress.console.print(f"[green]Bucket {bucket} deleted ({stats.objects} versions, "
+                                       f"{_size(stats.bytes)}).[/]")
+            except Exception as e:
+                progress.console.print(f"[red]Error deleting bucket {bucket}: {e}[/]")
     click.secho("Monitor/EC2 resources are destroyed by 'minfy monitor disable'.", fg="cyan")
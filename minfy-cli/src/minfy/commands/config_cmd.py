@@ -1,14 +1,54 @@
+import contextlib
 import json
+import re
 from pathlib import Path
 import click
 
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, deploys are not serialised
+    fcntl = None
+
 config_file = Path('.minfy.json')
+LOCK_FILE = Path('.minfy.json.lock')
 DEFAULT_ENV_NAME = 'dev'
 DEFAULT_ENVIRONMENTS = {
     'dev': {'vars': {}, 'build_cmd': 'npm run build'},
     'staging': {'vars': {}, 'build_cmd': 'npm run build'},
     'prod': {'vars': {}, 'build_cmd': 'npm run build'},
 }
+def _project_slug(proj: dict) -> str:
+    raw = proj["app_subdir"] or Path(proj["local_path"]).name
+    slug = re.sub(r"[^a-z0-9-]", "-", raw.lower()).strip("-") or "app"
+    repo_url = proj.get('repo', '')
+    repo_name = repo_url.rstrip('/').split('/')[-1]
+    if repo_name.endswith('.git'):
+        repo_name = repo_name[:-4]
+    repo_slug = re.sub(r"[^a-z0-9-]", "-", repo_name.lower()).strip("-") or "repo"
+    return f"{repo_slug}-{slug}"
+
+def _bucket_name(proj: dict) -> str:
+    env = proj.get("current_env", "dev")
+    return f"minfy-{env}-{_project_slug(proj)}"
+
+@contextlib.contextmanager
+def config_lock(shared: bool = False):
+    """Hold a lock on .minfy.json: shared while deploying, exclusive while changing it."""
+    if fcntl is None:
+        yield
+        return
+    with open(LOCK_FILE, 'a') as fh:
+        mode = fcntl.LOCK_SH if shared else fcntl.LOCK_EX
+        try:
+            fcntl.flock(fh, mode | fcntl.LOCK_NB)
+        except BlockingIOError:
+            click.secho('Waiting for another minfy deploy or config change to finish …', fg='yellow')
+            fcntl.flock(fh, mode)
+        try:
+            yield
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+
 def load_config() -> dict:
     if config_file.exists():
         data = json.loads(config_file.read_text())
@@ -33,10 +73,11 @@ def set_var(pair):
         click.secho('Invalid format, use KEY=VALUE.', fg='red')
         raise click.Abort()
     k, v = pair.split('=', 1)
-    settings = load_config()
-    env = settings['current_env']
-    settings['envs'][env]['vars'][k] = v
-    save_config(settings)
+    with config_lock():
+        settings = load_config()
+        env = settings['current_env']
+        settings['envs'][env]['vars'][k] = v
+        save_config(settings)
     click.secho(f'{k} set in environment [{env}]', fg='green')
     click.echo('Next, run minfy deploy when ready.')
 
@@ -58,12 +99,43 @@ def list_vars():
 @config_grp.command('env')
 @click.argument('name')
 def switch_env(name):
-    settings = load_config()
-    if name not in settings['envs']:
-        click.secho(f"Unknown environment: {name}", fg='red')
-        click.echo(f"Available environments: {', '.join(settings['envs'].keys())}")
-        raise click.Abort()
-    settings['current_env'] = name
-    save_config(settings)
+    with config_lock():
+        settings = load_config()
+        if name not in settings['envs']:
+            click.secho(f"Unknown environment: {name}", fg='red')
+            click.echo(f"Available environments: {', '.join(settings['envs'].keys())}")
+            raise click.Abort()
+        settings['current_env'] = name
+        save_config(settings)
     click.secho(f'Environment changed to {name}', fg='green')
     click.echo('Now set variables or run minfy deploy.')
+
+@config_grp.command('retention')
+@click.option('--keep', '-k', type=click.IntRange(1, 100), required=True,
+              help='Number of releases / old versions to keep')
+@click.option('--days', '-d', type=click.IntRange(1, 3650), required=True,
+              help='Days after which superseded object versions expire')
+def retention(keep, days):
+    """Set how many deploys to keep and install the matching bucket lifecycle rules."""
+    from ..aws import client
+    from ..retention import apply_lifecycle
+    with config_lock():
+        settings = load_config()
+        settings['retention'] = {'keep': keep, 'days': days}
+        save_config(settings)
+    click.secho(f'Retention set: keep {keep} deploys, expire old versions after {days} days', fg='green')
+    if 'app_subdir' not in settings:
+        return
+    bucket = _bucket_name(settings)
+    s3 = client('s3')
+    try:
+        s3.head_bucket(Bucket=bucket)
+    except Exception:
+        click.echo('Lifecycle rules will be installed on the next minfy deploy.')
+        return
+    if apply_lifecycle(s3, bucket, settings['retention']):
+        click.secho(f'Lifecycle rules installed on {bucket}', fg='green')
+    else:
+        click.secho('Bucket still serves an in-place deploy; rules will be installed on the next minfy deploy.',
+                    fg='yellow')
+    click.echo('Run minfy prune to delete older releases now.')
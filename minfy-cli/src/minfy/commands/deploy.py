@@ -1,18 +1,39 @@
 import json
 import subprocess
 import sys
-import mimetypes
 import shutil
-import uuid
 import tempfile
 import re
 import os
 import hashlib
+import time
+import tarfile
+import posixpath
+import contextlib
+import multiprocessing
+from dataclasses import dataclass
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from pathlib import Path
-import boto3
 import click
+from rich.console import Console
 from rich.progress import Progress
-from ..commands.config_cmd import config_file
+from rich.table import Table
+from ..commands.config_cmd import _bucket_name, _project_slug, config_file, config_lock
+from ..aws import bucket_location, client, region as aws_region, website_url
+from ..upload import (DEFAULT_CONCURRENCY, TransferPolicy, UploadJob, UploadReport,
+                      jobs_for_directory, upload_jobs)
+from ..build_cache import BuildCache, build_key
+from ..cache_control import CachePolicy
+from ..config import HOME_DIR
+from ..compress import compress_jobs, decompress_body, gzip_bytes
+from ..deps import ensure_dependencies, split_install
+from ..mirrors import GitError, sync_sparse
+from ..ledger import append_record, head_commit, make_record
+from ..delta import MANIFEST_KEY, hash_jobs, load_remote_state, split_changed, write_manifest
+from ..retention import apply_lifecycle
+from ..stream import ContainerOutput, container_tar, stream_upload
+from ..releases import (ENTRY_KEY, activate, current_release, new_release_id,
+                        release_prefix, rewrite_entry_html, write_release_meta)
 
 def _parse_env_file(path: Path) -> dict[str, str]:
     env_vars = {}
@@ -22,54 +43,169 @@ def _parse_env_file(path: Path) -> dict[str, str]:
             env_vars[k.strip()] = v.strip()
     return env_vars
 
+_INSTALL_STEP = re.compile(r"\b(npm (ci|install)|yarn( install)?|pnpm (i|install))\b")
+
+def _instruction_end(lines: list[str], i: int) -> int:
+    """Index of the last line of the Dockerfile instruction starting at `lines[i]`."""
+    while lines[i].rstrip().endswith("\\") and i + 1 < len(lines):
+        i += 1
+        # comments and blank lines inside a continued instruction don't end it
+        while i + 1 < len(lines) and (not lines[i].strip() or lines[i].lstrip().startswith("#")):
+            i += 1
+    return i
+
 def _inject_env_into_dockerfile(src: Path, env_keys: list[str]) -> Path:
+    """Copy `src` with ARG/ENV lines for `env_keys` placed after the dependency layer.
+
+    Declaring build-time variables after `npm ci` keeps that layer cached when
+    only the env changes.
+    """
     dst = Path(tempfile.mkdtemp()) / "Dockerfile.build"
     lines = src.read_text(encoding="utf-8").splitlines(keepends=True)
-    inject_at = 1
-    for i, l in enumerate(lines):
-        if l.lower().startswith("from") and " as build" in l.lower():
+    if lines and not lines[-1].endswith("\n"):
+        lines[-1] += "\n"
+    stage = next((i for i, l in enumerate(lines)
+                  if l.lower().startswith("from") and " as build" in l.lower()), 0)
+    inject_at = stage + 1
+    i = stage + 1
+    while i < len(lines):
+        start, i = i, _instruction_end(lines, i)
+        low = " ".join(l.strip() for l in lines[start:i + 1]).lower()
+        if low.startswith("from"):
+            break
+        if low.startswith("run") and _INSTALL_STEP.search(low):
             inject_at = i + 1
             break
+        if low.startswith("copy . ") or low.startswith("copy ./ "):
+            inject_at = start
+            break
+        i += 1
     inject = [f"ARG {k}\nENV {k}=${k}\n" for k in env_keys]
     dst.write_text("".join(lines[:inject_at] + inject + lines[inject_at:]), encoding="utf-8")
     return dst
 
-def _upload_directory(s3, bucket: str, source: Path):
-    files = [f for f in source.rglob('*') if f.is_file()]
-    total = len(files)
-    with Progress() as prog:
-        task = prog.add_task('upload', total=total)
-        for f in files:
-            key = f.relative_to(source).as_posix()
-            s3.upload_file(
-                str(f), bucket, key,
-                ExtraArgs={'ContentType': mimetypes.guess_type(f.name)[0] or 'application/octet-stream'}
-            )
-            prog.advance(task)
+def _prune_build_images(slug: str):
+    """Remove superseded build images of this project and legacy random-tag ones.
+
+    Only call this once every upload of the deploy is done: an image whose tag
+    moved to a later build is dangling, but may still have output to stream.
+    """
+    subprocess.call(["docker", "image", "prune", "-f", "--filter", f"label=minfy.project={slug}"],
+                    stdout=subprocess.DEVNULL)
+    try:
+        repos = subprocess.check_output(
+            ["docker", "images", "--format", "{{.Repository}}:{{.Tag}}",
+             "--filter", "reference=minfy-build-*"], text=True).split()
+    except (OSError, subprocess.CalledProcessError):
+        return
+    legacy = [r for r in repos if re.fullmatch(r"minfy-build-[0-9a-f]{6}:\S+", r)]
+    if legacy:
+        subprocess.call(["docker", "image", "rm", "-f", *legacy], stdout=subprocess.DEVNULL)
+
+def _settings(project_info: dict, build_plan: dict, name: str) -> dict:
+    """Merge a settings block from .minfy.json with its build.json override."""
+    return {**(project_info.get(name) or {}), **(build_plan.get(name) or {})}
+
+def _upload_directory(s3, bucket: str, source: Path, prefix: str = "", base_prefix: str = "",
+                      concurrency: int = DEFAULT_CONCURRENCY, delta: bool = True,
+                      policy: TransferPolicy | None = None, compression: dict | None = None,
+                      cache_policy: CachePolicy | None = None, progress: Progress | None = None,
+                      label: str = "upload", base_bucket: str | None = None):
+    """Upload `source` under `prefix`, copying files unchanged since `base_prefix` server-side.
+
+    `base_bucket` lets the unchanged files come from another bucket, e.g. an
+    environment that was just deployed from the same build. Pass a shared
+    `progress` when several uploads run at once; rich allows one live display.
+    """
+    jobs = jobs_for_directory(source)
+    (cache_policy or CachePolicy()).apply(jobs)
+    stats = compress_jobs(jobs, compression)
+    if stats.files:
+        click.secho(f"Compressed {stats.files} text assets ({stats.cached} from cache), "
+                    f"saving {stats.saved} bytes.", fg="cyan")
+    hash_jobs(jobs, concurrency)
+    remote, _ = load_remote_state(s3, base_bucket or bucket, base_prefix) if delta else ({}, False)
+    changed, unchanged = split_changed(jobs, remote)
+    for job in unchanged:
+        job.copy_source = base_prefix + job.key
+        job.copy_bucket = base_bucket or ""
+    with contextlib.nullcontext(progress) if progress else Progress() as prog:
+        task = prog.add_task(label, total=len(jobs))
+        report = upload_jobs(s3, bucket, changed + unchanged, concurrency,
+                             on_done=lambda _job: prog.advance(task), policy=policy,
+                             prefix=prefix)
+    for key, err in report.failed.items():
+        click.secho(f"Failed to upload {key}: {err}", fg="red")
+    if report.ok:
+        write_manifest(s3, bucket, jobs, prefix)
+    if unchanged:
+        skipped_bytes = sum(j.size for j in unchanged)
+        click.secho(f"Skipped {len(unchanged)} unchanged files ({skipped_bytes} bytes).", fg="cyan")
+    return report, jobs
+
+def _upload_container(s3, bucket: str, output: ContainerOutput, prefix: str = "", base_prefix: str = "",
+                      concurrency: int = DEFAULT_CONCURRENCY, delta: bool = True,
+                      policy: TransferPolicy | None = None, compression: dict | None = None,
+                      cache_policy: CachePolicy | None = None, progress: Progress | None = None,
+                      label: str = "upload", base_bucket: str | None = None,
+                      build_cache: BuildCache | None = None):
+    """Like `_upload_directory`, but streams the files straight out of the build image."""
+    remote, _ = load_remote_state(s3, base_bucket or bucket, base_prefix) if delta else ({}, False)
+    packing = (build_cache.writer(output.cache_key) if build_cache and output.cache_key
+               else contextlib.nullcontext())
+    with contextlib.nullcontext(progress) if progress else Progress() as prog:
+        task = prog.add_task(label, total=None)
+        with packing as cache_tar, container_tar(output.image, output.path) as stream:
+            result = stream_upload(s3, bucket, stream, prefix, remote, base_prefix, base_bucket,
+                                   concurrency, policy, compression, cache_policy,
+                                   on_done=lambda _job: prog.advance(task), cache_tar=cache_tar)
+        prog.update(task, total=len(result.jobs), completed=len(result.jobs))
+    report = result.report
+    for key, err in report.failed.items():
+        click.secho(f"Failed to upload {key}: {err}", fg="red")
+    if result.compressed:
+        click.secho(f"Compressed {result.compressed} text assets, saving {result.saved} bytes.", fg="cyan")
+    if report.ok:
+        write_manifest(s3, bucket, result.jobs, prefix)
+    if result.unchanged:
+        click.secho(f"Skipped {result.unchanged} unchanged files ({result.unchanged_bytes} bytes).", fg="cyan")
+    return result
+
+def _copy_release(s3, bucket: str, prefix: str, source_bucket: str, source_prefix: str,
+                  concurrency: int = DEFAULT_CONCURRENCY, policy: TransferPolicy | None = None,
+                  progress: Progress | None = None, label: str = "copy"):
+    """Copy a release published moments ago, file for file and server-side.
+
+    Returns the upload report, the jobs, and the key and HTML of the shallowest index.html.
+    """
+    files, from_manifest = load_remote_state(s3, source_bucket, source_prefix)
+    jobs = [UploadJob(key, Path(key), entry.get("size", 0), md5=entry.get("md5", ""),
+                      copy_source=source_prefix + key, copy_bucket=source_bucket)
+            for key, entry in files.items()]
+    with contextlib.nullcontext(progress) if progress else Progress() as prog:
+        task = prog.add_task(label, total=len(jobs))
+        report = upload_jobs(s3, bucket, jobs, concurrency, on_done=lambda _job: prog.advance(task),
+                             policy=policy, prefix=prefix)
+    for key, err in report.failed.items():
+        click.secho(f"Failed to copy {key}: {err}", fg="red")
+    if report.ok and from_manifest:
+        s3.copy_object(Bucket=bucket, Key=prefix + MANIFEST_KEY,
+                       CopySource={"Bucket": source_bucket, "Key": source_prefix + MANIFEST_KEY})
+    index_keys = sorted((k for k in files if k.rsplit("/", 1)[-1] == "index.html"), key=lambda k: k.count("/"))
+    if not index_keys:
+        return report, jobs, None, b""
+    obj = s3.get_object(Bucket=source_bucket, Key=source_prefix + index_keys[0])
+    return report, jobs, index_keys[0], decompress_body(obj["Body"].read(), obj.get("ContentEncoding"))
 
 def _sha(url: str) -> str:
     return hashlib.sha1(url.encode()).hexdigest()[:6]
 
-def _bucket_name(proj: dict) -> str:
-    env = proj.get("current_env", "dev")
-    raw = proj["app_subdir"] or Path(proj["local_path"]).name
-    slug = re.sub(r"[^a-z0-9-]", "-", raw.lower()).strip("-") or "app"
-    repo_url = proj.get('repo', '')
-    repo_name = repo_url.rstrip('/').split('/')[-1]
-    if repo_name.endswith('.git'):
-        repo_name = repo_name[:-4]
-    repo_slug = re.sub(r"[^a-z0-9-]", "-", repo_name.lower()).strip("-") or "repo"
-    return f"minfy-{env}-{repo_slug}-{slug}"
-
 def ensure_bucket_exists(s3, bucket: str, region: str):
     try:
         s3.head_bucket(Bucket=bucket)
     except s3.exceptions.ClientError:
         click.echo(f"Creating bucket {bucket} …")
-        s3.create_bucket(
-            Bucket=bucket,
-            CreateBucketConfiguration={'LocationConstraint': region}
-        )
+        s3.create_bucket(Bucket=bucket, **bucket_location(region))
         s3.put_public_access_block(
             Bucket=bucket,
             PublicAccessBlockConfiguration={k: False for k in (
@@ -101,21 +237,50 @@ def ensure_bucket_exists(s3, bucket: str, region: str):
             VersioningConfiguration={'Status': 'Enabled'}
         )
 
-@click.command("deploy")
-@click.option("--env-file", "-e", type=click.Path(exists=True, dir_okay=False),
-              help="Path to a .env file with build-time variables")
-def deploy_cmd(env_file):
-    if not (config_file.exists() and Path("build.json").exists()):
-        click.secho("Run 'minfy init' and 'minfy detect' first.", fg="red")
-        sys.exit(1)
+class DeployError(Exception):
+    """A deploy step failed; the message is shown to the user as-is."""
+
+@dataclass
+class Published:
+    url: str
+    bucket: str
+    prefix: str
+    report: UploadReport
+
+DEFAULT_PARALLEL = {"max_workers": None, "build_memory_mb": 1536, "upload_slots": 2}
+# build.json blocks that apply to every app of a monorepo
+SHARED_SETTINGS = ("transfer", "compression", "cache_control", "deps", "build_cache")
+
+def _docker_build(project_info: dict, project_path: Path, build_plan: dict, env_vars: dict) -> ContainerOutput:
+    """Build the image; its output is streamed out of it at publish time."""
+    slug = _project_slug(project_info)
+    tag = f"minfy-build-{slug}:latest"
+    df = _inject_env_into_dockerfile(project_path / "Dockerfile.build", list(env_vars))
+    iidfile = df.parent / "image.id"
+    cmd = ["docker", "build", "-f", str(df), "-t", tag, "--label", f"minfy.project={slug}",
+           "--iidfile", str(iidfile)]
+    for k, v in env_vars.items():
+        cmd += ["--build-arg", f"{k}={v}"]
+    cmd.append(str(project_path))
+    try:
+        subprocess.check_call(cmd, env=os.environ | {"DOCKER_BUILDKIT": "1"})
+        # the image id, not the tag: a later build of another env may move the tag
+        image = iidfile.read_text().strip()
+    finally:
+        shutil.rmtree(df.parent, ignore_errors=True)
+    return ContainerOutput(image, build_plan.get("static_output_path", "/static"))
+
+def build_app(project_info: dict, build_plan: dict, env_vars: dict,
+              use_cache: bool = True) -> Path | ContainerOutput:
+    """Build the app in `project_info["app_subdir"]` and return its static output.
 
-    project_info = json.loads(config_file.read_text())
-    build_plan = json.loads(Path("build.json").read_text())
+    That is a folder, or for Docker builds the image the output is streamed from.
+    """
+    build_plan, env_vars = dict(build_plan), dict(env_vars)
     if build_plan.get('builder') == 'next':
-        build_plan['build_cmd'] = 'npm ci --legacy-peer_deps && npx next build'
+        build_plan['build_cmd'] = 'npm ci --legacy-peer-deps && npx next build'
     project_path = Path(project_info["local_path"]) / project_info["app_subdir"]
     output_dir = project_path / build_plan["output_dir"]
-    env_vars = _parse_env_file(Path(env_file)) if env_file else {}
 
     click.secho(f"Detected framework: {build_plan.get('builder','custom')}", fg="cyan")
 
@@ -126,67 +291,408 @@ def deploy_cmd(env_file):
     if framework == "angular" and "NODE_OPTIONS" not in env_vars:
         env_vars["NODE_OPTIONS"] = "--openssl-legacy-provider"
 
-    def _docker_build() -> Path:
-        tag = f"minfy-build-{uuid.uuid4().hex[:6]}"
-        df = _inject_env_into_dockerfile(project_path / "Dockerfile.build", list(env_vars))
-        cmd = ["docker", "build", "-f", str(df), "-t", tag]
-        for k, v in env_vars.items():
-            cmd += ["--build-arg", f"{k}={v}"]
-        cmd.append(str(project_path))
-        subprocess.check_call(cmd)
-        cid = subprocess.check_output(["docker", "create", tag]).decode().strip()
-        tmp = Path(tempfile.mkdtemp())
-        static_output_path = build_plan.get("static_output_path", "/static")
-        subprocess.check_call(["docker", "cp", f"{cid}:{static_output_path}/.", str(tmp)])
-        subprocess.check_call(["docker", "rm", cid])
-        return tmp
-
+    build_cache = BuildCache(_settings(project_info, build_plan, "build_cache"))
+    cache_key = build_key(project_info, build_plan, env_vars, use_docker) if use_cache else None
+    cached = build_cache.lookup(cache_key) if cache_key else None
     try:
-        if not use_docker and npm_installed:
+        if cached:
+            click.secho(f"Build cache hit ({cache_key[:12]}) – skipping build.", fg="cyan")
+            deployment_folder = cached
+        elif not use_docker and npm_installed:
             click.secho("Building on host …", fg="cyan")
             host_env = os.environ | env_vars
-            subprocess.check_call(build_plan["build_cmd"], cwd=project_path, env=host_env, shell=True)
+            install_cmd, build_cmd = split_install(build_plan["build_cmd"])
+            # a build_cmd without an install step relies on node_modules being there already
+            if install_cmd:
+                host_env = ensure_dependencies(project_path, host_env, install_cmd,
+                                               _settings(project_info, build_plan, "deps"))
+            subprocess.check_call(build_cmd, cwd=project_path, env=host_env, shell=True)
             deployment_folder = output_dir
         elif docker_installed:
             click.secho("Building inside Docker …", fg="cyan")
-            deployment_folder = _docker_build()
+            deployment_folder = _docker_build(project_info, project_path, build_plan, env_vars)
         else:
-            click.secho("Docker is required for builds; install Docker and retry.", fg="red")
-            sys.exit(1)
+            raise DeployError("Docker is required for builds; install Docker and retry.")
+    except DeployError:
+        raise
     except Exception as err:
-        click.secho(f"Build failed: {err}", fg="red")
-        sys.exit(1)
+        raise DeployError(f"Build failed: {err}") from err
 
+    if isinstance(deployment_folder, ContainerOutput):
+        # packed into the build cache while it is streamed out
+        deployment_folder.cache_key = cache_key if build_cache.enabled else None
+        return deployment_folder
     if not deployment_folder.exists():
-        click.secho(f"Missing output folder {deployment_folder}", fg="red")
-        sys.exit(1)
+        raise DeployError(f"Missing output folder {deployment_folder}")
+    if cache_key and not cached:
+        try:
+            build_cache.store(cache_key, deployment_folder)
+        except OSError as err:
+            click.secho(f"Warning: could not cache build output: {err}", fg="yellow")
+    return deployment_folder
+
+_NO_INDEX = "Error: No index.html found anywhere in the build output\nDeployment cannot continue without index.html"
 
-    index_paths = list(deployment_folder.rglob('index.html'))
-    if index_paths:
+def publish_app(project_info: dict, build_plan: dict, deployment_folder: Path | ContainerOutput,
+                concurrency: int = DEFAULT_CONCURRENCY, delta: bool = True,
+                progress: Progress | None = None, seed: tuple[str, str] | None = None) -> Published:
+    """Upload a build as a new release of the app's bucket and make it live.
+
+    `seed` is the `(bucket, release prefix)` of an identical build published
+    moments ago; its files are copied server-side instead of uploaded again.
+    """
+    streamed = isinstance(deployment_folder, ContainerOutput)
+    if not streamed:
+        index_paths = list(deployment_folder.rglob('index.html'))
+        if not index_paths:
+            raise DeployError(_NO_INDEX)
         index_paths.sort(key=lambda p: len(p.relative_to(deployment_folder).parts))
         index_path = index_paths[0]
-    else:
-        click.secho("Error: No index.html found anywhere in the build output", fg="red")
-        click.secho("Deployment cannot continue without index.html", fg="red")
-        sys.exit(1)
 
+    framework = build_plan.get("builder", "custom")
     bucket = _bucket_name(project_info)
-    region = "ap-south-1"
-    s3 = boto3.client("s3", region_name=region)
+    region = aws_region()
+    policy = TransferPolicy(_settings(project_info, build_plan, "transfer"))
+    compression = _settings(project_info, build_plan, "compression")
+    cache_policy = CachePolicy(framework, _settings(project_info, build_plan, "cache_control"))
+    s3 = client("s3", region, max_pool=concurrency + policy.part_concurrency)
 
-    click.secho(f"Build output directory: {deployment_folder}", fg="cyan")
-    click.secho(f"Files in output directory: {[f.name for f in deployment_folder.iterdir() if f.is_file()]}", fg="cyan")
+    if progress is None and streamed:
+        click.secho(f"Streaming build output from {deployment_folder.path} in the build image …", fg="cyan")
+    elif progress is None:
+        click.secho(f"Build output directory: {deployment_folder}", fg="cyan")
+        click.secho(f"Files in output directory: {[f.name for f in deployment_folder.iterdir() if f.is_file()]}", fg="cyan")
 
     ensure_bucket_exists(s3, bucket, region)
-    _upload_directory(s3, bucket, deployment_folder)
+    live = current_release(s3, bucket)
+    release_id = new_release_id()
+    prefix = release_prefix(release_id)
+    base_bucket, base_prefix = seed or (None, release_prefix(live) if live else "")
+    label = f"upload {project_info['app_subdir']}"
+    if seed:
+        label = f"{project_info.get('current_env', 'dev')}: copy from {base_bucket}"
+    if streamed and seed:
+        # the leader already read the image; copying its release needs no Docker at all
+        report, jobs, index_key, index_bytes = _copy_release(s3, bucket, prefix, base_bucket, base_prefix,
+                                                             concurrency, policy, progress, label)
+        if report.ok and index_key is None:
+            raise DeployError(_NO_INDEX)
+    elif streamed:
+        try:
+            result = _upload_container(s3, bucket, deployment_folder, prefix, base_prefix,
+                                       concurrency, delta or bool(seed), policy, compression, cache_policy,
+                                       progress, label, base_bucket,
+                                       BuildCache(_settings(project_info, build_plan, "build_cache")))
+        except (OSError, RuntimeError, tarfile.TarError, subprocess.CalledProcessError) as err:
+            raise DeployError(f"Could not read the build output from the image: {err}") from err
+        report, jobs = result.report, result.jobs
+        index_key, index_bytes = result.index_key, result.index_html
+        if report.ok and index_key is None:
+            raise DeployError(_NO_INDEX)
+    else:
+        report, jobs = _upload_directory(s3, bucket, deployment_folder, prefix, base_prefix,
+                                         concurrency, delta or bool(seed), policy, compression, cache_policy,
+                                         progress, label, base_bucket)
+    if not report.ok:
+        raise DeployError(f"{len(report.failed)} file(s) failed to upload; the live release was left untouched.")
+    click.secho(f"Uploaded {report.uploaded} files ({report.bytes} bytes), "
+                f"copied {report.copied} unchanged.", fg="cyan")
 
-    if index_path != deployment_folder / 'index.html':
-        s3.upload_file(str(index_path), bucket, 'index.html',
-            ExtraArgs={'ContentType': 'text/html'})
+    if streamed:
+        index_html = index_bytes.decode("utf-8", errors="ignore")
+        index_dir = posixpath.dirname(index_key)
+    else:
+        index_html = index_path.read_text(encoding="utf-8", errors="ignore")
+        index_dir = index_path.relative_to(deployment_folder).parent.as_posix().lstrip(".")
+    entry = rewrite_entry_html(index_html, prefix, index_dir)
+    entry_body, entry_encoding = gzip_bytes(entry.encode("utf-8"), compression)
+    entry_args = {"ContentEncoding": entry_encoding} if entry_encoding else {}
+    s3.put_object(Bucket=bucket, Key=prefix + ENTRY_KEY, Body=entry_body,
+                  ContentType="text/html", CacheControl=cache_policy.for_key("index.html"),
+                  **entry_args)
+    meta = write_release_meta(s3, bucket, release_id, [j.key for j in jobs],
+                              len(jobs), sum(j.size for j in jobs))
+    if meta["overflow"]:
+        click.secho(f"Warning: {len(meta['overflow'])} top-level folders are over the S3 routing-rule "
+                    f"limit and are only served under /{prefix}: "
+                    f"{', '.join(meta['overflow'][:5])}{' …' if len(meta['overflow']) > 5 else ''}",
+                    fg="yellow")
     try:
-        head_ver = s3.head_object(Bucket=bucket, Key='index.html')['VersionId']
-        s3.put_object(Bucket=bucket, Key='__minfy_current.txt', Body=head_ver)
+        index_version = activate(s3, bucket, release_id, meta, fallback=live)
     except Exception as err:
-        click.secho(f"Warning: unable to set version marker for index.html: {err}", fg='yellow')
-    click.secho(f'Deployed: http://{bucket}.s3-website.{region}.amazonaws.com', fg='green')
-    click.echo("Next: run minfy status or minfy rollback to manage deployments.")
\ No newline at end of file
+        raise DeployError(f"Uploaded release {release_id} but could not activate it: {err}") from err
+    try:
+        append_record(s3, bucket, make_record(release_id, head_commit(Path(project_info["local_path"])),
+                                              meta["files"], meta["bytes"], index_version))
+    except Exception as err:
+        click.secho(f"Warning: could not update the deployment ledger: {err}", fg="yellow")
+    if project_info.get("retention"):
+        try:
+            apply_lifecycle(s3, bucket, project_info["retention"])
+        except Exception as err:
+            click.secho(f"Warning: could not apply retention rules: {err}", fg="yellow")
+    click.secho(f"Release {release_id} is live.", fg="cyan")
+    return Published(website_url(bucket, region), bucket, prefix, report)
+
+def _available_memory_mb() -> int | None:
+    try:
+        for line in Path("/proc/meminfo").read_text().splitlines():
+            if line.startswith("MemAvailable:"):
+                return int(line.split()[1]) // 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE") // (1024 * 1024)
+    except (AttributeError, ValueError, OSError):
+        return None
+
+def build_workers(apps: int, settings: dict | None = None) -> int:
+    """Parallel builds that fit this machine: one per two cores, capped by free memory."""
+    cfg = {**DEFAULT_PARALLEL, **(settings or {})}
+    if cfg["max_workers"]:
+        return max(1, min(apps, int(cfg["max_workers"])))
+    # bundlers are multi-threaded themselves, so a build per core would just contend
+    limit = max(1, (os.cpu_count() or 2) // 2)
+    mem = _available_memory_mb()
+    if mem:
+        limit = min(limit, max(1, mem // int(cfg["build_memory_mb"])))
+    return max(1, min(apps, limit))
+
+def _build_worker(project_info: dict, build_plan: dict, env_vars: dict, use_cache: bool,
+                  log_path: str, snapshot: bool = False) -> tuple[Path | ContainerOutput, float]:
+    """Process-pool entry point: build one app with all of its output going to `log_path`.
+
+    With `snapshot` the output is copied aside, so the next build of the same
+    folder cannot overwrite it while it is still uploading.
+    """
+    sys.stdout.flush()
+    sys.stderr.flush()
+    fd = os.open(log_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    os.dup2(fd, 1)
+    os.dup2(fd, 2)
+    os.close(fd)
+    start = time.monotonic()
+    try:
+        folder = build_app(project_info, build_plan, env_vars, use_cache)
+        if snapshot and isinstance(folder, Path):
+            copy = Path(tempfile.mkdtemp(prefix="minfy-build-")) / "out"
+            shutil.copytree(folder, copy)
+            folder = copy
+        return folder, time.monotonic() - start
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+
+def _app_plans(project_info: dict, build_plan: dict) -> dict[str, dict]:
+    primary = project_info["app_subdir"]
+    plans = {}
+    for sub in project_info.get("apps") or [primary]:
+        plan = (build_plan.get("apps") or {}).get(sub) or (build_plan if sub == primary else None)
+        if plan is None:
+            raise DeployError(f"No build plan for '{sub}'; run 'minfy detect --all' first.")
+        plans[sub] = {**{k: build_plan[k] for k in SHARED_SETTINGS if k in build_plan}, **plan}
+    return plans
+
+def _deploy_all(project_info: dict, build_plan: dict, env_vars: dict, concurrency: int,
+                delta: bool, use_cache: bool):
+    plans = _app_plans(project_info, build_plan)
+    parallel = {**DEFAULT_PARALLEL, **(project_info.get("parallel") or {})}
+    workers = build_workers(len(plans), parallel)
+    log_dir = HOME_DIR / "logs"
+    log_dir.mkdir(parents=True, exist_ok=True)
+    results = {sub: {"build": None, "upload": None, "url": None, "error": None} for sub in plans}
+    # one pooled client shared by all concurrent uploads
+    part_concurrency = TransferPolicy(_settings(project_info, build_plan, "transfer")).part_concurrency
+    client("s3", aws_region(), max_pool=(concurrency + part_concurrency) * int(parallel["upload_slots"]))
+    click.secho(f"Deploying {len(plans)} apps, {workers} build(s) at a time …", fg="cyan")
+
+    def _publish(sub: str, folder: Path | ContainerOutput, progress: Progress):
+        start = time.monotonic()
+        published = publish_app({**project_info, "app_subdir": sub}, plans[sub], folder,
+                                concurrency, delta, progress)
+        return published.url, time.monotonic() - start
+
+    started = time.monotonic()
+    images = set()
+    with Progress() as progress, \
+            ProcessPoolExecutor(max_workers=workers,
+                                mp_context=multiprocessing.get_context("spawn")) as builds, \
+            ThreadPoolExecutor(max_workers=int(parallel["upload_slots"])) as uploads:
+        building = {}
+        for sub, plan in plans.items():
+            log = log_dir / f"build-{_project_slug({**project_info, 'app_subdir': sub})}.log"
+            fut = builds.submit(_build_worker, {**project_info, "app_subdir": sub}, plan,
+                                env_vars, use_cache, str(log))
+            building[fut] = (sub, log)
+        publishing = {}
+        # each finished build starts uploading while the remaining builds keep running
+        for fut in as_completed(building):
+            sub, log = building[fut]
+            try:
+                folder, results[sub]["build"] = fut.result()
+            except Exception as err:
+                results[sub]["error"] = f"{err} (log: {log})"
+                progress.console.print(f"[red]{sub}: build failed, see {log}[/]")
+                continue
+            progress.console.print(f"[cyan]{sub}: built in {results[sub]['build']:.1f}s[/]")
+            if isinstance(folder, ContainerOutput):
+                images.add(_project_slug({**project_info, "app_subdir": sub}))
+            publishing[uploads.submit(_publish, sub, folder, progress)] = sub
+        for fut in as_completed(publishing):
+            sub = publishing[fut]
+            try:
+                results[sub]["url"], results[sub]["upload"] = fut.result()
+            except Exception as err:
+                results[sub]["error"] = str(err)
+    for slug in images:
+        _prune_build_images(slug)
+
+    table = Table(title=f"Deployed in {time.monotonic() - started:.1f}s")
+    for col in ("App", "Build", "Upload", "Result"):
+        table.add_column(col)
+    def _secs(value):
+        return f"{value:.1f}s" if value is not None else "-"
+    for sub, r in results.items():
+        result = f"[red]{r['error']}[/]" if r["error"] else f"[green]{r['url']}[/]"
+        table.add_row(sub, _secs(r["build"]), _secs(r["upload"]), result)
+    Console().print(table)
+    if any(r["error"] for r in results.values()):
+        sys.exit(1)
+
+def _env_vars(project_info: dict, env: str, file_vars: dict) -> dict:
+    """Build variables of `env`: `minfy config set` values, overridden by --env-file."""
+    configured = ((project_info.get("envs") or {}).get(env) or {}).get("vars") or {}
+    return {**configured, **file_vars}
+
+def _deploy_envs(project_info: dict, build_plan: dict, envs: list[str], file_vars: dict,
+                 concurrency: int, delta: bool, use_cache: bool):
+    unknown = [e for e in envs if e not in (project_info.get("envs") or {})]
+    if unknown:
+        raise DeployError(f"Unknown environment(s): {', '.join(unknown)}")
+    # environments with the same resolved variables get byte-identical builds
+    groups: dict[str, list[str]] = {}
+    for env in envs:
+        groups.setdefault(json.dumps(_env_vars(project_info, env, file_vars), sort_keys=True), []).append(env)
+    click.secho(f"Deploying to {', '.join(envs)} with {len(groups)} build(s) …", fg="cyan")
+    results = {env: {"url": None, "error": None, "copied": False, "upload": None} for env in envs}
+    log_dir = HOME_DIR / "logs"
+    log_dir.mkdir(parents=True, exist_ok=True)
+    part_concurrency = TransferPolicy(_settings(project_info, build_plan, "transfer")).part_concurrency
+    client("s3", aws_region(), max_pool=(concurrency + part_concurrency) * len(envs))
+
+    def _publish(env: str, folder: Path | ContainerOutput, progress: Progress, seed=None):
+        start = time.monotonic()
+        try:
+            published = publish_app({**project_info, "current_env": env}, build_plan, folder,
+                                    concurrency, delta, progress, seed)
+        except Exception as err:
+            results[env]["error"] = str(err)
+            return None
+        results[env].update(url=published.url, copied=bool(seed), upload=time.monotonic() - start)
+        return published
+
+    def _fan_out(group: list[str], folder: Path | ContainerOutput, progress: Progress):
+        leader, *followers = group
+        try:
+            first = _publish(leader, folder, progress)
+            seed = (first.bucket, first.prefix) if first else None
+            with ThreadPoolExecutor(max_workers=max(1, len(followers))) as pool:
+                list(pool.map(lambda env: _publish(env, folder, progress, seed), followers))
+        finally:
+            if len(groups) > 1 and isinstance(folder, Path):
+                shutil.rmtree(Path(folder).parent, ignore_errors=True)
+
+    started = time.monotonic()
+    with Progress() as progress, \
+            ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as builds, \
+            ThreadPoolExecutor(max_workers=len(groups)) as uploads:
+        building = {}
+        for group in groups.values():
+            log = log_dir / f"build-{_project_slug(project_info)}-{group[0]}.log"
+            fut = builds.submit(_build_worker, {**project_info, "current_env": group[0]}, build_plan,
+                                _env_vars(project_info, group[0], file_vars), use_cache, str(log),
+                                len(groups) > 1)
+            building[fut] = (group, log)
+        fanning, streamed = [], False
+        # the next build runs while the previous one is being uploaded
+        for fut in as_completed(building):
+            group, log = building[fut]
+            try:
+                folder, seconds = fut.result()
+            except Exception as err:
+                for env in group:
+                    results[env]["error"] = f"{err} (log: {log})"
+                progress.console.print(f"[red]{', '.join(group)}: build failed, see {log}[/]")
+                continue
+            progress.console.print(f"[cyan]Built for {', '.join(group)} in {seconds:.1f}s[/]")
+            streamed = streamed or isinstance(folder, ContainerOutput)
+            fanning.append(uploads.submit(_fan_out, group, folder, progress))
+        for fut in fanning:
+            fut.result()
+    if streamed:
+        _prune_build_images(_project_slug(project_info))
+
+    table = Table(title=f"Deployed in {time.monotonic() - started:.1f}s")
+    for col in ("Env", "Upload", "Result"):
+        table.add_column(col)
+    for env, r in results.items():
+        upload = "-" if r["upload"] is None else f"{r['upload']:.1f}s" + (" (copied)" if r["copied"] else "")
+        result = f"[red]{r['error']}[/]" if r["error"] else f"[green]{r['url']}[/]"
+        table.add_row(env, upload, result)
+    Console().print(table)
+    if any(r["error"] for r in results.values()):
+        sys.exit(1)
+
+@click.command("deploy")
+@click.option("--env-file", "-e", type=click.Path(exists=True, dir_okay=False),
+              help="Path to a .env file with build-time variables")
+@click.option("--concurrency", "-c", type=click.IntRange(1, 256), default=DEFAULT_CONCURRENCY,
+              show_default=True, help="Number of files uploaded in parallel")
+@click.option("--delta/--full", default=True, show_default=True,
+              help="Upload only files that changed since the live release")
+@click.option("--cache/--no-cache", "use_cache", default=True, show_default=True,
+              help="Reuse a cached build when source, env and build plan are unchanged")
+@click.option("--all", "all_apps", is_flag=True,
+              help="Build and deploy every app folder of a monorepo in parallel")
+@click.option("--envs", default=None, metavar="ENV,ENV",
+              help="Deploy to several environments, building once per distinct variable set")
+def deploy_cmd(env_file, concurrency, delta, use_cache, all_apps, envs):
+    """Build the app and publish it as a new release."""
+    if not (config_file.exists() and Path("build.json").exists()):
+        click.secho("Run 'minfy init' and 'minfy detect' first.", fg="red")
+        sys.exit(1)
+
+    if all_apps and envs:
+        click.secho("Use either --all or --envs, not both.", fg="red")
+        sys.exit(1)
+
+    # a shared lock: `minfy config env` cannot switch current_env under a running deploy
+    with config_lock(shared=True):
+        project_info = json.loads(config_file.read_text())
+        try:
+            if sync_sparse(project_info):
+                click.secho("Sparse checkout updated to the configured app folders.", fg="cyan")
+        except GitError as err:
+            click.secho(f"Warning: could not update the sparse checkout: {err}", fg="yellow")
+        build_plan = json.loads(Path("build.json").read_text())
+        file_vars = _parse_env_file(Path(env_file)) if env_file else {}
+        env_vars = _env_vars(project_info, project_info.get("current_env", "dev"), file_vars)
+        try:
+            if envs:
+                _deploy_envs(project_info, build_plan, [e.strip() for e in envs.split(",") if e.strip()],
+                             file_vars, concurrency, delta, use_cache)
+                return
+            if all_apps:
+                _deploy_all(project_info, build_plan, env_vars, concurrency, delta, use_cache)
+                return
+            deployment_folder = build_app(project_info, build_plan, env_vars, use_cache)
+            try:
+                url = publish_app(project_info, build_plan, deployment_folder, concurrency, delta).url
+            finally:
+                if isinstance(deployment_folder, ContainerOutput):
+                    _prune_build_images(_project_slug(project_info))
+        except DeployError as err:
+            click.secho(str(err), fg="red")
+            sys.exit(1)
+    click.secho(f'Deployed: {url}', fg='green')
+    click.echo("Next: run minfy status or minfy rollback to manage deployments.")
@@ -1,43 +1,55 @@
 import json
 import sys
 import re
+import hashlib
 from pathlib import Path
 import click
 from rich.table import Table
 from rich import print as rprint
 from ..commands.config_cmd import config_file
+from ..config import HOME_DIR
+from ..mirrors import GitError, sync_sparse
+from ..scan import find_shallowest, scan_env_keys
 
 DOCKER_TEMPLATES = {
     "vite": """\
+# syntax=docker/dockerfile:1
 FROM node:20-alpine AS build
 WORKDIR /app
 COPY package*.json ./
-RUN npm ci --legacy-peer-deps || npm install --legacy-peer-deps
+RUN --mount=type=cache,target=/root/.npm \\
+    npm ci --legacy-peer-deps || npm install --legacy-peer-deps
 COPY . .
 RUN npm run build
 """,
     "cra": """\
+# syntax=docker/dockerfile:1
 FROM node:20-alpine AS build
 WORKDIR /app
 COPY package*.json ./
-RUN npm ci --legacy-peer-deps || npm install --legacy-peer-deps
+RUN --mount=type=cache,target=/root/.npm \\
+    npm ci --legacy-peer-deps || npm install --legacy-peer-deps
 COPY . .
 RUN npm run build
 """,
     "angular": """\
+# syntax=docker/dockerfile:1
 FROM node:20-alpine AS build
 ENV NODE_OPTIONS=--openssl-legacy-provider
 WORKDIR /app
 COPY package*.json ./
-RUN npm ci --legacy-peer-deps || npm install --legacy-peer-deps
+RUN --mount=type=cache,target=/root/.npm \\
+    npm ci --legacy-peer-deps || npm install --legacy-peer-deps
 COPY . .
 RUN npm run build -- --configuration production
 """,
     "next": """\
+# syntax=docker/dockerfile:1
 FROM node:20-alpine AS build
 WORKDIR /app
 COPY package*.json ./
-RUN npm ci --legacy-peer-deps || npm install --legacy-peer-deps
+RUN --mount=type=cache,target=/root/.npm \\
+    npm ci --legacy-peer-deps || npm install --legacy-peer-deps
 COPY . .
 RUN {build_cmd}
 
@@ -47,10 +59,12 @@ EXPOSE 80
 CMD ["nginx", "-g", "daemon off;"]
 """,
     "fallback": """\
+# syntax=docker/dockerfile:1
 FROM node:20-alpine AS build
 WORKDIR /app
 COPY package*.json ./
-RUN npm ci --legacy-peer-deps || npm install --legacy-peer-deps
+RUN --mount=type=cache,target=/root/.npm \\
+    npm ci --legacy-peer-deps || npm install --legacy-peer-deps
 COPY . .
 RUN {build_cmd}
 
@@ -61,6 +75,24 @@ CMD ["nginx", "-g", "daemon off;"]
 """,
 }
 
+DETECT_CACHE = HOME_DIR / "cache" / "detect.json"
+MANIFEST_FILES = ("package.json", "angular.json", "package-lock.json", "yarn.lock", "pnpm-lock.yaml")
+
+# keeps host build output and dependencies out of the build context, so
+# `COPY . .` only changes when sources do
+DOCKERIGNORE = """\
+node_modules
+.git
+dist
+build
+out
+.next
+.angular
+"""
+
+# user-tuned settings in build.json that survive a re-run of `minfy detect`
+PRESERVED_KEYS = ("transfer", "compression", "cache_control", "deps", "build_cache")
+
 def _pretty(plan: dict):
     tbl = Table(title="Build Plan")
     tbl.add_column("Key", style="cyan")
@@ -82,7 +114,10 @@ def needs_docker(plan: dict) -> bool:
             return True
     return False
 
-def needs_env(app_dir: Path, pkg: dict | None) -> bool:
+def _source_dir(app_dir: Path) -> Path:
+    return app_dir / 'src' if (app_dir / 'src').is_dir() else app_dir
+
+def needs_env(app_dir: Path, pkg: dict | None, env_keys: set[str] | None = None) -> bool:
     gitignore = app_dir / '.gitignore'
     
     if (app_dir / '.env.example').exists() or (app_dir / '.env.template').exists():
@@ -101,16 +136,9 @@ def needs_env(app_dir: Path, pkg: dict | None) -> bool:
         if 'dotenv' in all_deps:
             return True
 
-    src_folder = app_dir / 'src'
-    for js_file in src_folder.rglob('*.[jt]s*'):
-        try:
-            code = js_file.read_text(errors='ignore')
-            if 'process.env.' in code:
-                return True
-        except Exception:
-            pass
-            
-    return False
+    if env_keys is None:
+        env_keys = scan_env_keys(_source_dir(app_dir))
+    return bool(env_keys)
 
 def _write_docker(app_dir: Path, plan: dict):
     if not plan["requires_docker"]:
@@ -122,41 +150,20 @@ def _write_docker(app_dir: Path, plan: dict):
         build_cmd=plan["build_cmd"]
     )
     dockerfile_path.write_text(dockerfile, encoding="utf-8")
-    static_output_path = f"/app/{plan['output_dir']}"
-    build_json = Path("build.json")
-    plan["static_output_path"] = static_output_path
-    build_json.write_text(json.dumps(plan, indent=2))
+    dockerignore = app_dir / ".dockerignore"
+    if not dockerignore.exists():
+        dockerignore.write_text(DOCKERIGNORE, encoding="utf-8")
+    plan["static_output_path"] = f"/app/{plan['output_dir']}"
     click.secho("Dockerfile.build written", fg="green")
 
-@click.command("detect")
-def detect_cmd():
-    if not config_file.exists():
-        click.secho("Run 'minfy init' first.", fg="red")
-        sys.exit(1)
-
-    project_config = json.loads(config_file.read_text())
-    app_dir = Path(project_config["local_path"]) / project_config["app_subdir"]
-    docker_file = app_dir / 'Dockerfile'
-    skip_docker = False
-    if docker_file.exists():
-        try:
-            first_line = docker_file.read_text().splitlines()[0]
-        except Exception:
-            first_line = ''
-        if first_line.strip().upper().startswith('FROM'):
-            click.secho('Detected existing Dockerfile, keeping it as-is.', fg='green')
-            skip_docker = True
-        else:
-            click.secho('Existing Dockerfile appears invalid, will override.', fg='yellow')
-            skip_docker = False
-
+def _detect_framework(app_dir: Path) -> tuple[dict, dict | None]:
     if (app_dir / "angular.json").exists():
         config = json.loads((app_dir / "angular.json").read_text())
         project_name = config.get("defaultProject") 
-        
+    
         if not project_name:
             project_name = list(config["projects"])[0]
-            
+        
         plan = {
             "builder": "angular",
             "build_cmd": "npm run build -- --configuration production",
@@ -164,11 +171,12 @@ def detect_cmd():
         }
         pkg = None
     else:
-        pkg_paths = list(app_dir.rglob("package.json"))
+        pkg_paths = ([app_dir] if (app_dir / "package.json").is_file()
+                     else find_shallowest(app_dir, ("package.json",)))
         if not pkg_paths:
             click.secho("Error: no package.json found in repository; cannot detect React app", fg="red")
             sys.exit(1)
-        package_file = pkg_paths[0]
+        package_file = pkg_paths[0] / "package.json"
         try:
             pkg = json.loads(package_file.read_text())
         except json.JSONDecodeError as e:
@@ -183,19 +191,107 @@ def detect_cmd():
         else:
             click.secho("Error: no supported JS framework detected; cannot build or detect project", fg="red")
             sys.exit(1)
+    return plan, pkg
+
+def _manifest_key(app_dir: Path) -> str | None:
+    """Hash of the manifests detection depends on; None if package.json is not at the app root."""
+    if not ((app_dir / "package.json").is_file() or (app_dir / "angular.json").is_file()):
+        return None
+    digest = hashlib.sha256(str(app_dir.resolve()).encode())
+    for name in MANIFEST_FILES:
+        path = app_dir / name
+        if path.is_file():
+            digest.update(name.encode() + b"\0" + path.read_bytes())
+    return digest.hexdigest()
+
+def _cached_detect(app_dir: Path) -> tuple[dict, dict | None]:
+    key = _manifest_key(app_dir)
+    try:
+        cache = json.loads(DETECT_CACHE.read_text())
+    except (OSError, ValueError):
+        cache = {}
+    if key and key in cache:
+        return dict(cache[key]["plan"]), cache[key]["pkg"]
+    plan, pkg = _detect_framework(app_dir)
+    if key:
+        deps = {k: pkg.get(k, {}) for k in ("dependencies", "devDependencies")} if pkg else None
+        cache = {k: v for k, v in cache.items() if v.get("app_dir") != str(app_dir.resolve())}
+        cache[key] = {"app_dir": str(app_dir.resolve()), "plan": plan, "pkg": deps}
+        try:
+            DETECT_CACHE.parent.mkdir(parents=True, exist_ok=True)
+            DETECT_CACHE.write_text(json.dumps(cache))
+        except OSError:
+            pass
+    return plan, pkg
+
+def _plan_app(app_dir: Path) -> dict:
+    """Detect the build plan of one app folder and write its Dockerfile.build when needed."""
+    docker_file = app_dir / 'Dockerfile'
+    skip_docker = False
+    if docker_file.exists():
+        try:
+            first_line = docker_file.read_text().splitlines()[0]
+        except Exception:
+            first_line = ''
+        if first_line.strip().upper().startswith('FROM'):
+            click.secho('Detected existing Dockerfile, keeping it as-is.', fg='green')
+            skip_docker = True
+        else:
+            click.secho('Existing Dockerfile appears invalid, will override.', fg='yellow')
+            skip_docker = False
+
+    plan, pkg = _cached_detect(app_dir)
     plan['requires_docker'] = needs_docker(plan)
-    plan['needs_env'] = needs_env(app_dir, pkg)
+    env_keys = scan_env_keys(_source_dir(app_dir))
+    plan['needs_env'] = needs_env(app_dir, pkg, env_keys)
+    plan['env_keys'] = sorted(env_keys)
     type_map = {'cra': 'React (CRA)', 'vite': 'Vite', 'angular': 'Angular'}
     proj_type = type_map.get(plan['builder'], plan['builder'])
     click.secho(f'Project type detected: {proj_type}', fg='cyan')
+    if not skip_docker:
+        _write_docker(app_dir, plan)
+    return plan
+
+@click.command("detect")
+@click.option("--all", "all_apps", is_flag=True, help="Detect every app folder listed in .minfy.json")
+def detect_cmd(all_apps):
+    if not config_file.exists():
+        click.secho("Run 'minfy init' first.", fg="red")
+        sys.exit(1)
+
+    project_config = json.loads(config_file.read_text())
+    try:
+        if sync_sparse(project_config):
+            click.secho("Sparse checkout updated to the configured app folders.", fg="cyan")
+    except GitError as err:
+        click.secho(f"Warning: could not update the sparse checkout: {err}", fg="yellow")
+    root = Path(project_config["local_path"])
+    primary = project_config["app_subdir"]
+    if all_apps:
+        plans = {}
+        for sub in project_config.get("apps") or [primary]:
+            click.secho(f"[{sub}]", bold=True)
+            plans[sub] = _plan_app(root / sub)
+        plan = dict(plans.get(primary) or next(iter(plans.values())))
+        plan['apps'] = plans
+    else:
+        plan = _plan_app(root / primary)
 
     build_file = Path("build.json")
+    if build_file.exists():
+        try:
+            previous = json.loads(build_file.read_text())
+        except json.JSONDecodeError:
+            previous = {}
+        preserved = PRESERVED_KEYS if all_apps else PRESERVED_KEYS + ("apps",)
+        plan.update({k: previous[k] for k in preserved if k in previous})
     build_file.write_text(json.dumps(plan, indent=2))
-    if not skip_docker:
-        _write_docker(app_dir, plan)
     click.secho("build.json created", fg="green")
-    if plan['needs_env']:
+    if any(p['needs_env'] for p in plan.get('apps', {}).values()) or plan['needs_env']:
         click.secho('You might need an .env file. Deploy with: minfy deploy --env-file path/to/.env', fg='yellow')
+    env_keys = sorted({k for p in [plan, *plan.get('apps', {}).values()] for k in p['env_keys']})
+    if env_keys:
+        click.secho(f"Env vars referenced in source: {', '.join(env_keys)}", fg='yellow')
+    deploy = 'minfy deploy --all' if all_apps else 'minfy deploy'
     rprint('[bold]Next[/bold] configure variables with [cyan]minfy config[/cyan] '
-           'and then run [cyan]minfy deploy[/cyan].')
-
+           f'and then run [cyan]{deploy}[/cyan].')
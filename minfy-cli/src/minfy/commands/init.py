@@ -7,6 +7,9 @@ import sys
 import click
 import click
 
+from ..mirrors import GitError, checkout, resolve, sparse_for, sync_mirror, tree_app_dirs
+from ..scan import find_shallowest
+
 MINFY_WORKSPACE_PATH = Path('.') / '.minfy_workspace'
 CONFIG_PATH = Path('.minfy.json')
 DEFAULT_ENVIRONMENTS = {
@@ -29,17 +32,22 @@ def get_repo_folder_name(repo_url: str) -> str:
     repo_name = repo_url.rstrip('/').split('/')[-1]
     return repo_name[:-4] if repo_name.endswith('.git') else repo_name
 
-def find_app_directory(base_path: Path) -> str:
+def find_app_directories(base_path: Path) -> list[str]:
+    """Every app folder of a monorepo, as paths relative to `base_path`."""
     manifest_files = ('package.json', 'angular.json')
     base = Path(base_path)
+    if any((base / mf).exists() for mf in manifest_files):
+        return ['.']
+    # breadth-first and pruned, so monorepos resolve to apps/<name> without walking node_modules
+    return [d.relative_to(base).as_posix() for d in find_shallowest(base, manifest_files)]
 
-    for mf in manifest_files:
-        if (base / mf).exists():
-            click.secho('Found manifest in repo root.', fg='cyan')
-            return '.'
+def find_app_directory(base_path: Path) -> str:
+    return choose_app_directory(find_app_directories(base_path))
 
-    candidates = [d.name for d in base.iterdir()
-                  if d.is_dir() and any((d / mf).exists() for mf in manifest_files)]
+def choose_app_directory(candidates: list[str]) -> str:
+    if candidates == ['.']:
+        click.secho('Found manifest in repo root.', fg='cyan')
+        return '.'
     if not candidates:
         click.secho('No manifest found; defaulting to root.', fg='yellow')
         return '.'
@@ -57,24 +65,28 @@ def find_app_directory(base_path: Path) -> str:
     '--repo', '-r', 'repository_url', prompt='Git repository URL',
     help='URL of the Git repo to deploy (must end in .git)'
 )
-def init_cmd(repository_url: str):
+@click.option('--ref', default=None, metavar='BRANCH|TAG|SHA',
+              help='What to check out (default: the default branch); minfy update follows it')
+@click.option('--sparse/--full-checkout', default=True, show_default=True,
+              help='Check out only the deployed app folders and the local packages they use')
+def init_cmd(repository_url: str, ref: str | None, sparse: bool):
     """Clone the repository and save initial project configuration."""
     ensure_git_available()
     MINFY_WORKSPACE_PATH.mkdir(exist_ok=True)
     repo_folder = get_repo_folder_name(repository_url)
     destination_path = MINFY_WORKSPACE_PATH / repo_folder
 
-    if destination_path.exists():
-        click.secho(f'Repository already exists at {destination_path}', fg='yellow')
-    else:
-        click.secho(f'Cloning into {destination_path}...', fg='cyan')
-        result = run_command(['git', 'clone', '--depth', '1', repository_url, str(destination_path)])
-        if result.returncode != 0 or not destination_path.exists():
-            click.secho('ERROR: Invalid Git URL' \
-            'Please Enter a valid Git repository URL', fg='red')
-            sys.exit(1)
+    click.secho(f'Fetching {repository_url} into the clone cache...', fg='cyan')
+    try:
+        mirror = sync_mirror(repository_url)
+        commit = resolve(mirror, ref)
+        # read from git trees, so the app can be picked before anything is checked out
+        apps = tree_app_dirs(mirror, commit)
+    except GitError as err:
+        click.secho(f'ERROR: Invalid Git URL or ref. Please Enter a valid Git repository URL\n{err}', fg='red')
+        sys.exit(1)
 
-    app_folder = find_app_directory(destination_path)
+    app_folder = choose_app_directory(apps)
     project_config = {
         'repo': repository_url,
         'local_path': str(destination_path),
@@ -82,7 +94,26 @@ def init_cmd(repository_url: str):
         'current_env': 'dev',
         'envs': DEFAULT_ENVIRONMENTS,
     }
+    if ref:
+        project_config['ref'] = ref
+    if len(apps) > 1 and click.confirm(f'Deploy all {len(apps)} apps together with minfy deploy --all?',
+                                       default=False):
+        project_config['apps'] = apps
+
+    try:
+        paths = sparse_for(project_config, mirror, commit) if sparse else None
+        previous = checkout(mirror, destination_path, commit, paths)
+    except GitError as err:
+        click.secho(f'ERROR: could not check out {commit[:12]}: {err}', fg='red')
+        sys.exit(1)
+    if previous and previous != commit:
+        click.secho(f'Updated {destination_path} from {previous[:12]} to {commit[:12]}', fg='cyan')
+    else:
+        click.secho(f'Checked out {commit[:12]} into {destination_path}', fg='cyan')
+    if paths:
+        click.secho(f"Sparse checkout of {', '.join(paths)} (plus files at the repo root)", fg='cyan')
     CONFIG_PATH.write_text(json.dumps(project_config, indent=2), encoding='utf-8')
     click.secho(f'Configuration saved to {CONFIG_PATH}', fg='green')
 
-    click.echo('Next: Run minfy detect to analyze and build.')
+    click.echo('Next: Run minfy detect' + (' --all' if 'apps' in project_config else '')
+               + ' to analyze and build.')
@@ -0,0 +1,29 @@
+import json
+import click
+from ..aws import client
+from ..commands.config_cmd import _bucket_name, config_file
+from ..ledger import rebuild_ledger
+
+@click.group("ledger")
+def ledger_grp():
+    """Manage the deployment history kept in the bucket."""
+    pass
+
+@ledger_grp.command("rebuild")
+def rebuild():
+    """Rebuild the deployment ledger from the bucket's releases or index.html versions."""
+    if not config_file.exists():
+        click.secho("No minfy project found. "
+        "Run 'minfy init' to create a new project.", fg="red")
+        return
+    proj = json.loads(config_file.read_text())
+    bucket = _bucket_name(proj)
+    s3 = client("s3")
+    try:
+        s3.head_bucket(Bucket=bucket)
+    except s3.exceptions.ClientError:
+        click.secho(f"No bucket for env '{proj.get('current_env','dev')}'. Deploy first.", fg="yellow")
+        return
+    click.secho(f"Scanning deployment history in {bucket} …", fg="cyan")
+    records = rebuild_ledger(s3, bucket)
+    click.secho(f"Ledger rebuilt with {len(records)} deployment(s).", fg="green")
@@ -1,15 +1,20 @@
 from __future__ import annotations
-import json, os, shutil, socket, subprocess, sys, textwrap, time, webbrowser
-import base64
-import urllib.request
+import json, os, shutil, subprocess, sys, time, webbrowser
+import asyncio
+import contextlib
+import hashlib
+import http.client
 from pathlib import Path
-import boto3
 import click
-from ..commands.config_cmd import config_file  
-from ..commands.deploy import _bucket_name
+from ..commands.config_cmd import _bucket_name, config_file  
 import datetime
 from rich import print as rprint
-from ..config import load_global
+from rich.table import Table
+from ..aws import client, credentials_env, region as aws_region, website_url
+from ..ledger import deployed_at
+from ..grafana import DEFAULT_WORKERS as GRAFANA_WORKERS, GrafanaClient, GrafanaError
+from ..readiness import wait_for_stack
+from .. import probe as prober
 
 """
 Monitoring commands: provision, status, dashboard, and teardown for Prometheus/Grafana stack.
@@ -21,10 +26,16 @@ MON_DIR        = Path(".") / ".minfy_monitor"
 TF_DIR         = MON_DIR / "terraform"
 MON_KEY        = MON_DIR / "minfy_monitor.pem"
 TFVARS_JSON    = TF_DIR / "terraform.tfvars.json"
+GRAFANA_STATE  = MON_DIR / "grafana_state.json"
+TF_STATE       = TF_DIR / "terraform.tfstate"
+TF_LOCK        = TF_DIR / ".terraform.lock.hcl"
+TF_INIT_STAMP  = TF_DIR / ".terraform" / "minfy-init.json"
+TF_OUTPUTS     = TF_DIR / "outputs.json"
+# shared by every project, so the aws/tls providers are downloaded once per machine
+TF_PLUGIN_CACHE = Path(os.environ.get("TF_PLUGIN_CACHE_DIR") or Path.home() / ".terraform.d" / "plugin-cache")
 
 MON_SG_NAME    = "minfy-monitor-sg"
 MON_KP_NAME    = "minfy-monitor-key"
-DEFAULT_REGION = "ap-south-1"
 DEFAULT_AMI_ID = "ami-0a1235697f4afa8a4"
 _COMPOSE_TPL = """\
 version: "3.8"
@@ -259,24 +270,43 @@ variable "sg_name"        { type = string }
 """
 
 def _region() -> str:
-    cfg = load_global()
-    return getattr(cfg, "region", None) or DEFAULT_REGION
+    return aws_region()
 
 def _site_url() -> str:
     if not config_file.exists():
         click.secho("Run ‘minfy deploy’ first.", fg="red"); sys.exit(1)
     proj = json.loads(config_file.read_text())
     bucket = _bucket_name(proj)
-    return f"http://{bucket}.s3-website.{_region()}.amazonaws.com"
+    return website_url(bucket, _region())
+
+def _env_urls() -> dict[str, str]:
+    """Site URL of every configured environment, by env name."""
+    _site_url()  # exits when there is no project yet
+    proj = json.loads(config_file.read_text())
+    envs = list(proj.get("envs") or {}) or [proj.get("current_env", "dev")]
+    return {env: website_url(_bucket_name({**proj, 'current_env': env}), _region())
+            for env in envs}
 
 def _ensure_terraform():
     if not shutil.which("terraform"):
         click.secho("Terraform CLI not found in PATH.", fg="red"); sys.exit(1)
 
+@contextlib.contextmanager
+def _phase(name: str, timings: dict):
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        timings[name] = time.monotonic() - start
+
+def _print_timings(timings: dict):
+    rprint("Timings: " + ", ".join(f"{name} {secs:.1f}s" for name, secs in timings.items()))
+
 def _run_tf(args: list[str]):
     full = ["terraform", f"-chdir={TF_DIR}"] + args
-    proc = subprocess.Popen(full, stdout=subprocess.PIPE,
-                            stderr=subprocess.STDOUT, text=True)
+    TF_PLUGIN_CACHE.mkdir(parents=True, exist_ok=True)
+    proc = subprocess.Popen(full, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+                            env=os.environ | credentials_env() | {"TF_PLUGIN_CACHE_DIR": str(TF_PLUGIN_CACHE)})
     error_detected = False
     for line in proc.stdout:
         print(line, end="")
@@ -289,18 +319,61 @@ def _run_tf(args: list[str]):
             sys.exit(1)
         raise subprocess.CalledProcessError(proc.returncode, full)
 
+def _init_fingerprint() -> dict:
+    digest = hashlib.sha256()
+    for tf in sorted(TF_DIR.glob("*.tf")):
+        digest.update(tf.name.encode() + b"\0" + tf.read_bytes())
+    lock = hashlib.sha256(TF_LOCK.read_bytes()).hexdigest() if TF_LOCK.exists() else None
+    return {"config": digest.hexdigest(), "lock": lock}
+
+def _tf_init() -> bool:
+    """terraform init, unless the config and lock file are what the last init saw; True if it ran."""
+    try:
+        stamp = json.loads(TF_INIT_STAMP.read_text())
+    except (OSError, ValueError):
+        stamp = None
+    if stamp and stamp["lock"] and stamp == _init_fingerprint() and (TF_DIR / ".terraform" / "providers").exists():
+        return False
+    # providers stay at the versions in .terraform.lock.hcl instead of being re-resolved every time
+    _run_tf(["init", "-input=false"])
+    TF_INIT_STAMP.write_text(json.dumps(_init_fingerprint()))
+    return True
+
 def _tf_output() -> dict:
-    out = subprocess.check_output(
+    """`terraform output -json`, cached until terraform.tfstate changes."""
+    try:
+        state_mtime = TF_STATE.stat().st_mtime_ns
+    except OSError:
+        state_mtime = None
+    if state_mtime is not None:
+        try:
+            cached = json.loads(TF_OUTPUTS.read_text())
+            if cached["state_mtime"] == state_mtime:
+                return cached["outputs"]
+        except (OSError, ValueError, KeyError):
+            pass
+    out = json.loads(subprocess.check_output(
         ["terraform", f"-chdir={TF_DIR}", "output", "-json"], stderr=subprocess.STDOUT, text=True
-    )
-    return json.loads(out)
-
-def _wait(ip:str, port:int, sec:int=300)->bool:
-    t0=time.time()
-    while time.time()-t0<sec:
-        try: socket.create_connection((ip,port),3).close(); return True
-        except OSError: time.sleep(4)
-    return False
+    ))
+    if state_mtime is not None and out:
+        # holds the instance's private key, like the state file itself
+        fd = os.open(TF_OUTPUTS, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as fh:
+            json.dump({"state_mtime": state_mtime, "outputs": out}, fh)
+    return out
+
+def _wait_ready(ip: str, timeout: int) -> bool:
+    """Probe every component of the stack at once and print when each came up."""
+    results = wait_for_stack(ip, timeout=timeout,
+                             on_ready=lambda r: rprint(f"  {r.component.name} ready after {r.seconds:.1f}s"))
+    table = Table(title="Monitoring stack readiness")
+    for col in ("Component", "Endpoint", "Ready after", "Attempts"):
+        table.add_column(col)
+    for r in results:
+        ready = f"[green]{r.seconds:.1f}s[/]" if r.ready else f"[red]not ready ({r.error})[/]"
+        table.add_row(r.component.name, f":{r.component.port}{r.component.path}", ready, str(r.attempts))
+    rprint(table)
+    return all(r.ready for r in results)
 
 def _write_files(site:str):
     MON_DIR.mkdir(exist_ok=True)
@@ -328,7 +401,9 @@ def monitor_grp():
     pass
 
 @monitor_grp.command("enable")
-def enable():
+@click.option("--wait", "wait_timeout", type=click.IntRange(0), default=300, show_default=True,
+              help="Seconds to wait for Grafana, Prometheus and the exporters to become ready")
+def enable(wait_timeout):
     """Enable monitoring stack on AWS via Terraform."""
     _ensure_terraform()
     site = _site_url()
@@ -342,30 +417,38 @@ def enable():
     _write_files(site)
     rprint(f"Probing {site} every 15 seconds via blackbox-exporter")
 
+    timings = {}
     rprint("Running terraform init…")
     try:
-        _run_tf(["init","-upgrade"])
+        with _phase("init", timings):
+            if not _tf_init():
+                rprint("Terraform config and providers unchanged – init skipped.")
     except subprocess.CalledProcessError:
         click.secho("Error initializing Terraform – please check your Terraform configuration.", fg="red")
         sys.exit(1)
     rprint("Running terraform apply…")
     try:
-        _run_tf(["apply","-auto-approve"])
+        with _phase("apply", timings):
+            _run_tf(["apply","-auto-approve","-input=false"])
     except subprocess.CalledProcessError:
         click.secho("Error applying Terraform – please check your AWS configuration and permissions.", fg="red")
         sys.exit(1)
 
-    out = _tf_output()
+    with _phase("output", timings):
+        out = _tf_output()
     (MON_DIR / "id_rsa").write_text(out["private_key_pem"]["value"])
     try: (MON_DIR / "id_rsa").chmod(0o600)
     except: pass
 
     ip = out["public_ip"]["value"]
-    rprint("Waiting for Grafana on port 3000…")
-    if _wait(ip,3000):
+    rprint("Waiting for Grafana, Prometheus and the exporters…")
+    with _phase("readiness", timings):
+        ready = _wait_ready(ip, wait_timeout)
+    if ready:
         rprint("[bold green]Monitoring ready![/]")
     else:
-        click.secho("Grafana not reachable in time.", fg="red")
+        click.secho("Parts of the monitoring stack were not ready in time.", fg="red")
+    _print_timings(timings)
 
     rprint(f"Prometheus URL: {out['prometheus_url']['value']}")
     rprint(f"Grafana URL: {out['grafana_url']['value']} (admin/admin)")
@@ -385,12 +468,10 @@ def status():
         proj_cfg = json.loads(config_file.read_text())
         bucket = _bucket_name(proj_cfg)
         region = _region()
-        s3 = boto3.client('s3', region_name=region)
-        cur_vid = s3.get_object(Bucket=bucket, Key='__minfy_current.txt')['Body'].read().decode()
-        vers = s3.list_object_versions(Bucket=bucket, Prefix='index.html')['Versions']
-        deploy = next((v for v in vers if v['VersionId'] == cur_vid), None)
+        s3 = client('s3', region)
+        deploy = deployed_at(s3, bucket)
         if deploy:
-            iso = deploy['LastModified'].astimezone(datetime.timezone.utc)
+            iso = deploy.astimezone(datetime.timezone.utc)
             start = iso.strftime('%Y-%m-%d %H:%M:%SZ')
             rprint(f"Site deployed at: {start} UTC")
     except Exception:
@@ -417,7 +498,10 @@ def init():
     rprint("Next → [cyan]minfy monitor enable[/cyan] to provision on AWS .")
 
 @monitor_grp.command("dashboard")
-def dashboard():
+@click.option("--force", is_flag=True, help="Push the datasource and dashboards even if unchanged")
+@click.option("--workers", type=click.IntRange(1, 32), default=GRAFANA_WORKERS, show_default=True,
+              help="Dashboards imported in parallel")
+def dashboard(force, workers):
     """Import and open Grafana dashboards in default browser."""
     if not TF_DIR.exists():
         click.secho("No monitoring stack – run ‘minfy monitor enable’ first.", fg="yellow")
@@ -426,40 +510,21 @@ def dashboard():
         outputs = _tf_output()
         url = outputs['grafana_url']['value']
         prom_url = outputs['prometheus_url']['value']
-        auth = base64.b64encode(b"admin:admin").decode()
-        ds_payload = {
+    except Exception:
+        click.secho("No monitoring stack – run ‘enable’ first.", fg="yellow"); return
+    grafana = GrafanaClient(url, "admin", "admin", state_file=GRAFANA_STATE)
+    try:
+        ds_uid, pushed = grafana.ensure_datasource({
             "name": "Prometheus",
             "type": "prometheus",
             "access": "proxy",
             "url": prom_url,
             "isDefault": True
-        }
-        ds_req = urllib.request.Request(
-            f"{url}/api/datasources",
-            data=json.dumps(ds_payload).encode('utf-8'),
-            headers={
-                'Content-Type': 'application/json',
-                'Authorization': f"Basic {auth}"
-            }
-        )
-        try:
-            urllib.request.urlopen(ds_req)
-            rprint("Configured Prometheus datasource in Grafana")
-        except Exception as e:
-            if not (hasattr(e, 'code') and getattr(e, 'code', None) == 409):
-                click.secho(f"Warning: failed to configure datasource: {e}", fg="yellow")
-        try:
-            info_req = urllib.request.Request(
-                f"{url}/api/datasources/name/Prometheus",
-                headers={'Authorization': f"Basic {auth}"}
-            )
-            with urllib.request.urlopen(info_req) as resp:
-                ds_info = json.loads(resp.read().decode())
-                ds_uid = ds_info.get('uid')
-        except Exception:
-            ds_uid = None
-    except Exception:
-        click.secho("No monitoring stack – run ‘enable’ first.", fg="yellow"); return
+        }, force)
+        rprint("Configured Prometheus datasource in Grafana" if pushed else "Prometheus datasource unchanged")
+    except (GrafanaError, http.client.HTTPException, OSError) as e:
+        click.secho(f"Warning: failed to configure datasource: {e}", fg="yellow")
+        ds_uid = None
     proj_cfg = json.loads(config_file.read_text())
     repo_url = proj_cfg.get('repo', '')
     repo_name = repo_url.rstrip('/').split('/')[-1]
@@ -467,17 +532,13 @@ def dashboard():
     site = _site_url()
     db_dir = MON_DIR / "provisioning" / "dashboards"
     db_dir.mkdir(parents=True, exist_ok=True)
-    for old in db_dir.glob('*.json'):
-        old.unlink()
     bucket = _bucket_name(proj_cfg)
     region = _region()
-    s3 = boto3.client('s3', region_name=region)
+    s3 = client('s3', region)
     try:
-        cur_vid = s3.get_object(Bucket=bucket, Key='__minfy_current.txt')['Body'].read().decode()
-        vers = s3.list_object_versions(Bucket=bucket, Prefix='index.html')['Versions']
-        deploy = next((v for v in vers if v['VersionId'] == cur_vid), None)
+        deploy = deployed_at(s3, bucket)
         if deploy:
-            iso = deploy['LastModified'].astimezone(datetime.timezone.utc)
+            iso = deploy.astimezone(datetime.timezone.utc)
             start = iso.strftime('%Y-%m-%dT%H:%M:%SZ')
         else:
             now_utc = datetime.datetime.now(datetime.timezone.utc)
@@ -527,35 +588,31 @@ def dashboard():
         })
     default_dash["panels"] = panels
     file = db_dir / f"{uid}.json"
-    file.write_text(json.dumps(default_dash, indent=2))
-    prov = MON_DIR / "provisioning" / "dashboards"
-    if prov.exists():
-        for json_file in prov.glob('*.json'):
-            with open(json_file, encoding='utf-8') as f:
-                dash = json.load(f)
-            payload = {"dashboard": dash, "overwrite": True}
-            auth = base64.b64encode(b"admin:admin").decode()
-            req = urllib.request.Request(
-                f"{url}/api/dashboards/db",
-                data=json.dumps(payload).encode('utf-8'),
-                headers={
-                    'Content-Type': 'application/json',
-                    'Authorization': f"Basic {auth}"
-                }
-            )
-            try:
-                urllib.request.urlopen(req)
-                rprint(f"Imported dashboard {json_file.name}")
-            except Exception as e:
-                click.secho(f"Failed to import {json_file.name}: {e}", fg="red")
-
-    dash_uids = []
-    prov = MON_DIR / "provisioning" / "dashboards"
-    for json_file in prov.glob('*.json'):
+    content = json.dumps(default_dash, indent=2)
+    if not file.exists() or file.read_text() != content:
+        file.write_text(content)
+    # generated dashboards of an earlier repo name; dashboards added by hand are kept
+    for stale in db_dir.glob('*-monitoring.json'):
+        if stale != file:
+            stale.unlink()
+
+    dashboards = {}
+    for json_file in sorted(db_dir.glob('*.json')):
         try:
-            dash = json.loads(json_file.read_text())
-            dash_uids.append(dash.get('uid'))
-        except: pass
+            dashboards[json_file.name] = json.loads(json_file.read_text())
+        except ValueError as e:
+            click.secho(f"Failed to import {json_file.name}: {e}", fg="red")
+    for name, outcome in grafana.import_dashboards(dashboards, workers, force).items():
+        if outcome == "imported":
+            rprint(f"Imported dashboard {name}")
+        elif outcome == "unchanged":
+            rprint(f"Dashboard {name} unchanged")
+        else:
+            click.secho(f"Failed to import {name}: {outcome.removeprefix('failed: ')}", fg="red")
+    grafana.save_state()
+    grafana.close()
+
+    dash_uids = [uid] + [d.get('uid') for name, d in dashboards.items() if d.get('uid') != uid]
     if dash_uids:
         dash_url = f"{url}/d/{dash_uids[0]}?from={start}&to=now"
     else:
@@ -564,16 +621,78 @@ def dashboard():
     rprint(f"Opening dashboard at {dash_url}")
     rprint("Next → Run [cyan]minfy monitor disable[/cyan] to remove monitoring stack.")
 
+def _ms(value) -> str:
+    return "-" if value is None else f"{value * 1000:.0f}ms"
+
+@monitor_grp.command("probe")
+@click.option("--url", "urls", multiple=True, metavar="URL",
+              help="Probe this URL instead of the deployed site (repeatable)")
+@click.option("--all-envs", is_flag=True, help="Probe the site of every environment")
+@click.option("--interval", type=click.FloatRange(0.1), default=15, show_default=True,
+              help="Seconds between probe rounds")
+@click.option("--timeout", type=click.FloatRange(0.1), default=10, show_default=True,
+              help="Seconds before a probe counts as failed; at most --interval")
+@click.option("--port", type=click.IntRange(0, 65535), default=9464, show_default=True,
+              help="Serve Prometheus metrics on this local port (0 to disable)")
+@click.option("--bind", default="127.0.0.1", show_default=True, help="Address the metrics port listens on")
+@click.option("--snapshot", "snapshot_path", type=click.Path(dir_okay=False, path_type=Path),
+              help="Rewrite a JSON latency summary to this file after every round")
+@click.option("--count", "rounds", type=click.IntRange(0), default=0,
+              help="Stop after this many rounds (0 = until Ctrl-C)")
+def probe(urls, all_envs, interval, timeout, port, bind, snapshot_path, rounds):
+    """Probe the site locally and expose latency histograms to Prometheus."""
+    if timeout > interval:
+        click.secho(f"--timeout ({timeout:g}s) can't be longer than --interval ({interval:g}s).", fg="red")
+        sys.exit(1)
+    if urls:
+        targets = [prober.Target(url, url) for url in urls]
+    elif all_envs:
+        targets = [prober.Target(env, url) for env, url in _env_urls().items()]
+    else:
+        proj = json.loads(config_file.read_text()) if config_file.exists() else {}
+        targets = [prober.Target(proj.get("current_env", "dev"), _site_url())]
+
+    def _on_result(target, timing):
+        line = (f"{target.name}: dns {_ms(timing.dns)}  connect {_ms(timing.connect)}  tls {_ms(timing.tls)}  "
+                f"ttfb {_ms(timing.ttfb)}  total {_ms(timing.total)}")
+        if timing.ok:
+            rprint(f"[green]{timing.status}[/] {line}")
+        else:
+            rprint(f"[red]{timing.status or 'ERR'}[/] {line}  {timing.error}")
+
+    def _on_listen(host, bound):
+        rprint(f"Metrics at [cyan]http://{host}:{bound}/metrics[/]")
+
+    rprint(f"Probing {', '.join(t.url for t in targets)} every {interval:g}s – Ctrl-C to stop.")
+    try:
+        asyncio.run(prober.run(targets, interval, timeout, port or None, bind, snapshot_path, rounds,
+                               _on_result, _on_listen))
+    except KeyboardInterrupt:
+        pass
+    except OSError as err:
+        click.secho(f"Probe stopped: {err}", fg="red")
+        sys.exit(1)
+    for t in targets:
+        total = t.histograms["total"]
+        if total.count:
+            rprint(f"{t.name}: {t.success} ok, {t.failure} failed, total p50 {_ms(total.quantile(0.5))}, "
+                   f"p90 {_ms(total.quantile(0.9))}, p99 {_ms(total.quantile(0.99))}")
+        else:
+            rprint(f"{t.name}: {t.success} ok, {t.failure} failed")
+
 @monitor_grp.command("disable")
 def disable():
     """Destroy monitoring stack and clean up local files."""
     _ensure_terraform()
     if TF_DIR.exists():
         rprint("Running terraform destroy…")
+        timings = {}
         try:
-            _run_tf(["destroy","-auto-approve"])
+            with _phase("destroy", timings):
+                _run_tf(["destroy","-auto-approve","-input=false"])
         except subprocess.CalledProcessError:
             click.secho("Destroy errored – check AWS console.", fg="red")
+        _print_timings(timings)
         shutil.rmtree(MON_DIR, ignore_errors=True)
         rprint("[bold green]Monitoring stack removed.[/]")
     else:
@@ -0,0 +1,45 @@
+import json
+import click
+from rich.progress import Progress
+from ..bulk_delete import DEFAULT_WORKERS
+from ..aws import client
+from ..commands.config_cmd import _bucket_name, config_file
+from ..retention import DEFAULT_RETENTION, prune
+
+@click.command("prune")
+@click.option("--keep", "-k", type=click.IntRange(1, 1000), default=None,
+              help="Releases to keep (default: retention setting, else 10)")
+@click.option("--dry-run", is_flag=True, help="Only report what would be deleted")
+@click.option("--workers", "-w", type=click.IntRange(1, 64), default=DEFAULT_WORKERS,
+              show_default=True, help="Parallel DeleteObjects batches")
+def prune_cmd(keep, dry_run, workers):
+    """Delete releases older than the newest N, never the live one."""
+    if not config_file.exists():
+        click.secho("No minfy project found. "
+        "Run 'minfy init' to create a new project.", fg="red")
+        return
+    proj = json.loads(config_file.read_text())
+    keep = keep or {**DEFAULT_RETENTION, **(proj.get("retention") or {})}["keep"]
+    bucket = _bucket_name(proj)
+    s3 = client("s3", max_pool=workers)
+    try:
+        s3.head_bucket(Bucket=bucket)
+    except s3.exceptions.ClientError:
+        click.secho(f"No bucket for env '{proj.get('current_env','dev')}'. Deploy first.", fg="yellow")
+        return
+
+    with Progress() as progress:
+        task = progress.add_task(f"{'Scanning' if dry_run else 'Pruning'} {bucket}", total=None)
+        try:
+            plan, stats = prune(s3, bucket, keep, workers, dry_run=dry_run,
+                                on_batch=lambda s: progress.update(task, advance=s.objects))
+        except s3.exceptions.NoSuchKey:
+            progress.console.print("[yellow]Bucket has no deploy marker; nothing to prune.[/]")
+            return
+        progress.update(task, total=stats.objects, completed=stats.objects)
+
+    verb = "Would delete" if dry_run else "Deleted"
+    click.secho(f"{verb} {len(plan.delete)} old deploy(s): {stats.objects} versions, {stats.bytes} bytes. "
+                f"Kept the newest {keep} and the live one.", fg="cyan" if dry_run else "green")
+    if not stats.ok:
+        click.secho(f"{len(stats.failed)} version(s) could not be deleted; run minfy prune again.", fg="red")
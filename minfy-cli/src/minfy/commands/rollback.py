@@ -1,7 +1,9 @@
-import json, sys, re, hashlib
-from pathlib import Path
-import click, boto3
-from ..commands.config_cmd import config_file
+import json, sys, hashlib
+import click
+from ..aws import client
+from ..commands.config_cmd import _bucket_name, config_file
+from ..ledger import history, record_time
+from ..releases import activate, current_release, is_release_id, release_time
 import datetime 
 
 def short_sha(url: str) -> str:
@@ -16,18 +18,8 @@ def rollback_cmd(previous):
         sys.exit(1)
 
     proj = json.loads(config_file.read_text())
-    def _bucket_name(proj: dict) -> str:
-        env  = proj.get("current_env", "dev")
-        raw  = proj["app_subdir"] if "app_subdir" in proj else "app"
-        slug = re.sub(r"[^a-z0-9-]", "-", raw.lower()).strip("-") or "app"
-        repo_url = proj.get('repo', '')
-        repo_name = repo_url.rstrip('/').split('/')[-1]
-        repo_name = repo_name[:-4] if repo_name.endswith('.git') else repo_name
-        repo_slug = re.sub(r"[^a-z0-9-]", "-", repo_name.lower()).strip("-") or "repo"
-        return f"minfy-{env}-{repo_slug}-{slug}"
-
     bucket = _bucket_name(proj)
-    s3 = boto3.client('s3')
+    s3 = client('s3')
     # Check if bucket exists
     try:
         s3.head_bucket(Bucket=bucket)
@@ -35,7 +27,14 @@ def rollback_cmd(previous):
         click.secho(f"No bucket for env '{proj.get('current_env','dev')}'. Deploy first.", fg="yellow")
         return
 
-    versions = s3.list_object_versions(Bucket=bucket, Prefix='index.html').get('Versions', [])
+    records = history(s3, bucket)
+    releases = [r['id'] for r in records if is_release_id(r['id'])]
+    if releases:
+        _rollback_release(s3, bucket, releases, previous)
+        return
+
+    versions = [{'VersionId': r['index_version'], 'LastModified': record_time(r)}
+                for r in records if r.get('index_version')]
     if len(versions) < 2:
         click.secho('No previous version to roll back to.', fg='yellow')
         return
@@ -56,6 +55,28 @@ def rollback_cmd(previous):
     click.secho(f"Rolled back to Version {version_number}", fg='green')
     click.secho('Next: run minfy status to check deployment status.', fg='cyan')
 
+def _rollback_release(s3, bucket: str, releases: list[str], previous: bool):
+    live = current_release(s3, bucket)
+    # newest first, in the shape prompt_version expects
+    options = [{'VersionId': rid, 'LastModified': release_time(rid)} for rid in reversed(releases)]
+    if len(options) < 2:
+        click.secho('No previous version to roll back to.', fg='yellow')
+        return
+    if previous:
+        idx = releases.index(live) if live in releases else len(releases) - 1
+        if idx == 0:
+            click.secho('No previous version to roll back to.', fg='yellow')
+            return
+        target = releases[idx - 1]
+        label = f"release {target}"
+    else:
+        choice, version_number = prompt_version(options[:5])
+        target = choice['VersionId']
+        label = f"Version {version_number} (release {target})"
+    activate(s3, bucket, target, fallback=live)
+    click.secho(f"Rolled back to {label}", fg='green')
+    click.secho('Next: run minfy status to check deployment status.', fg='cyan')
+
 def prompt_version(options):
     click.echo('Select a version to roll back to:')
     # show oldest first
@@ -1,25 +1,18 @@
-import json, sys, re, hashlib
+import json, sys, hashlib
 import datetime
 from pathlib import Path
-import boto3, click
+import click
 from rich.console import Console
 from rich.table import Table
-from ..commands.config_cmd import config_file
+from ..aws import client, region as aws_region, website_url
+from ..commands.config_cmd import _bucket_name, config_file
+from ..ledger import find_record, history, record_time
+from ..releases import is_release_id
 
 console = Console()
 def _sha(url: str) -> str:
     return hashlib.sha1(url.encode()).hexdigest()[:6]
 
-def _bucket_name(proj: dict) -> str:
-    env  = proj.get("current_env", "dev")
-    raw  = proj["app_subdir"] if "app_subdir" in proj else "app"
-    slug = re.sub(r"[^a-z0-9-]", "-", raw.lower()).strip("-") or "app"
-    repo_url = proj.get('repo', '')
-    repo_name = repo_url.rstrip('/').split('/')[-1]
-    repo_name = repo_name[:-4] if repo_name.endswith('.git') else repo_name
-    repo_slug = re.sub(r"[^a-z0-9-]", "-", repo_name.lower()).strip("-") or "repo"
-    return f"minfy-{env}-{repo_slug}-{slug}"
-
 def format_time(dt) -> str:
     try:
         ist = datetime.timezone(datetime.timedelta(hours=5, minutes=30))
@@ -39,8 +32,8 @@ def status_cmd(verbose):
 
     proj   = json.loads(Path(config_file).read_text())
     bucket = _bucket_name(proj)
-    region = "ap-south-1"
-    s3     = boto3.client("s3", region_name=region)
+    region = aws_region()
+    s3     = client("s3", region)
     try:
         cur_vid = s3.get_object(Bucket=bucket, Key="__minfy_current.txt")["Body"].read().decode()
     except s3.exceptions.NoSuchBucket:
@@ -50,16 +43,19 @@ def status_cmd(verbose):
         click.secho("Bucket exists but no deploy marker found. Deploy first.", fg="yellow")
         return
 
-    vers = s3.list_object_versions(Bucket=bucket, Prefix="index.html")["Versions"]
-    vers_sorted = sorted(vers, key=lambda v: v["LastModified"], reverse=True)
-    idx = next((i for i, v in enumerate(vers_sorted) if v["VersionId"] == cur_vid), None)
-    cur_obj = vers_sorted[idx] if idx is not None else vers_sorted[0]
-    tag = f"deployment #{len(vers_sorted) - idx}" if idx is not None else "(unknown)"
-    ts  = format_time(cur_obj['LastModified'])
-    url = f"http://{bucket}.s3-website.{region}.amazonaws.com"
+    records = history(s3, bucket)
+    idx = find_record(records, cur_vid)
+    record = records[idx] if idx is not None else None
+    tag = f"deployment #{idx + 1}" if record else "(unknown)"
+    ts  = format_time(record_time(record)) if record else "unknown time"
+    url = website_url(bucket, region)
     table = Table(show_header=False, box=None)
     table.add_row("URL:", f"[bold cyan]{url}[/]")
     table.add_row("Current:", f"[green]{tag}[/]  ({ts})")
-    if verbose:
+    if record and record.get("commit"):
+        table.add_row("Commit:", record["commit"][:12])
+    if verbose and is_release_id(cur_vid):
+        table.add_row("Release:", f"releases/{cur_vid}/")
+    elif verbose:
         table.add_row("Version:", f"VersionId = {cur_vid}")
     console.print(table)
\ No newline at end of file
@@ -0,0 +1,42 @@
+import json
+import sys
+from pathlib import Path
+import click
+from ..commands.config_cmd import config_file, config_lock, save_config
+from ..mirrors import GitError, checkout, is_sparse, resolve, set_sparse, sparse_for, sync_mirror
+
+@click.command("update")
+@click.option("--ref", default=None, metavar="BRANCH|TAG|SHA",
+              help="Switch to another branch, tag or commit and follow it from now on")
+def update_cmd(ref):
+    """Fetch new commits and move the workspace to them."""
+    if not config_file.exists():
+        click.secho("No minfy project found. "
+        "Run 'minfy init' to create a new project.", fg="red")
+        sys.exit(1)
+    # exclusive: a running deploy keeps building from the commit it started with
+    with config_lock():
+        proj = json.loads(config_file.read_text())
+        target = ref or proj.get("ref")
+        click.secho(f"Fetching {proj['repo']} …", fg="cyan")
+        dest = Path(proj["local_path"])
+        try:
+            mirror = sync_mirror(proj["repo"])
+            commit = resolve(mirror, target)
+            sparse = is_sparse(dest)
+            previous = checkout(mirror, dest, commit)
+            if sparse:
+                # the new commit may depend on other local packages
+                set_sparse(dest, sparse_for(proj, mirror, commit))
+        except GitError as err:
+            click.secho(f"Update failed: {err}", fg="red")
+            sys.exit(1)
+        if ref and ref != proj.get("ref"):
+            proj["ref"] = ref
+            save_config(proj)
+    if previous == commit:
+        click.secho(f"Already up to date at {commit[:12]} ({target or 'default branch'}).", fg="green")
+    else:
+        click.secho(f"Updated {proj['local_path']} from {(previous or 'nothing')[:12]} to {commit[:12]}.",
+                    fg="green")
+    click.echo("Next: run minfy deploy to publish it.")
@@ -0,0 +1,240 @@
+"""
+Pre-compression of text assets before upload.
+
+Eligible files are compressed in a process pool. gzip is always tried; brotli is
+tried when enabled and the optional `brotli` package is installed. The smaller
+encoding is kept only if it actually saves bytes. Decisions and compressed
+blobs are cached under `.minfy/cache/compress`, keyed by content hash, so
+unchanged files are not recompressed on the next deploy. Several deploys may
+share the cache at once: the index is merged and rewritten under a file lock,
+and blobs used in the last `EVICT_MIN_AGE` seconds are never evicted, since
+another deploy may still be uploading them.
+
+Brotli is off by default: the S3 website endpoint is plain HTTP, and browsers
+only advertise `br` over HTTPS. Enable it when a CDN serves the bucket over TLS.
+"""
+import contextlib
+import gzip
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+
+from .config import HOME_DIR
+from .upload import UploadJob
+
+try:
+    import brotli
+except ImportError:  # optional dependency: pip install "minfy[compression]"
+    brotli = None
+
+try:
+    import fcntl
+except ImportError:  # Windows: only deploys within one process are serialised
+    fcntl = None
+
+CACHE_DIR = HOME_DIR / "cache" / "compress"
+INDEX_FILE = CACHE_DIR / "index.json"
+LOCK_FILE = CACHE_DIR / "index.lock"
+EVICT_MIN_AGE = 3600
+ELIGIBLE_SUFFIXES = {
+    ".html", ".htm", ".js", ".mjs", ".cjs", ".css", ".json", ".map", ".svg",
+    ".txt", ".xml", ".webmanifest", ".wasm", ".ico", ".ttf", ".otf", ".eot",
+}
+DEFAULT_COMPRESSION = {
+    "enabled": True,
+    "brotli": False,
+    "min_size": 1024,
+    "gzip_level": 9,
+    "brotli_quality": 11,
+    "cache_mb": 512,
+}
+_SUFFIX = {"gzip": ".gz", "br": ".br"}
+_thread_lock = threading.Lock()
+
+
+@dataclass
+class CompressionStats:
+    files: int = 0
+    compressed: int = 0
+    cached: int = 0
+    saved: int = 0
+
+
+def _sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _encode(data: bytes, use_brotli: bool, gzip_level: int, br_quality: int) -> tuple[str | None, bytes]:
+    """The smallest encoding of `data`, or `(None, data)` when none saves bytes."""
+    # mtime=0 keeps the output byte-identical across runs, so delta deploys can skip it
+    candidates = {"gzip": gzip.compress(data, compresslevel=gzip_level, mtime=0)}
+    if use_brotli and brotli is not None:
+        candidates["br"] = brotli.compress(data, quality=br_quality)
+    encoding, blob = min(candidates.items(), key=lambda kv: len(kv[1]))
+    return (encoding, blob) if len(blob) < len(data) else (None, data)
+
+
+def _compress(src: str, dst_stem: str, use_brotli: bool, gzip_level: int, br_quality: int):
+    """Process-pool worker: write the best encoding next to `dst_stem` and return (encoding, size)."""
+    data = Path(src).read_bytes()
+    encoding, blob = _encode(data, use_brotli, gzip_level, br_quality)
+    if encoding is None:
+        return None, len(data)
+    dst = Path(dst_stem + _SUFFIX[encoding])
+    tmp = dst.with_name(f"{dst.name}.{os.getpid()}.tmp")
+    tmp.write_bytes(blob)
+    os.replace(tmp, dst)
+    return encoding, len(blob)
+
+
+@contextlib.contextmanager
+def _locked():
+    """Exclusive use of the cache index, across threads and processes."""
+    with _thread_lock, open(LOCK_FILE, "a") as fh:
+        if fcntl:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+def _load_index() -> dict:
+    try:
+        return json.loads(INDEX_FILE.read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_index(index: dict):
+    tmp = INDEX_FILE.with_name(f"{INDEX_FILE.name}.{os.getpid()}-{threading.get_ident()}.tmp")
+    tmp.write_text(json.dumps(index))
+    os.replace(tmp, INDEX_FILE)
+
+
+def _evict(index: dict, limit: int, keep: set[str], cutoff: float):
+    """Drop least recently used blobs until the cache fits in `limit` bytes.
+
+    Blobs used at or after `cutoff` stay, even if the cache remains over the limit.
+    """
+    blobs = []
+    for path in (p for suffix in _SUFFIX.values() for p in CACHE_DIR.glob(f"*{suffix}")):
+        with contextlib.suppress(OSError):
+            st = path.stat()
+            blobs.append((st.st_mtime, st.st_size, path))
+    blobs.sort(key=lambda b: b[0])
+    total = sum(size for _, size, _ in blobs)
+    for mtime, size, blob in blobs:
+        if total <= limit or mtime >= cutoff:
+            break
+        if blob.name in keep:
+            continue
+        total -= size
+        index.pop(blob.name.split(".", 1)[0], None)
+        blob.unlink(missing_ok=True)
+
+
+def compress_jobs(jobs: list[UploadJob], settings: dict | None = None) -> CompressionStats:
+    """Swap eligible jobs over to their compressed blob and set `ContentEncoding`."""
+    cfg = {**DEFAULT_COMPRESSION, **(settings or {})}
+    stats = CompressionStats()
+    if not cfg["enabled"]:
+        return stats
+    use_brotli = bool(cfg["brotli"]) and brotli is not None
+    tag = f"g{cfg['gzip_level']}" + (f"b{cfg['brotli_quality']}" if use_brotli else "")
+    eligible = [j for j in jobs
+                if j.path.suffix.lower() in ELIGIBLE_SUFFIXES and j.size >= cfg["min_size"]]
+    if not eligible:
+        return stats
+    started = time.time()
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    with ThreadPoolExecutor(max_workers=os.cpu_count() or 4) as pool:
+        keys = [f"{sha}-{tag}" for sha in pool.map(lambda j: _sha256(j.path), eligible)]
+
+    with _locked():
+        index = _load_index()
+        misses = []
+        for job, key in zip(eligible, keys):
+            entry = index.get(key)
+            if entry is None:
+                misses.append((job, key))
+            elif entry["encoding"]:
+                try:
+                    # marks the blob as in use, so no other deploy evicts it now
+                    os.utime(CACHE_DIR / (key + _SUFFIX[entry["encoding"]]))
+                except FileNotFoundError:
+                    misses.append((job, key))
+    fresh = {}
+    if misses:
+        # spawn, not fork: deploy --all/--envs call this from worker threads that may hold locks
+        with ProcessPoolExecutor(mp_context=multiprocessing.get_context("spawn")) as pool:
+            futures = [
+                pool.submit(_compress, str(job.path), str(CACHE_DIR / key), use_brotli,
+                            cfg["gzip_level"], cfg["brotli_quality"])
+                for job, key in misses
+            ]
+            for (job, key), fut in zip(misses, futures):
+                encoding, size = fut.result()
+                index[key] = fresh[key] = {"encoding": encoding, "size": size}
+    stats.compressed = len(misses)
+    stats.cached = len(eligible) - len(misses)
+
+    in_use = set()
+    for job, key in zip(eligible, keys):
+        stats.files += 1
+        encoding = index[key]["encoding"]
+        if not encoding:
+            continue
+        blob = CACHE_DIR / (key + _SUFFIX[encoding])
+        in_use.add(blob.name)
+        stats.saved += job.size - index[key]["size"]
+        job.path = blob
+        job.size = index[key]["size"]
+        job.extra_args = {**job.extra_args, "ContentEncoding": encoding}
+
+    with _locked():
+        # other deploys may have added entries since this one read the index
+        index = {**_load_index(), **fresh}
+        _evict(index, int(cfg["cache_mb"] * 1024 * 1024), in_use, min(started, time.time() - EVICT_MIN_AGE))
+        _save_index(index)
+    return stats
+
+
+def gzip_bytes(data: bytes, settings: dict | None = None) -> tuple[bytes, str | None]:
+    """Compress a small in-memory document (the release entry HTML) the same way."""
+    cfg = {**DEFAULT_COMPRESSION, **(settings or {})}
+    if not cfg["enabled"] or len(data) < cfg["min_size"]:
+        return data, None
+    blob = gzip.compress(data, compresslevel=cfg["gzip_level"], mtime=0)
+    return (blob, "gzip") if len(blob) < len(data) else (data, None)
+
+
+def compress_body(name: str, data: bytes, settings: dict | None = None) -> tuple[bytes, str | None]:
+    """Compress an in-memory file, e.g. one streamed out of a build container, if it is eligible."""
+    cfg = {**DEFAULT_COMPRESSION, **(settings or {})}
+    if not cfg["enabled"] or Path(name).suffix.lower() not in ELIGIBLE_SUFFIXES or len(data) < cfg["min_size"]:
+        return data, None
+    encoding, blob = _encode(data, bool(cfg["brotli"]), cfg["gzip_level"], cfg["brotli_quality"])
+    return blob, encoding
+
+
+def decompress_body(data: bytes, encoding: str | None) -> bytes:
+    """Undo `Content-Encoding` on an object read back from the bucket."""
+    if encoding == "gzip":
+        return gzip.decompress(data)
+    if encoding == "br":
+        if brotli is None:
+            raise RuntimeError('reading brotli-encoded files needs pip install "minfy[compression]"')
+        return brotli.decompress(data)
+    return data
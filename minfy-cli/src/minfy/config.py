@@ -1,9 +1,8 @@
 from pathlib import Path
-import yaml
 from pydantic import BaseModel, Field, ValidationError
+# created on first write, not at import, so read-only commands leave no trace
 HOME_DIR = Path('.') / '.minfy'
 GLOBAL_CFG = HOME_DIR / "config.yaml"
-HOME_DIR.mkdir(exist_ok=True)
 
 class AWSAuth(BaseModel):
     access_key: str = Field(..., alias="aws_access_key_id")
@@ -11,8 +10,11 @@ class AWSAuth(BaseModel):
     session_token: str | None = Field(None, alias="aws_session_token")
     region: str = "ap-south-1"
     profile: str | None = None
+    endpoint_url: str | None = None
 
 def save_global(auth: AWSAuth):
+    import yaml
+    HOME_DIR.mkdir(exist_ok=True)
     GLOBAL_CFG.write_text(
         yaml.safe_dump(auth.model_dump(by_alias=True)), encoding='utf-8'
     )
@@ -24,6 +26,7 @@ def save_global(auth: AWSAuth):
 def load_global() -> AWSAuth | None:
     if not GLOBAL_CFG.exists():
         return None
+    import yaml
     try:
         data = yaml.safe_load(GLOBAL_CFG.read_text())
         return AWSAuth(**data)
@@ -0,0 +1,89 @@
+"""
+Delta deploys: figure out which files already exist in the bucket byte-for-byte.
+
+Every release keeps a manifest (`releases/<id>/__minfy_manifest.json`) mapping
+each key to the MD5 and upload headers it was written with. Buckets that predate
+release manifests are compared against the ETags of a paginated listing instead.
+Unchanged files are copied server-side from the live release rather than
+uploaded again.
+"""
+import hashlib
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from .upload import UploadJob
+
+MANIFEST_KEY = "__minfy_manifest.json"
+_CHUNK = 1024 * 1024
+
+
+def file_md5(path) -> str:
+    digest = hashlib.md5()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(_CHUNK), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def headers_sig(extra_args: dict) -> str:
+    return hashlib.sha1(json.dumps(extra_args, sort_keys=True).encode()).hexdigest()[:12]
+
+
+def hash_jobs(jobs: list[UploadJob], workers: int = 8):
+    """Fill in `job.md5` for every job, hashing files in parallel."""
+    todo = [j for j in jobs if not j.md5]
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for job, md5 in zip(todo, pool.map(lambda j: file_md5(j.path), todo)):
+            job.md5 = md5
+
+
+def load_remote_state(s3, bucket: str, prefix: str = "") -> tuple[dict, bool]:
+    """Return `({key: entry}, from_manifest)` for the files live under `prefix`."""
+    try:
+        body = s3.get_object(Bucket=bucket, Key=prefix + MANIFEST_KEY)["Body"].read()
+        return json.loads(body).get("files", {}), True
+    except s3.exceptions.NoSuchKey:
+        pass
+    except (ValueError, AttributeError):
+        pass
+    state = {}
+    for page in s3.get_paginator("list_objects_v2").paginate(Bucket=bucket, Prefix=prefix):
+        for obj in page.get("Contents", []):
+            key = obj["Key"][len(prefix):]
+            if key.startswith(("releases/", "__minfy_")):
+                continue
+            etag = obj.get("ETag", "").strip('"')
+            # multipart ETags are not content hashes, so those keys are always re-uploaded
+            if etag and "-" not in etag:
+                state[key] = {"md5": etag, "size": obj.get("Size", 0)}
+    return state, False
+
+
+def split_changed(jobs: list[UploadJob], remote: dict, always: tuple[str, ...] = ()):
+    """Split jobs into `(changed, unchanged)` against the remote state."""
+    changed, unchanged = [], []
+    for job in jobs:
+        entry = remote.get(job.key)
+        same = (
+            entry is not None
+            and entry.get("md5") == job.md5
+            and entry.get("headers", headers_sig(job.extra_args)) == headers_sig(job.extra_args)
+        )
+        if same and job.key.rsplit("/", 1)[-1] not in always:
+            unchanged.append(job)
+        else:
+            changed.append(job)
+    return changed, unchanged
+
+
+def write_manifest(s3, bucket: str, jobs: list[UploadJob], prefix: str = ""):
+    files = {
+        job.key: {"md5": job.md5, "size": job.size, "headers": headers_sig(job.extra_args)}
+        for job in jobs
+    }
+    s3.put_object(
+        Bucket=bucket, Key=prefix + MANIFEST_KEY,
+        Body=json.dumps({"version": 1, "files": files}, separators=(",", ":")).encode(),
+        ContentType="application/json",
+        CacheControl="no-store",
+    )
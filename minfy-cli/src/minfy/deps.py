@@ -0,0 +1,121 @@
+"""
+Dependency install cache for host builds.
+
+The install step is skipped when `node_modules` was produced from the same
+lockfile, package manager command and Node version. When it does run, the
+package manager uses a persistent download cache under `.minfy/cache/` and
+prefers it over the network. The download cache is trimmed, least recently
+used first, once it grows past `cache_mb`.
+"""
+import hashlib
+import re
+import shutil
+import subprocess
+from pathlib import Path
+
+import click
+
+from .config import HOME_DIR
+
+MARKER = ".minfy-deps"
+DEFAULT_DEPS = {"enabled": True, "cache_mb": 2048}
+LOCKFILES = (
+    ("pnpm-lock.yaml", "pnpm", "pnpm install --frozen-lockfile --prefer-offline"),
+    ("yarn.lock", "yarn", "yarn install --frozen-lockfile --prefer-offline"),
+    ("package-lock.json", "npm", "npm ci --prefer-offline --no-audit --no-fund --legacy-peer-deps"),
+)
+NO_LOCK_INSTALL = "npm install --prefer-offline --no-audit --no-fund --legacy-peer-deps"
+_INSTALL_RE = re.compile(r"^\s*((?:npm|yarn|pnpm)\s+(?:ci|install|i)\b[^&]*?)\s*&&\s*(.+)$")
+
+
+def split_install(build_cmd: str) -> tuple[str | None, str]:
+    """Split `npm ci ... && npm run build` into its install and build halves."""
+    m = _INSTALL_RE.match(build_cmd)
+    return (m.group(1), m.group(2)) if m else (None, build_cmd)
+
+
+def _lockfile(project: Path) -> tuple[Path | None, str, str]:
+    for name, manager, cmd in LOCKFILES:
+        if (project / name).exists():
+            return project / name, manager, cmd
+    return None, "npm", NO_LOCK_INSTALL
+
+
+def _node_version(env: dict) -> str:
+    try:
+        return subprocess.check_output(["node", "--version"], env=env, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def cache_dir(manager: str) -> Path:
+    return (HOME_DIR / "cache" / manager).resolve()
+
+
+def _cache_env(manager: str) -> dict:
+    path = str(cache_dir(manager))
+    if manager == "yarn":
+        return {"YARN_CACHE_FOLDER": path}
+    if manager == "pnpm":
+        return {"npm_config_store_dir": path, "npm_config_prefer_offline": "true"}
+    return {"npm_config_cache": path, "npm_config_prefer_offline": "true"}
+
+
+def deps_key(project: Path, install_cmd: str, env: dict) -> str:
+    lock, _, _ = _lockfile(project)
+    source = lock or project / "package.json"
+    digest = hashlib.sha256()
+    if source.exists():
+        digest.update(source.read_bytes())
+    digest.update(install_cmd.encode())
+    digest.update(_node_version(env).encode())
+    return digest.hexdigest()
+
+
+def _evict(manager: str, limit: int):
+    root = cache_dir(manager)
+    if not root.exists():
+        return
+    if manager == "pnpm":
+        # pnpm's store is hard-linked into projects; let pnpm decide what is unreferenced
+        subprocess.call(["pnpm", "store", "prune"], stdout=subprocess.DEVNULL)
+        return
+    files = [p for p in root.rglob("*") if p.is_file()]
+    total = sum(p.stat().st_size for p in files)
+    if total <= limit:
+        return
+    # npm's cacache and yarn refetch any content that has gone missing
+    for f in sorted(files, key=lambda p: p.stat().st_atime):
+        if total <= limit:
+            break
+        total -= f.stat().st_size
+        f.unlink(missing_ok=True)
+
+
+def ensure_dependencies(project: Path, env: dict, install_cmd: str | None = None,
+                        settings: dict | None = None) -> dict:
+    """Install node_modules unless they already match the lockfile; return the env to build with."""
+    cfg = {**DEFAULT_DEPS, **(settings or {})}
+    if not cfg["enabled"]:
+        if install_cmd:
+            subprocess.check_call(install_cmd, cwd=project, env=env, shell=True)
+        return env
+
+    _, _, default_cmd = _lockfile(project)
+    install_cmd = install_cmd or default_cmd
+    if not shutil.which(install_cmd.split()[0]):
+        install_cmd = NO_LOCK_INSTALL
+    manager = install_cmd.split()[0]
+    build_env = env | _cache_env(manager)
+    marker = project / "node_modules" / MARKER
+    key = deps_key(project, install_cmd, build_env)
+    if marker.exists() and marker.read_text().strip() == key:
+        click.secho("Dependencies unchanged – skipping install.", fg="cyan")
+        return build_env
+
+    click.secho(f"Installing dependencies ({install_cmd}) …", fg="cyan")
+    subprocess.check_call(install_cmd, cwd=project, env=build_env, shell=True)
+    marker.parent.mkdir(exist_ok=True)
+    marker.write_text(key)
+    _evict(manager, int(cfg["cache_mb"] * 1024 * 1024))
+    return build_env
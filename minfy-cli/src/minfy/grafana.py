@@ -0,0 +1,187 @@
+"""
+Small Grafana HTTP API client for `minfy monitor dashboard`.
+
+Each worker thread keeps one keep-alive connection, so a refresh costs a
+handful of TCP connections instead of one per request, and dashboards are
+imported in parallel. Failed requests are retried once on a new connection
+unless they are POSTs, which Grafana may already have handled. Datasources
+and dashboards are only pushed when their content changed since the last
+successful push to the same Grafana: a hash of each is kept in a small JSON
+state file. Deleting the file, or `force`, pushes everything again.
+"""
+import base64
+import hashlib
+import http.client
+import json
+import select
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import quote, urlsplit
+
+DEFAULT_WORKERS = 4
+# safe to send twice; a POST that may have reached Grafana is never resent
+IDEMPOTENT = {"GET", "HEAD", "PUT", "DELETE", "OPTIONS"}
+
+
+class GrafanaError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(f"HTTP {status}: {message}")
+        self.status = status
+
+
+def _stale(conn: http.client.HTTPConnection) -> bool:
+    """True if the server closed this idle keep-alive connection; it then reads as EOF."""
+    if conn.sock is None:
+        return False
+    try:
+        return bool(select.select([conn.sock], [], [], 0)[0])
+    except (OSError, ValueError):
+        return True
+
+
+def _digest(body: dict) -> str:
+    return hashlib.sha256(json.dumps(body, sort_keys=True).encode()).hexdigest()
+
+
+class GrafanaClient:
+    def __init__(self, url: str, user: str = "admin", password: str = "admin",
+                 state_file: Path | None = None, timeout: float = 10):
+        parts = urlsplit(url)
+        self.url = url.rstrip("/")
+        self._https = parts.scheme == "https"
+        self._netloc = parts.netloc
+        self._base = parts.path.rstrip("/")
+        self._timeout = timeout
+        self._headers = {
+            "Authorization": "Basic " + base64.b64encode(f"{user}:{password}".encode()).decode(),
+            "Content-Type": "application/json",
+            "Accept": "application/json",
+        }
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections: list[http.client.HTTPConnection] = []
+        self.state_file = state_file
+        self._state = self._load_state()
+
+    # -- transport --------------------------------------------------------
+
+    def _connection(self) -> http.client.HTTPConnection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            cls = http.client.HTTPSConnection if self._https else http.client.HTTPConnection
+            conn = cls(self._netloc, timeout=self._timeout)
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def _drop(self, conn: http.client.HTTPConnection):
+        conn.close()
+        self._local.conn = None
+
+    def request(self, method: str, path: str, body: dict | None = None):
+        """Send one API request on this thread's connection and return the decoded JSON."""
+        payload = json.dumps(body).encode() if body is not None else None
+        for attempt in (1, 2):
+            conn = self._connection()
+            if _stale(conn):
+                # closed while idle: reconnect before sending anything
+                self._drop(conn)
+                conn = self._connection()
+            try:
+                conn.request(method, self._base + path, payload, self._headers)
+                resp = conn.getresponse()
+                data = resp.read()
+                break
+            except (http.client.HTTPException, OSError):
+                self._drop(conn)
+                # the request may have been handled; only idempotent ones are retried
+                if attempt == 2 or method not in IDEMPOTENT:
+                    raise
+        if resp.will_close:
+            self._drop(conn)
+        try:
+            decoded = json.loads(data) if data else None
+        except ValueError:
+            decoded = None
+        if resp.status >= 400:
+            message = decoded.get("message") if isinstance(decoded, dict) else None
+            raise GrafanaError(resp.status, message or data.decode(errors="replace")[:200])
+        return decoded
+
+    def close(self):
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+
+    # -- change tracking --------------------------------------------------
+
+    def _load_state(self) -> dict:
+        try:
+            return json.loads(self.state_file.read_text()).get(self.url, {})
+        except (AttributeError, OSError, ValueError):
+            return {}
+
+    def save_state(self):
+        if self.state_file is None:
+            return
+        try:
+            everything = json.loads(self.state_file.read_text())
+        except (OSError, ValueError):
+            everything = {}
+        everything[self.url] = self._state
+        self.state_file.parent.mkdir(parents=True, exist_ok=True)
+        self.state_file.write_text(json.dumps(everything, indent=2))
+
+    def _remember(self, key: str, **entry):
+        with self._lock:
+            self._state[key] = entry
+
+    # -- API --------------------------------------------------------------
+
+    def ensure_datasource(self, datasource: dict, force: bool = False) -> tuple[str | None, bool]:
+        """Create or update a datasource by name; returns `(uid, pushed)`."""
+        key, digest = f"datasource:{datasource['name']}", _digest(datasource)
+        known = self._state.get(key)
+        if not force and known and known.get("hash") == digest:
+            return known.get("uid"), False
+        try:
+            existing = self.request("GET", f"/api/datasources/name/{quote(datasource['name'])}")
+        except GrafanaError as err:
+            if err.status != 404:
+                raise
+            existing = None
+        if existing:
+            body = {**existing, **datasource}
+            self.request("PUT", f"/api/datasources/uid/{existing['uid']}", body)
+            uid = existing["uid"]
+        else:
+            created = self.request("POST", "/api/datasources", datasource) or {}
+            uid = (created.get("datasource") or {}).get("uid")
+        self._remember(key, hash=digest, uid=uid)
+        return uid, True
+
+    def import_dashboard(self, dashboard: dict, force: bool = False) -> bool:
+        """Import a dashboard unless this exact content was imported before; True if it was sent."""
+        key, digest = f"dashboard:{dashboard.get('uid') or dashboard.get('title')}", _digest(dashboard)
+        known = self._state.get(key)
+        if not force and known and known.get("hash") == digest:
+            return False
+        self.request("POST", "/api/dashboards/db", {"dashboard": dashboard, "overwrite": True})
+        self._remember(key, hash=digest)
+        return True
+
+    def import_dashboards(self, dashboards: dict[str, dict], workers: int = DEFAULT_WORKERS,
+                          force: bool = False) -> dict[str, str]:
+        """Import `{name: dashboard}` in parallel; returns `{name: "imported" | "unchanged" | error}`."""
+        def _one(item):
+            name, dashboard = item
+            try:
+                return name, "imported" if self.import_dashboard(dashboard, force) else "unchanged"
+            except (GrafanaError, http.client.HTTPException, OSError) as err:
+                return name, f"failed: {err}"
+
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(dashboards) or 1))) as pool:
+            return dict(pool.map(_one, dashboards.items()))
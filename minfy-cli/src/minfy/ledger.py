@@ -0,0 +1,194 @@
+"""
+Deployment ledger.
+
+One compact record per deploy is kept in `__minfy_ledger.json` at the bucket
+root, oldest first:
+
+    {"id": "20250101120000-a1b2c3", "time": "2025-01-01T12:00:00+00:00",
+     "commit": "3f2a9c1…", "files": 412, "bytes": 1843200, "index_version": "…"}
+
+`deploy_cmd` appends to it with a conditional write, so two deploys racing on
+the same bucket cannot drop each other's record. The ledger is mirrored to
+`.minfy/ledger/<bucket>.json` together with its ETag. Reading history is then a
+single conditional GET that usually comes back `304 Not Modified`. Buckets that
+predate the ledger are scanned page by page with `minfy ledger rebuild`.
+"""
+import datetime
+import json
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import click
+from botocore.exceptions import ClientError, ParamValidationError
+
+from .config import HOME_DIR
+from .releases import is_release_id, list_releases, read_marker, read_release_meta, release_time
+
+LEDGER_KEY = "__minfy_ledger.json"
+LOCAL_DIR = HOME_DIR / "ledger"
+MAX_ATTEMPTS = 5
+
+
+def head_commit(repo: Path) -> str | None:
+    try:
+        return subprocess.check_output(["git", "-C", str(repo), "rev-parse", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def make_record(deploy_id: str, commit: str | None, files: int, total_bytes: int,
+                index_version: str | None, time: datetime.datetime | None = None) -> dict:
+    return {
+        "id": deploy_id,
+        "time": (time or release_time(deploy_id)).isoformat(),
+        "commit": commit,
+        "files": files,
+        "bytes": total_bytes,
+        "index_version": index_version,
+    }
+
+
+def record_time(record: dict) -> datetime.datetime:
+    return datetime.datetime.fromisoformat(record["time"])
+
+
+def _mirror(bucket: str) -> Path:
+    return LOCAL_DIR / f"{bucket}.json"
+
+
+def _read_mirror(bucket: str) -> dict:
+    try:
+        return json.loads(_mirror(bucket).read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_mirror(bucket: str, etag: str | None, records: list[dict]):
+    try:
+        LOCAL_DIR.mkdir(parents=True, exist_ok=True)
+        tmp = _mirror(bucket).with_suffix(".tmp")
+        tmp.write_text(json.dumps({"etag": etag, "records": records}))
+        tmp.replace(_mirror(bucket))
+    except OSError:
+        pass
+
+
+def _error_code(err: ClientError) -> str:
+    return str(err.response.get("Error", {}).get("Code", ""))
+
+
+def _fetch(s3, bucket: str, use_mirror: bool = True) -> tuple[list[dict] | None, str | None]:
+    """Current ledger and its ETag; (None, None) when the bucket has no ledger yet."""
+    local = _read_mirror(bucket) if use_mirror else {}
+    kwargs = {"IfNoneMatch": local["etag"]} if local.get("etag") else {}
+    try:
+        resp = s3.get_object(Bucket=bucket, Key=LEDGER_KEY, **kwargs)
+    except ClientError as err:
+        code = _error_code(err)
+        if code in ("304", "NotModified"):
+            return local["records"], local["etag"]
+        if code in ("NoSuchKey", "404"):
+            return None, None
+        raise
+    records = json.loads(resp["Body"].read())
+    _write_mirror(bucket, resp["ETag"], records)
+    return records, resp["ETag"]
+
+
+def load_ledger(s3, bucket: str) -> list[dict] | None:
+    return _fetch(s3, bucket)[0]
+
+
+def _put(s3, bucket: str, records: list[dict], etag: str | None) -> str:
+    body = json.dumps(records, separators=(",", ":")).encode()
+    kwargs = {"IfMatch": etag} if etag else {"IfNoneMatch": "*"}
+    try:
+        resp = s3.put_object(Bucket=bucket, Key=LEDGER_KEY, Body=body, ContentType="application/json",
+                             CacheControl="no-store", **kwargs)
+    except ParamValidationError:
+        # botocore too old for conditional writes: last writer wins
+        resp = s3.put_object(Bucket=bucket, Key=LEDGER_KEY, Body=body, ContentType="application/json",
+                             CacheControl="no-store")
+    _write_mirror(bucket, resp["ETag"], records)
+    return resp["ETag"]
+
+
+def update_ledger(s3, bucket: str, change) -> list[dict]:
+    """Apply `change(records) -> records` and write it back, retrying when another deploy won the race."""
+    for attempt in range(MAX_ATTEMPTS):
+        records, etag = _fetch(s3, bucket, use_mirror=attempt == 0)
+        records = change(list(records or []))
+        try:
+            _put(s3, bucket, records, etag)
+            return records
+        except ClientError as err:
+            if _error_code(err) not in ("PreconditionFailed", "ConditionalRequestConflict", "412", "409") \
+                    or attempt == MAX_ATTEMPTS - 1:
+                raise
+    return records
+
+
+def append_record(s3, bucket: str, record: dict) -> list[dict]:
+    return update_ledger(s3, bucket, lambda records: [r for r in records if r["id"] != record["id"]] + [record])
+
+
+def scan_history(s3, bucket: str, workers: int = 16) -> list[dict]:
+    """Rebuild ledger records from the bucket itself, paging through every listing."""
+    releases = list_releases(s3, bucket)
+    if releases:
+        def _record(rid):
+            try:
+                meta = read_release_meta(s3, bucket, rid)
+            except ClientError:
+                meta = {}
+            return make_record(rid, None, meta.get("files", 0), meta.get("bytes", 0), None)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(_record, releases))
+
+    records = []
+    paginator = s3.get_paginator("list_object_versions")
+    for page in paginator.paginate(Bucket=bucket, Prefix="index.html"):
+        for v in page.get("Versions", []):
+            if v["Key"] == "index.html":
+                records.append(make_record(v["VersionId"], None, 0, 0, v["VersionId"],
+                                           time=v["LastModified"]))
+    return sorted(records, key=lambda r: r["time"])
+
+
+def rebuild_ledger(s3, bucket: str) -> list[dict]:
+    scanned = scan_history(s3, bucket)
+
+    def _merge(records):
+        # keep what deploys recorded themselves (commit, index version) over scanned guesses
+        known = {r["id"]: r for r in records}
+        merged = {r["id"]: known.get(r["id"], r) for r in scanned}
+        return sorted(merged.values(), key=lambda r: r["time"])
+    return update_ledger(s3, bucket, _merge)
+
+
+def history(s3, bucket: str) -> list[dict]:
+    """Deploy history, oldest first; scanned on the fly when the bucket has no ledger yet."""
+    records = load_ledger(s3, bucket)
+    if records is None:
+        click.secho("No deployment ledger in this bucket; run 'minfy ledger rebuild' to speed this up.",
+                    fg="yellow")
+        records = scan_history(s3, bucket)
+    return records
+
+
+def find_record(records: list[dict], marker: str) -> int | None:
+    """Position of the deploy `marker` (release id or index.html VersionId) refers to."""
+    return next((i for i, r in enumerate(records)
+                 if marker in (r["id"], r.get("index_version"))), None)
+
+
+def deployed_at(s3, bucket: str) -> datetime.datetime | None:
+    """When the live deployment was made, for both release and legacy in-place buckets."""
+    marker = read_marker(s3, bucket)
+    if is_release_id(marker):
+        return release_time(marker)
+    records = load_ledger(s3, bucket) or scan_history(s3, bucket)
+    idx = find_record(records, marker)
+    return record_time(records[idx]) if idx is not None else None
@@ -0,0 +1,239 @@
+"""
+Clone cache behind `minfy init` and `minfy update`.
+
+Each repository URL gets one bare mirror under `.minfy/mirrors`, or under
+`$MINFY_MIRROR_DIR` (point it at a directory CI keeps between runs). The first
+init clones it; after that a refresh is a `git fetch` of only the new objects.
+The workspace is a detached worktree of the mirror, so moving it to another
+commit copies no history. The workspace is minfy's build checkout: changes to
+tracked files there are discarded when it moves.
+
+Mirrors are partial clones (`--filter=blob:none`): trees and commits come down
+up front, file contents only when something is checked out. App folders are
+found from the trees alone, and the workspace is a sparse checkout (cone mode)
+of the deployed apps plus the local packages they depend on (`file:`, `link:`
+and `workspace:` dependencies) and any `sparse_paths` from `.minfy.json`. Cone
+mode always includes the files at the repository root, so workspace manifests
+and lockfiles are there too.
+"""
+import contextlib
+import hashlib
+import json
+import os
+import posixpath
+import shutil
+import subprocess
+from pathlib import Path
+
+from .config import HOME_DIR
+from .scan import PRUNE_DIRS
+
+try:
+    import fcntl
+except ImportError:  # Windows: concurrent fetches into one mirror are not serialised
+    fcntl = None
+
+MIRROR_DIR = HOME_DIR / "mirrors"
+# branches and tags only; a --mirror clone would also pull every pull-request ref
+FETCH_REFSPEC = "+refs/heads/*:refs/heads/*"
+APP_MANIFESTS = ("package.json", "angular.json")
+DEP_FIELDS = ("dependencies", "devDependencies", "peerDependencies", "optionalDependencies")
+LOCAL_DEPS = ("file:", "link:", "portal:")
+
+
+class GitError(Exception):
+    """A git step failed; the message is shown to the user as-is."""
+
+
+def _git(*args: str) -> str:
+    result = subprocess.run(["git", *args], capture_output=True, text=True)
+    if result.returncode:
+        raise GitError(result.stderr.strip() or f"git {args[0]} failed")
+    return result.stdout.strip()
+
+
+def mirror_path(url: str) -> Path:
+    name = url.rstrip("/").split("/")[-1].removesuffix(".git") or "repo"
+    root = Path(os.environ.get("MINFY_MIRROR_DIR") or MIRROR_DIR)
+    return root / f"{name}-{hashlib.sha1(url.encode()).hexdigest()[:10]}.git"
+
+
+@contextlib.contextmanager
+def _locked(mirror: Path):
+    with open(mirror.with_name(mirror.name + ".lock"), "a") as fh:
+        if fcntl:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+def sync_mirror(url: str) -> Path:
+    """Clone or fetch the mirror of `url` and return its path."""
+    mirror = mirror_path(url)
+    mirror.parent.mkdir(parents=True, exist_ok=True)
+    with _locked(mirror):
+        if (mirror / "HEAD").exists():
+            _git("-C", str(mirror), "fetch", "--prune", "--tags", "origin")
+            return mirror
+        staging = mirror.with_name(mirror.name + ".tmp")
+        shutil.rmtree(staging, ignore_errors=True)
+        _git("clone", "--bare", "--filter=blob:none", url, str(staging))
+        _git("-C", str(staging), "config", "remote.origin.fetch", FETCH_REFSPEC)
+        staging.rename(mirror)
+    return mirror
+
+
+def resolve(mirror: Path, ref: str | None = None) -> str:
+    """Commit of `ref` (branch, tag or sha) in the mirror; the default branch when empty."""
+    try:
+        return _git("-C", str(mirror), "rev-parse", "--verify", f"{ref or 'HEAD'}^{{commit}}")
+    except GitError:
+        if not ref:
+            raise
+    try:
+        # a commit no branch points at; most servers still hand it out by id
+        _git("-C", str(mirror), "fetch", "origin", ref)
+        return _git("-C", str(mirror), "rev-parse", "--verify", "FETCH_HEAD^{commit}")
+    except GitError:
+        raise GitError(f"Unknown branch, tag or commit '{ref}'") from None
+
+
+def _is_worktree_of(dest: Path, mirror: Path) -> bool:
+    try:
+        common = _git("-C", str(dest), "rev-parse", "--git-common-dir")
+    except GitError:
+        return False
+    return (dest / common).resolve() == mirror.resolve()
+
+
+def _files(repo: Path, commit: str) -> list[str]:
+    out = _git("-C", str(repo), "ls-tree", "-r", "-z", "--name-only", "--full-tree", commit)
+    return [p for p in out.split("\0") if p]
+
+
+def _pruned(folder: str) -> bool:
+    return any(part in PRUNE_DIRS or part.startswith(".") for part in folder.split("/"))
+
+
+def tree_app_dirs(repo: Path, commit: str, names: tuple[str, ...] = APP_MANIFESTS,
+                  max_depth: int = 6) -> list[str]:
+    """App folders at `commit`, by the rules of `init.find_app_directories`, read from git trees only."""
+    by_depth: dict[int, set[str]] = {}
+    for path in _files(repo, commit):
+        folder, _, name = path.rpartition("/")
+        if name not in names:
+            continue
+        if not folder:
+            return ["."]
+        depth = folder.count("/") + 1
+        if depth <= max_depth and not _pruned(folder):
+            by_depth.setdefault(depth, set()).add(folder)
+    return sorted(by_depth[min(by_depth)]) if by_depth else []
+
+
+def _manifest(repo: Path, commit: str, folder: str) -> dict:
+    try:
+        return json.loads(_git("-C", str(repo), "show", f"{commit}:{posixpath.join(folder, 'package.json')}"))
+    except (GitError, ValueError):
+        return {}
+
+
+def sparse_paths(repo: Path, commit: str, apps: list[str], extra: tuple[str, ...] = ()) -> list[str] | None:
+    """Folders a sparse checkout of `apps` needs at `commit`; None when an app is the repo root."""
+    if "." in apps:
+        return None
+    packages = None
+    wanted, todo = set(), list(apps)
+    while todo:
+        folder = posixpath.normpath(todo.pop())
+        if folder in wanted or folder == "." or folder.startswith(".."):
+            continue
+        wanted.add(folder)
+        manifest = _manifest(repo, commit, folder)
+        for field in DEP_FIELDS:
+            for name, spec in (manifest.get(field) or {}).items():
+                spec = str(spec)
+                if spec.startswith(LOCAL_DEPS):
+                    target = posixpath.join(folder, spec.split(":", 1)[1])
+                    todo.append(posixpath.dirname(target) if target.endswith((".tgz", ".tar.gz")) else target)
+                elif spec.startswith("workspace:"):
+                    if packages is None:
+                        packages = sorted({p.rpartition("/")[0] for p in _files(repo, commit)
+                                           if p.endswith("/package.json") and not _pruned(p.rpartition("/")[0])})
+                    # packages/ui for @scope/ui is the usual layout, so those are read first
+                    short = name.rsplit("/", 1)[-1]
+                    for candidate in sorted(packages, key=lambda d: posixpath.basename(d) != short):
+                        if _manifest(repo, commit, candidate).get("name") == name:
+                            todo.append(candidate)
+                            break
+    return sorted(wanted | {posixpath.normpath(p) for p in extra})
+
+
+def sparse_for(project_info: dict, repo: Path | None = None, commit: str = "HEAD") -> list[str] | None:
+    """Sparse set of a project: its app folder, every app of `apps`, and their local dependencies."""
+    apps = [project_info["app_subdir"], *(project_info.get("apps") or [])]
+    return sparse_paths(repo or Path(project_info["local_path"]), commit, apps,
+                        tuple(project_info.get("sparse_paths") or ()))
+
+
+def is_sparse(dest: Path) -> bool:
+    try:
+        return _git("-C", str(dest), "config", "--get", "core.sparseCheckout") == "true"
+    except GitError:
+        return False
+
+
+def set_sparse(dest: Path, paths: list[str] | None) -> bool:
+    """Limit the workspace to `paths`, or check out everything for None; True if anything changed."""
+    current = _git("-C", str(dest), "sparse-checkout", "list").splitlines() if is_sparse(dest) else None
+    if paths is None:
+        if current is None:
+            return False
+        _git("-C", str(dest), "sparse-checkout", "disable")
+        return True
+    if current is not None and sorted(current) == sorted(paths):
+        return False
+    _git("-C", str(dest), "sparse-checkout", "set", "--cone", *paths)
+    return True
+
+
+def sync_sparse(project_info: dict) -> bool:
+    """Follow `app_subdir`/`apps` changes in a sparse workspace; full checkouts are left alone."""
+    dest = Path(project_info["local_path"])
+    if not is_sparse(dest):
+        return False
+    return set_sparse(dest, sparse_for(project_info))
+
+
+def checkout(mirror: Path, dest: Path, commit: str, sparse: list[str] | None = None) -> str | None:
+    """Move the workspace `dest` to `commit`, creating it as a worktree of `mirror` if needed.
+
+    A new workspace is a sparse checkout of `sparse` when given; an existing one
+    keeps its sparse set unless `sparse` replaces it. Returns the previous commit.
+    """
+    previous = None
+    if (dest / ".git").exists():
+        with contextlib.suppress(GitError):
+            previous = _git("-C", str(dest), "rev-parse", "HEAD")
+        if _is_worktree_of(dest, mirror):
+            if sparse is not None:
+                set_sparse(dest, sparse)
+            if previous != commit:
+                _git("-C", str(dest), "checkout", "--force", "--detach", "--quiet", commit)
+            return previous
+        # a standalone clone made before the clone cache
+        shutil.rmtree(dest)
+    elif dest.exists() and any(dest.iterdir()):
+        raise GitError(f"{dest} exists and is not a git checkout; move it away first.")
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    _git("-C", str(mirror), "worktree", "prune")
+    # no checkout yet: with a sparse set only the blobs it covers are ever downloaded
+    _git("-C", str(mirror), "worktree", "add", "--force", "--detach", "--no-checkout",
+         str(dest.resolve()), commit)
+    if sparse is not None:
+        _git("-C", str(dest), "sparse-checkout", "set", "--cone", *sparse)
+    _git("-C", str(dest), "checkout", "--force", "--detach", "--quiet", commit)
+    return previous
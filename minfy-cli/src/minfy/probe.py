@@ -0,0 +1,265 @@
+"""
+Local latency prober behind `minfy monitor probe`.
+
+Each round GETs every target at the same time with asyncio and times the DNS
+lookup, TCP connect, TLS handshake, time to first byte and total. Timings go
+into histograms with fixed buckets, so memory stays the same however long the
+prober runs. The histograms are served in the Prometheus text format on a
+local port and can be rewritten to a small JSON snapshot after every round.
+Targets are plain URLs, so the prober can be pointed at a local HTTP server.
+"""
+import asyncio
+import contextlib
+import json
+import os
+import socket
+import ssl
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable
+from urllib.parse import urlsplit
+
+PHASES = ("dns", "connect", "tls", "ttfb", "total")
+# seconds; the same as the Prometheus client defaults, with 1 ms and 2.5 ms added for local targets
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Histogram:
+    def __init__(self, bounds: tuple[float, ...] = BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        for i, bound in enumerate(self.bounds):
+            if value <= bound:
+                break
+        else:
+            i = len(self.bounds)
+        self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> list[int]:
+        total, out = 0, []
+        for c in self.counts:
+            total += c
+            out.append(total)
+        return out
+
+    def quantile(self, q: float) -> float | None:
+        """Estimate by linear interpolation inside the bucket, as PromQL's histogram_quantile does."""
+        if not self.count:
+            return None
+        rank, seen, lower = q * self.count, 0, 0.0
+        for bound, c in zip(self.bounds, self.counts):
+            if c and seen + c >= rank:
+                return lower + (bound - lower) * (rank - seen) / c
+            seen += c
+            lower = bound
+        return self.bounds[-1]
+
+
+@dataclass
+class Timing:
+    """Phase durations of one probe in seconds; None for phases that didn't happen."""
+    dns: float | None = None
+    connect: float | None = None
+    tls: float | None = None
+    ttfb: float | None = None
+    total: float | None = None
+    status: int | None = None
+    error: str = ""
+
+    @property
+    def ok(self) -> bool:
+        return not self.error and self.status is not None and self.status < 400
+
+
+@dataclass
+class Target:
+    name: str
+    url: str
+    histograms: dict[str, Histogram] = field(default_factory=lambda: {p: Histogram() for p in PHASES})
+    success: int = 0
+    failure: int = 0
+    last: Timing | None = None
+    last_time: float = 0.0
+
+    def record(self, timing: Timing):
+        for phase in PHASES:
+            value = getattr(timing, phase)
+            if value is not None:
+                self.histograms[phase].observe(value)
+        if timing.ok:
+            self.success += 1
+        else:
+            self.failure += 1
+        self.last, self.last_time = timing, time.time()
+
+
+async def _timed_get(url: str, timing: Timing):
+    parts = urlsplit(url)
+    https = parts.scheme == "https"
+    host = parts.hostname or ""
+    port = parts.port or (443 if https else 80)
+    path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+    loop = asyncio.get_running_loop()
+
+    start = mark = loop.time()
+    infos = await loop.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    timing.dns = loop.time() - mark
+
+    mark = loop.time()
+    reader, writer = await asyncio.open_connection(infos[0][4][0], port)
+    timing.connect = loop.time() - mark
+    try:
+        if https:
+            mark = loop.time()
+            await writer.start_tls(ssl.create_default_context(), server_hostname=host)
+            timing.tls = loop.time() - mark
+        writer.write((f"GET {path} HTTP/1.1\r\nHost: {parts.netloc}\r\nUser-Agent: minfy-probe\r\n"
+                      f"Accept-Encoding: gzip, br\r\nConnection: close\r\n\r\n").encode())
+        await writer.drain()
+        status = await reader.readline()
+        timing.ttfb = loop.time() - start
+        fields = status.split()
+        if len(fields) < 2 or not fields[1].isdigit():
+            raise ConnectionError(status.decode(errors="replace").strip() or "empty response")
+        timing.status = int(fields[1])
+        # Connection: close, so the body ends at EOF
+        while await reader.read(65536):
+            pass
+        timing.total = loop.time() - start
+    finally:
+        writer.close()
+        with contextlib.suppress(OSError, ssl.SSLError):
+            await writer.wait_closed()
+
+
+async def probe_once(url: str, timeout: float = 10) -> Timing:
+    """Time one GET of `url`; errors and timeouts are recorded on the result, not raised."""
+    timing = Timing()
+    try:
+        await asyncio.wait_for(_timed_get(url, timing), timeout)
+    except asyncio.TimeoutError:
+        timing.error = f"timed out after {timeout:g}s"
+    except (OSError, ssl.SSLError, ValueError, IndexError) as err:
+        timing.error = str(err) or type(err).__name__
+    return timing
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", r"\\").replace('"', r'\"').replace("\n", r"\n")
+
+
+def render(targets: list[Target]) -> str:
+    """All targets in the Prometheus text exposition format."""
+    lines = ["# HELP minfy_probe_duration_seconds Duration of each phase of a probe.",
+             "# TYPE minfy_probe_duration_seconds histogram"]
+    for t in targets:
+        for phase, hist in t.histograms.items():
+            labels = f'target="{_label(t.name)}",url="{_label(t.url)}",phase="{phase}"'
+            for bound, count in zip((*map(repr, map(float, hist.bounds)), "+Inf"), hist.cumulative()):
+                lines.append(f'minfy_probe_duration_seconds_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f"minfy_probe_duration_seconds_sum{{{labels}}} {hist.sum!r}")
+            lines.append(f"minfy_probe_duration_seconds_count{{{labels}}} {hist.count}")
+    lines += ["# HELP minfy_probes_total Probes run, by result.", "# TYPE minfy_probes_total counter"]
+    for t in targets:
+        labels = f'target="{_label(t.name)}",url="{_label(t.url)}"'
+        lines.append(f'minfy_probes_total{{{labels},result="success"}} {t.success}')
+        lines.append(f'minfy_probes_total{{{labels},result="failure"}} {t.failure}')
+    lines += ["# HELP minfy_probe_success Whether the last probe succeeded.", "# TYPE minfy_probe_success gauge"]
+    for t in targets:
+        if t.last:
+            lines.append(f'minfy_probe_success{{target="{_label(t.name)}",url="{_label(t.url)}"}} {int(t.last.ok)}')
+    lines += ["# HELP minfy_probe_http_status HTTP status of the last probe.",
+              "# TYPE minfy_probe_http_status gauge"]
+    for t in targets:
+        if t.last and t.last.status is not None:
+            lines.append(f'minfy_probe_http_status{{target="{_label(t.name)}",url="{_label(t.url)}"}} {t.last.status}')
+    return "\n".join(lines) + "\n"
+
+
+def snapshot(targets: list[Target]) -> dict:
+    """Compact summary: counts, estimated p50/p90/p99 per phase and the last probe of every target."""
+    out = {"time": time.time(), "targets": {}}
+    for t in targets:
+        phases = {}
+        for phase, hist in t.histograms.items():
+            if hist.count:
+                phases[phase] = {"count": hist.count, "mean": round(hist.sum / hist.count, 6),
+                                 **{f"p{int(q * 100)}": round(hist.quantile(q), 6) for q in (0.5, 0.9, 0.99)}}
+        last = t.last
+        out["targets"][t.name] = {
+            "url": t.url, "success": t.success, "failure": t.failure, "phases": phases,
+            "last": last and {"time": t.last_time, "status": last.status, "error": last.error,
+                              **{p: getattr(last, p) for p in PHASES}},
+        }
+    return out
+
+
+def write_snapshot(targets: list[Target], path: Path):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(snapshot(targets), separators=(",", ":")))
+    os.replace(tmp, path)
+
+
+async def _serve_metrics(targets: list[Target], reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        request = await asyncio.wait_for(reader.readline(), 5)
+        while (await asyncio.wait_for(reader.readline(), 5)).strip():
+            pass  # headers
+        fields = request.split()
+        if len(fields) >= 2 and fields[1].split(b"?")[0] in (b"/", b"/metrics"):
+            status, body = "200 OK", render(targets).encode()
+        else:
+            status, body = "404 Not Found", b"not found\n"
+        writer.write((f"HTTP/1.1 {status}\r\nContent-Type: {CONTENT_TYPE}\r\n"
+                      f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n").encode() + body)
+        await writer.drain()
+    except (OSError, asyncio.TimeoutError):
+        pass
+    finally:
+        writer.close()
+
+
+async def run(targets: list[Target], interval: float = 15, timeout: float = 10, port: int | None = None,
+              bind: str = "127.0.0.1", snapshot_path: Path | None = None, rounds: int = 0,
+              on_result: Callable[[Target, Timing], None] | None = None,
+              on_listen: Callable[[str, int], None] | None = None):
+    """Probe every target each `interval` seconds, for `rounds` rounds or until cancelled.
+
+    `timeout` may not exceed `interval`: a round has to finish before the next one is due.
+    """
+    if timeout > interval:
+        raise ValueError(f"timeout ({timeout:g}s) is longer than the interval ({interval:g}s)")
+    server = None
+    if port is not None:
+        server = await asyncio.start_server(lambda r, w: _serve_metrics(targets, r, w), bind, port)
+        if on_listen:
+            on_listen(bind, server.sockets[0].getsockname()[1])
+    loop = asyncio.get_running_loop()
+    start, done = loop.time(), 0
+    try:
+        while True:
+            timings = await asyncio.gather(*(probe_once(t.url, timeout) for t in targets))
+            for target, timing in zip(targets, timings):
+                target.record(timing)
+                if on_result:
+                    on_result(target, timing)
+            if snapshot_path:
+                write_snapshot(targets, snapshot_path)
+            done += 1
+            if rounds and done >= rounds:
+                return
+            # fixed cadence: a slow round shortens the pause instead of shifting every later round
+            await asyncio.sleep(max(0.0, start + done * interval - loop.time()))
+    finally:
+        if server:
+            server.close()
+            await server.wait_closed()
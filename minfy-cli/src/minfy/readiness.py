@@ -0,0 +1,94 @@
+"""
+Readiness checks for the monitoring stack.
+
+Every component is probed at the same time with asyncio. A component counts as
+ready only when its health endpoint answers 200; an open port is not enough,
+since Prometheus and Grafana accept connections well before they serve. Failed
+attempts back off exponentially with jitter, so a slow instance is not hammered
+and a fast one is not over-waited. `host` and the component list are
+parameters, so the prober can be pointed at local stub servers.
+"""
+import asyncio
+import contextlib
+import random
+from dataclasses import dataclass
+from typing import Callable
+
+
+@dataclass(frozen=True)
+class Component:
+    name: str
+    port: int
+    path: str
+
+
+@dataclass
+class ProbeResult:
+    component: Component
+    ready: bool
+    seconds: float | None  # since probing started, when ready
+    attempts: int
+    error: str = ""
+
+
+COMPONENTS = (
+    Component("grafana", 3000, "/api/health"),
+    Component("prometheus", 9090, "/-/ready"),
+    Component("blackbox-exporter", 9115, "/metrics"),
+    Component("node-exporter", 9100, "/metrics"),
+)
+
+
+async def check(host: str, component: Component, timeout: float = 3.0):
+    """One GET of the component's health endpoint; raises unless it answers 200."""
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(host, component.port), timeout)
+    try:
+        writer.write((f"GET {component.path} HTTP/1.1\r\nHost: {host}:{component.port}\r\n"
+                      f"User-Agent: minfy\r\nConnection: close\r\n\r\n").encode())
+        await writer.drain()
+        status = await asyncio.wait_for(reader.readline(), timeout)
+    finally:
+        writer.close()
+        with contextlib.suppress(OSError):
+            await writer.wait_closed()
+    parts = status.split()
+    if len(parts) < 2 or parts[1] != b"200":
+        raise ConnectionError(status.decode(errors="replace").strip() or "empty response")
+
+
+async def _probe(host: str, component: Component, start: float, deadline: float, base_delay: float,
+                 max_delay: float, request_timeout: float,
+                 on_ready: Callable[[ProbeResult], None] | None) -> ProbeResult:
+    loop = asyncio.get_running_loop()
+    attempt, error = 0, ""
+    while True:
+        attempt += 1
+        try:
+            await check(host, component, request_timeout)
+            result = ProbeResult(component, True, loop.time() - start, attempt)
+            if on_ready:
+                on_ready(result)
+            return result
+        except (OSError, asyncio.TimeoutError) as err:
+            error = str(err) or type(err).__name__
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            return ProbeResult(component, False, None, attempt, error)
+        # half fixed, half random, so parallel probers do not retry in lockstep
+        delay = min(max_delay, base_delay * 2 ** (attempt - 1))
+        await asyncio.sleep(min(remaining, delay / 2 + random.uniform(0, delay / 2)))
+
+
+async def wait_ready(host: str, components=COMPONENTS, timeout: float = 300, base_delay: float = 0.5,
+                     max_delay: float = 15, request_timeout: float = 3.0,
+                     on_ready: Callable[[ProbeResult], None] | None = None) -> list[ProbeResult]:
+    """Probe every component until it is ready or `timeout` seconds have passed."""
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    return list(await asyncio.gather(*(
+        _probe(host, c, start, start + timeout, base_delay, max_delay, request_timeout, on_ready)
+        for c in components)))
+
+
+def wait_for_stack(host: str, **options) -> list[ProbeResult]:
+    return asyncio.run(wait_ready(host, **options))
@@ -0,0 +1,214 @@
+"""
+Immutable per-release prefixes.
+
+Every deploy is written under `releases/<id>/` and never modified afterwards.
+Which release the site serves is decided by a few root writes:
+
+* `index.html` – a copy of the release's entry HTML with asset URLs pointing
+  into the release prefix, so the files it loads are fetched without a redirect
+  (SPA deep links keep working through ErrorDocument);
+* website routing rules that redirect every top-level folder, such as `/assets/`
+  or `/about/`, into the release, and send missing keys inside the release to
+  the previously live one so tabs still running the old build can lazy-load
+  their chunks;
+* server-side copies of the release's root files (`sw.js`, `favicon.ico`),
+  since browsers won't register a service worker served through a redirect;
+* `__minfy_current.txt` – the id of the active release.
+
+Folders are never copied, so activating or rolling back costs the same
+however many pages and assets the site has.
+"""
+import datetime
+import json
+import re
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from .delta import load_remote_state
+
+RELEASES_PREFIX = "releases/"
+CURRENT_KEY = "__minfy_current.txt"
+ENTRY_KEY = "__minfy_entry.html"
+META_KEY = "__minfy_release.json"
+MAX_ROUTING_RULES = 50
+# the bucket policy grants s3:GetObject only, so S3 answers 403 for missing keys; 404 with s3:ListBucket
+MISSING_CODES = ("403", "404")
+COPY_WORKERS = 16
+LAYOUT = 2
+
+_ID_RE = re.compile(r"^\d{14}-[0-9a-f]{6}$")
+_TAG_RE = re.compile(r"<(script|link|img|source|video|audio|track|embed)\b[^>]*>", re.IGNORECASE)
+_ATTR_RE = re.compile(r"""(\s(?:src|href)\s*=\s*["'])([^"']*)(["'])""", re.IGNORECASE)
+_EXTERNAL_RE = re.compile(r"^(?:[a-z][a-z0-9+.-]*:|//|#)", re.IGNORECASE)
+
+
+def new_release_id() -> str:
+    now = datetime.datetime.now(datetime.timezone.utc)
+    return f"{now:%Y%m%d%H%M%S}-{uuid.uuid4().hex[:6]}"
+
+
+def is_release_id(value: str | None) -> bool:
+    return bool(value) and bool(_ID_RE.match(value))
+
+
+def release_prefix(release_id: str) -> str:
+    return f"{RELEASES_PREFIX}{release_id}/"
+
+
+def release_time(release_id: str) -> datetime.datetime:
+    return datetime.datetime.strptime(release_id[:14], "%Y%m%d%H%M%S").replace(
+        tzinfo=datetime.timezone.utc)
+
+
+def read_marker(s3, bucket: str) -> str:
+    return s3.get_object(Bucket=bucket, Key=CURRENT_KEY)["Body"].read().decode().strip()
+
+
+def current_release(s3, bucket: str) -> str | None:
+    try:
+        marker = read_marker(s3, bucket)
+    except Exception:
+        return None
+    return marker if is_release_id(marker) else None
+
+
+def list_releases(s3, bucket: str) -> list[str]:
+    """All release ids in the bucket, oldest first."""
+    ids = []
+    paginator = s3.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket, Prefix=RELEASES_PREFIX, Delimiter="/"):
+        for cp in page.get("CommonPrefixes", []):
+            rid = cp["Prefix"][len(RELEASES_PREFIX):].rstrip("/")
+            if is_release_id(rid):
+                ids.append(rid)
+    return sorted(ids)
+
+
+def rewrite_entry_html(html: str, prefix: str, subdir: str = "") -> str:
+    """Point same-site asset URLs of an entry HTML document at `/<prefix>`.
+
+    `subdir` is the folder of the entry document inside the release, which
+    relative URLs are resolved against.
+    """
+    base = "/" + prefix
+    rel_base = base + (subdir.strip("/") + "/" if subdir.strip("/") else "")
+
+    def _attr(m):
+        url = m.group(2)
+        if not url or _EXTERNAL_RE.match(url):
+            return m.group(0)
+        if url.startswith("/"):
+            return f"{m.group(1)}{base}{url[1:]}{m.group(3)}"
+        return f"{m.group(1)}{rel_base}{url.removeprefix('./')}{m.group(3)}"
+
+    return _TAG_RE.sub(lambda t: _ATTR_RE.sub(_attr, t.group(0)), html)
+
+
+def split_entries(keys) -> tuple[list[str], list[str], list[str]]:
+    """Split a release's keys into `(redirected folders, root files, overflow folders)`.
+
+    Every top-level folder gets a redirect rule and root files are copied to
+    the bucket root. Folders beyond the routing-rule limit are only reachable
+    through the release prefix; they are returned as the overflow.
+    """
+    folders: dict[str, int] = {}
+    root_files = []
+    for key in keys:
+        if key == "index.html" or key.startswith("__minfy_"):
+            continue
+        head, sep, _ = key.partition("/")
+        if sep:
+            folders[head + "/"] = folders.get(head + "/", 0) + 1
+        else:
+            root_files.append(key)
+    # rules are reserved for the previous-release fallback; the biggest folders keep theirs
+    ranked = sorted(folders, key=lambda f: (-folders[f], f))
+    limit = MAX_ROUTING_RULES - len(MISSING_CODES)
+    return sorted(ranked[:limit]), sorted(root_files), sorted(ranked[limit:])
+
+
+def write_release_meta(s3, bucket: str, release_id: str, keys, file_count: int, total_bytes: int):
+    entries, in_place, overflow = split_entries(keys)
+    meta = {
+        "id": release_id,
+        "layout": LAYOUT,
+        "created": release_time(release_id).isoformat(),
+        "entries": entries,
+        "in_place": in_place,
+        "overflow": overflow,
+        "files": file_count,
+        "bytes": total_bytes,
+    }
+    s3.put_object(Bucket=bucket, Key=release_prefix(release_id) + META_KEY,
+                  Body=json.dumps(meta).encode(), ContentType="application/json",
+                  CacheControl="no-store")
+    return meta
+
+
+def read_release_meta(s3, bucket: str, release_id: str) -> dict:
+    """The release's metadata; releases written by older versions get their layout recomputed."""
+    body = s3.get_object(Bucket=bucket, Key=release_prefix(release_id) + META_KEY)["Body"].read()
+    meta = json.loads(body)
+    if meta.get("layout") != LAYOUT:
+        files, _ = load_remote_state(s3, bucket, release_prefix(release_id))
+        meta["entries"], meta["in_place"], meta["overflow"] = split_entries(files)
+    return meta
+
+
+def website_config(release_id: str, entries: list[str], fallback: str | None = None) -> dict:
+    prefix = release_prefix(release_id)
+    config = {
+        "IndexDocument": {"Suffix": "index.html"},
+        "ErrorDocument": {"Key": "index.html"},
+    }
+    rules = []
+    if fallback and fallback != release_id:
+        rules += [{
+            "Condition": {"KeyPrefixEquals": prefix, "HttpErrorCodeReturnedEquals": code},
+            "Redirect": {"ReplaceKeyPrefixWith": release_prefix(fallback), "HttpRedirectCode": "302"},
+        } for code in MISSING_CODES]
+    rules += [{
+        "Condition": {"KeyPrefixEquals": entry},
+        "Redirect": {"ReplaceKeyPrefixWith": prefix + entry, "HttpRedirectCode": "302"},
+    } for entry in entries]
+    if rules:
+        config["RoutingRules"] = rules
+    return config
+
+
+def activate(s3, bucket: str, release_id: str, meta: dict | None = None,
+             fallback: str | None = None):
+    """Make `release_id` the live release with a few small writes, one per root file.
+
+    Returns the VersionId of the new root `index.html`.
+    """
+    meta = meta or read_release_meta(s3, bucket, release_id)
+    prefix = release_prefix(release_id)
+    previous = current_release(s3, bucket)
+    try:
+        stale = set(read_release_meta(s3, bucket, previous)["in_place"]) if previous else set()
+    except Exception:
+        stale = set()
+    in_place = meta.get("in_place", [])
+
+    def _copy(key: str):
+        s3.copy_object(Bucket=bucket, Key=key, CopySource={"Bucket": bucket, "Key": prefix + key})
+
+    with ThreadPoolExecutor(max_workers=COPY_WORKERS) as pool:
+        list(pool.map(_copy, in_place))
+    s3.put_bucket_website(
+        Bucket=bucket,
+        WebsiteConfiguration=website_config(release_id, meta.get("entries", []), fallback),
+    )
+    resp = s3.copy_object(
+        Bucket=bucket, Key="index.html",
+        CopySource={"Bucket": bucket, "Key": prefix + ENTRY_KEY},
+    )
+    s3.put_object(Bucket=bucket, Key=CURRENT_KEY, Body=release_id, CacheControl="no-store")
+    stale = sorted(stale - set(in_place))
+    for i in range(0, len(stale), 1000):
+        # root files the new release doesn't have any more
+        s3.delete_objects(Bucket=bucket, Delete={"Objects": [{"Key": k} for k in stale[i:i + 1000]],
+                                                 "Quiet": True})
+    return resp.get("VersionId")
+
@@ -0,0 +1,147 @@
+"""
+Retention for deploy buckets.
+
+Releases live under their own keys, so they are never "noncurrent" and are only
+removed by `minfy prune`, which keeps the newest `keep` releases. Root files that
+are rewritten on every deploy (`index.html`, the marker, ledger and website
+entry) do pile up noncurrent versions; a lifecycle rule expires them after
+`days` while always keeping the newest `keep`, and aborts multipart uploads that
+were never completed. Stored in `.minfy.json`:
+
+    "retention": {"keep": 10, "days": 30}
+
+Neither mechanism ever touches the release or index.html version named in
+`__minfy_current.txt`, nor the release the website falls back to for 404s. A
+lifecycle rule cannot exempt a single version, so it is only installed once the
+bucket serves releases, where nothing live is ever a noncurrent version.
+"""
+import itertools
+from dataclasses import dataclass, field
+
+from .bulk_delete import DEFAULT_WORKERS, DeleteStats, delete_versions, iter_versions
+from .ledger import update_ledger
+from .releases import (MISSING_CODES, RELEASES_PREFIX, is_release_id, list_releases, read_marker,
+                       release_prefix)
+
+DEFAULT_RETENTION = {"keep": 10, "days": 30}
+RULE_PREFIX = "minfy-"
+
+
+@dataclass
+class PrunePlan:
+    keep: list[str] = field(default_factory=list)
+    delete: list[str] = field(default_factory=list)
+
+
+def lifecycle_rules(keep: int, days: int) -> list[dict]:
+    return [
+        {
+            "ID": f"{RULE_PREFIX}noncurrent-versions",
+            "Filter": {"Prefix": ""},
+            "Status": "Enabled",
+            "NoncurrentVersionExpiration": {"NoncurrentDays": days,
+                                            **({"NewerNoncurrentVersions": min(keep, 100)} if keep else {})},
+        },
+        {
+            "ID": f"{RULE_PREFIX}incomplete-uploads",
+            "Filter": {"Prefix": ""},
+            "Status": "Enabled",
+            "AbortIncompleteMultipartUpload": {"DaysAfterInitiation": 1},
+        },
+        {
+            "ID": f"{RULE_PREFIX}delete-markers",
+            "Filter": {"Prefix": ""},
+            "Status": "Enabled",
+            "Expiration": {"ExpiredObjectDeleteMarker": True},
+        },
+    ]
+
+
+def apply_lifecycle(s3, bucket: str, settings: dict | None = None) -> bool:
+    """Install minfy's lifecycle rules, keeping any rules the user added themselves.
+
+    Returns False, changing nothing, for a legacy bucket whose live index.html
+    may be a noncurrent version after a rollback.
+    """
+    cfg = {**DEFAULT_RETENTION, **(settings or {})}
+    try:
+        marker = read_marker(s3, bucket)
+    except s3.exceptions.ClientError:
+        marker = None
+    if marker and not is_release_id(marker):
+        return False
+    try:
+        existing = s3.get_bucket_lifecycle_configuration(Bucket=bucket).get("Rules", [])
+    except s3.exceptions.ClientError:
+        existing = []
+    own = [r for r in existing if not r.get("ID", "").startswith(RULE_PREFIX)]
+    s3.put_bucket_lifecycle_configuration(
+        Bucket=bucket,
+        LifecycleConfiguration={"Rules": own + lifecycle_rules(int(cfg["keep"]), int(cfg["days"]))},
+    )
+    return True
+
+
+def _fallback_release(s3, bucket: str) -> str | None:
+    """The release that misses inside the live release fall back to (see `releases.website_config`)."""
+    try:
+        rules = s3.get_bucket_website(Bucket=bucket).get("RoutingRules", [])
+    except s3.exceptions.ClientError:
+        return None
+    for rule in rules:
+        target = rule.get("Redirect", {}).get("ReplaceKeyPrefixWith", "")
+        if rule.get("Condition", {}).get("HttpErrorCodeReturnedEquals") in MISSING_CODES \
+                and target.startswith(RELEASES_PREFIX):
+            return target[len(RELEASES_PREFIX):].rstrip("/")
+    return None
+
+
+def plan_prune(s3, bucket: str, keep: int) -> PrunePlan:
+    releases = list_releases(s3, bucket)
+    protected = {read_marker(s3, bucket), _fallback_release(s3, bucket)}
+    newest = set(releases[-keep:]) if keep > 0 else set()
+    plan = PrunePlan()
+    for rid in releases:
+        (plan.keep if rid in newest or rid in protected else plan.delete).append(rid)
+    return plan
+
+
+def _legacy_entries(s3, bucket: str, keep: int, marker: str):
+    """Noncurrent versions of an in-place bucket older than the `keep` newest index.html versions."""
+    index = sorted((v for v in iter_versions(s3, bucket, "index.html") if v["Key"] == "index.html"),
+                   key=lambda v: v["LastModified"], reverse=True)
+    if len(index) <= keep:
+        return
+    cutoff = index[max(keep, 1) - 1]["LastModified"]
+    for v in iter_versions(s3, bucket):
+        if v["IsLatest"] or v["VersionId"] == marker or v["Key"].startswith(RELEASES_PREFIX):
+            continue
+        if v["LastModified"] < cutoff:
+            yield v
+
+
+def prune(s3, bucket: str, keep: int, workers: int = DEFAULT_WORKERS, dry_run: bool = False,
+          on_batch=None) -> tuple[PrunePlan, DeleteStats]:
+    """Delete every release but the newest `keep` (and the live and fallback ones)."""
+    marker = read_marker(s3, bucket)
+    if not is_release_id(marker):
+        gone = set()
+
+        def _tracked():
+            for v in _legacy_entries(s3, bucket, keep, marker):
+                if v["Key"] == "index.html":
+                    gone.add(v["VersionId"])
+                yield v
+        stats = delete_versions(s3, bucket, _tracked(), workers, dry_run=dry_run, on_batch=on_batch)
+        if gone and not dry_run and stats.ok:
+            update_ledger(s3, bucket, lambda records: [r for r in records if r.get("index_version") not in gone])
+        return PrunePlan(delete=sorted(gone)), stats
+
+    plan = plan_prune(s3, bucket, keep)
+    entries = itertools.chain.from_iterable(
+        iter_versions(s3, bucket, release_prefix(rid)) for rid in plan.delete)
+    stats = delete_versions(s3, bucket, entries, workers, dry_run=dry_run, on_batch=on_batch)
+    if plan.delete and not dry_run and stats.ok:
+        doomed = set(plan.delete)
+        update_ledger(s3, bucket, lambda records: [r for r in records if r["id"] not in doomed])
+    return plan, stats
@@ -0,0 +1,177 @@
+"""
+Fast source scanning for `minfy detect`.
+
+The walker honours `.gitignore` files and never descends into dependency or
+build output folders. Files are searched as memory-mapped bytes on a thread
+pool, and per-file results are cached by mtime/size in
+`.minfy/cache/env-scan.json`, so re-running `minfy detect` only rescans what
+changed.
+"""
+import json
+import mmap
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from fnmatch import fnmatch
+from pathlib import Path
+
+from .config import HOME_DIR
+
+PRUNE_DIRS = {
+    "node_modules", "dist", "build", "out", ".git", ".next", ".angular", ".svelte-kit",
+    "coverage", ".cache", ".turbo", ".minfy", ".minfy_workspace", ".minfy_monitor",
+}
+SOURCE_SUFFIXES = (".js", ".jsx", ".ts", ".tsx", ".mjs", ".cjs", ".vue", ".svelte")
+# variables bundlers define themselves; referencing them does not call for an .env file
+BUILTIN_ENV = {"NODE_ENV", "PUBLIC_URL", "MODE", "DEV", "PROD", "BASE_URL", "SSR"}
+ENV_CACHE = HOME_DIR / "cache" / "env-scan.json"
+
+_ENV_REF = re.compile(
+    rb"(?:process\.env|import\.meta\.env)"
+    rb"(?:\.([A-Za-z_][A-Za-z0-9_]*)|\[\s*[\"']([A-Za-z_][A-Za-z0-9_]*)[\"']\s*\])"
+)
+
+
+class GitIgnore:
+    """Minimal .gitignore matcher: globs, anchored `/x`, directory-only `x/` and `**`."""
+
+    def __init__(self, patterns: list[tuple[str, bool, bool]] | None = None):
+        self.patterns = patterns or []
+
+    def child(self, directory: Path, rel_dir: str) -> "GitIgnore":
+        ignore_file = directory / ".gitignore"
+        if not ignore_file.is_file():
+            return self
+        added = []
+        try:
+            lines = ignore_file.read_text(errors="ignore").splitlines()
+        except OSError:
+            return self
+        for line in lines:
+            line = line.strip()
+            # negations are skipped: at worst a re-included file is not scanned
+            if not line or line.startswith(("#", "!")):
+                continue
+            dir_only = line.endswith("/")
+            line = line.strip("/")
+            if line.startswith("**/"):
+                line = line[3:]
+            line = line.replace("**", "*")
+            anchored = "/" in line
+            base = f"{rel_dir}/" if rel_dir else ""
+            added.append(((base + line) if anchored else line, anchored, dir_only))
+        return GitIgnore(self.patterns + added) if added else self
+
+    def ignored(self, rel_path: str, is_dir: bool) -> bool:
+        name = rel_path.rsplit("/", 1)[-1]
+        for pattern, anchored, dir_only in self.patterns:
+            if dir_only and not is_dir:
+                continue
+            if fnmatch(rel_path if anchored else name, pattern):
+                return True
+        return False
+
+
+def iter_files(root: Path, suffixes: tuple[str, ...] | None = None, prune=PRUNE_DIRS):
+    """Yield files under `root`, skipping pruned and git-ignored paths."""
+    stack = [(root, "", GitIgnore().child(root, ""))]
+    while stack:
+        directory, rel_dir, ignore = stack.pop()
+        try:
+            entries = list(os.scandir(directory))
+        except OSError:
+            continue
+        for entry in entries:
+            rel = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+            try:
+                is_dir = entry.is_dir(follow_symlinks=False)
+            except OSError:
+                continue
+            if is_dir:
+                if entry.name in prune or ignore.ignored(rel, True):
+                    continue
+                path = Path(entry.path)
+                stack.append((path, rel, ignore.child(path, rel)))
+            elif (suffixes is None or entry.name.endswith(suffixes)) and not ignore.ignored(rel, False):
+                yield Path(entry.path)
+
+
+def find_shallowest(root: Path, names: tuple[str, ...], max_depth: int = 6) -> list[Path]:
+    """Directories below `root` holding any of `names`, at the shallowest depth that has one.
+
+    The walk is breadth-first and pruned like `iter_files`, so a package.json
+    inside node_modules is never reached and huge monorepos stop at the first
+    level with a match.
+    """
+    level = [(root, "", GitIgnore().child(root, ""))]
+    for _ in range(max_depth):
+        found, deeper = [], []
+        for directory, rel_dir, ignore in level:
+            try:
+                entries = sorted(os.scandir(directory), key=lambda e: e.name)
+            except OSError:
+                continue
+            for entry in entries:
+                rel = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+                if (not entry.is_dir(follow_symlinks=False) or entry.name in PRUNE_DIRS
+                        or entry.name.startswith(".") or ignore.ignored(rel, True)):
+                    continue
+                path = Path(entry.path)
+                if any((path / name).is_file() for name in names):
+                    found.append(path)
+                else:
+                    deeper.append((path, rel, ignore.child(path, rel)))
+        if found:
+            return found
+        level = deeper
+    return []
+
+
+def _env_refs(path: Path) -> list[str]:
+    try:
+        with open(path, "rb") as fh:
+            if os.fstat(fh.fileno()).st_size == 0:
+                return []
+            with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                if mm.find(b"env") == -1:
+                    return []
+                return sorted({(m.group(1) or m.group(2)).decode() for m in _ENV_REF.finditer(mm)})
+    except (OSError, ValueError):
+        return []
+
+
+def _load_cache() -> dict:
+    try:
+        return json.loads(ENV_CACHE.read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+def scan_env_keys(src: Path, workers: int | None = None) -> set[str]:
+    """Every env variable referenced via `process.env` / `import.meta.env` under `src`."""
+    if not src.is_dir():
+        return set()
+    cache = _load_cache()
+    found, todo = set(), []
+    for path in iter_files(src, SOURCE_SUFFIXES):
+        try:
+            st = path.stat()
+        except OSError:
+            continue
+        key = str(path.resolve())
+        hit = cache.get(key)
+        if hit and hit[0] == st.st_mtime_ns and hit[1] == st.st_size:
+            found.update(hit[2])
+        else:
+            todo.append((key, path, st))
+    if todo:
+        with ThreadPoolExecutor(max_workers=workers or min(32, (os.cpu_count() or 4) * 2)) as pool:
+            for (key, _, st), refs in zip(todo, pool.map(lambda t: _env_refs(t[1]), todo)):
+                cache[key] = [st.st_mtime_ns, st.st_size, refs]
+                found.update(refs)
+        try:
+            ENV_CACHE.parent.mkdir(parents=True, exist_ok=True)
+            ENV_CACHE.write_text(json.dumps(cache))
+        except OSError:
+            pass
+    return found - BUILTIN_ENV
@@ -0,0 +1,251 @@
+"""
+Streaming publish of Docker build output.
+
+Rather than copying the build out of its container into a temp folder and then
+uploading that folder, `docker cp <container>:<path> -` is read as a tar stream
+and each file is handed to the upload pool as soon as it has been read, so
+uploads overlap the extraction. Files up to `SPOOL_MB` stay in memory, where
+the upload workers compress and hash them; bytes waiting for a worker count
+against the transfer policy's memory budget, so a fast stream cannot outrun
+the uploads. Larger files are spilled to a temp folder and sent once the stream
+ends, and links become server-side copies of their target. HTML entry points
+still go last. The container and the spill folder are always removed.
+"""
+import contextlib
+import hashlib
+import io
+import posixpath
+import shutil
+import subprocess
+import tarfile
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable
+
+from .cache_control import CachePolicy
+from .compress import compress_body, compress_jobs
+from .delta import hash_jobs, split_changed
+from .upload import (DEFAULT_CONCURRENCY, MB, TransferPolicy, UploadJob, UploadReport,
+                     _is_deferred, _upload_one, content_type, upload_jobs)
+
+SPOOL_MB = 8
+
+
+@dataclass
+class ContainerOutput:
+    """Build output still inside the Docker image it was built in; read when it is published."""
+    image: str
+    path: str
+    cache_key: str | None = None
+
+
+@dataclass
+class StreamResult:
+    report: UploadReport = field(default_factory=UploadReport)
+    jobs: list[UploadJob] = field(default_factory=list)
+    index_key: str | None = None  # shallowest index.html
+    index_html: bytes = b""
+    compressed: int = 0
+    saved: int = 0
+    unchanged: int = 0  # copied from `base_prefix` instead of uploaded
+    unchanged_bytes: int = 0
+
+
+@contextlib.contextmanager
+def container_tar(image: str, path: str):
+    """Yield a tar stream of `path` from a throwaway container of `image`."""
+    cid = subprocess.check_output(["docker", "create", image], text=True).strip()
+    proc = None
+    try:
+        proc = subprocess.Popen(["docker", "cp", f"{cid}:{path.rstrip('/')}/.", "-"],
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        try:
+            yield proc.stdout
+        except tarfile.TarError as err:
+            # an empty or cut-off stream usually means docker cp itself failed
+            with contextlib.suppress(subprocess.TimeoutExpired):
+                proc.wait(timeout=10)
+            if proc.returncode:
+                message = proc.stderr.read().decode(errors="replace").strip()
+                raise RuntimeError(f"docker cp failed: {message}") from err
+            raise
+        proc.stdout.read()
+        if proc.wait():
+            raise RuntimeError(f"docker cp failed: {proc.stderr.read().decode(errors='replace').strip()}")
+    finally:
+        if proc and proc.poll() is None:
+            proc.kill()
+            proc.wait()
+        subprocess.call(["docker", "rm", "-f", cid], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def _member_key(name: str) -> str:
+    name = name.lstrip("/")
+    while name.startswith("./"):
+        name = name[2:]
+    return "" if name == "." else name.rstrip("/")
+
+
+def _link_target(member: tarfile.TarInfo, key: str) -> str:
+    if member.islnk():
+        return _member_key(member.linkname)
+    return posixpath.normpath(posixpath.join(posixpath.dirname(key), member.linkname))
+
+
+def stream_upload(s3, bucket: str, stream, prefix: str = "", remote: dict | None = None,
+                  base_prefix: str = "", base_bucket: str | None = None,
+                  concurrency: int = DEFAULT_CONCURRENCY, policy: TransferPolicy | None = None,
+                  compression: dict | None = None, cache_policy: CachePolicy | None = None,
+                  on_done: Callable[[UploadJob], None] | None = None, cache_tar=None) -> StreamResult:
+    """Upload the files of the tar `stream` under `prefix` while it is still being read.
+
+    Files matching `remote` (the state under `base_prefix`) are copied
+    server-side; `cache_tar` receives every file for the build cache.
+    """
+    policy = policy or TransferPolicy()
+    cache_policy = cache_policy or CachePolicy()
+    remote = remote or {}
+    result = StreamResult()
+    report = result.report
+    lock = threading.Lock()
+    spool = min(SPOOL_MB * MB, policy.memory // 4)
+    by_key: dict[str, UploadJob] = {}
+    spilled, links, deferred = [], [], []
+
+    def _finish(job: UploadJob, err: Exception | None):
+        with lock:
+            if err is None and job.copy_source:
+                report.copied += 1
+            elif err is None:
+                report.uploaded += 1
+                report.bytes += job.size
+            else:
+                report.failed[job.key] = str(err)
+        if on_done:
+            on_done(job)
+
+    def _prepare(job: UploadJob):
+        raw = len(job.body)
+        job.body, encoding = compress_body(job.key, job.body, compression)
+        job.size = len(job.body)
+        if encoding:
+            job.extra_args = {**job.extra_args, "ContentEncoding": encoding}
+            with lock:
+                result.compressed += 1
+                result.saved += raw - job.size
+        job.md5 = hashlib.md5(job.body).hexdigest()
+        if split_changed([job], remote)[1]:
+            job.copy_source = base_prefix + job.key
+            job.copy_bucket = base_bucket or ""
+            with lock:
+                result.unchanged += 1
+                result.unchanged_bytes += job.size
+
+    def _send(job: UploadJob, reserved: int):
+        err = None
+        try:
+            _prepare(job)
+            _upload_one(s3, bucket, job, policy, prefix)
+        except Exception as e:
+            err = e
+        finally:
+            job.body = None
+            policy.release(reserved)
+        _finish(job, err)
+
+    def _stage(jobs: list[UploadJob]):
+        if not jobs:
+            return
+        if report.failed:
+            for job in jobs:
+                report.failed[job.key] = "skipped: earlier uploads failed"
+                if on_done:
+                    on_done(job)
+            return
+        done = upload_jobs(s3, bucket, jobs, concurrency, on_done, policy, prefix)
+        report.uploaded += done.uploaded
+        report.bytes += done.bytes
+        report.copied += done.copied
+        report.failed.update(done.failed)
+
+    spill_dir = Path(tempfile.mkdtemp(prefix="minfy-stream-"))
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool, \
+                tarfile.open(fileobj=stream, mode="r|") as tar:
+            for member in tar:
+                key = _member_key(member.name)
+                if not key or member.isdir():
+                    continue
+                if member.islnk() or member.issym():
+                    links.append((key, _link_target(member, key)))
+                    continue
+                if not member.isfile():
+                    continue
+                src = tar.extractfile(member)
+                if member.size <= spool:
+                    # blocks while too many bytes are waiting for an upload worker
+                    policy.acquire(member.size)
+                    job = UploadJob(key, Path(key), member.size, {"ContentType": content_type(key)},
+                                    body=src.read())
+                else:
+                    path = spill_dir / key
+                    path.parent.mkdir(parents=True, exist_ok=True)
+                    with open(path, "wb") as dst:
+                        shutil.copyfileobj(src, dst)
+                    job = UploadJob(key, path, member.size, {"ContentType": content_type(key)})
+                if cache_tar is not None:
+                    member.name = key
+                    with (io.BytesIO(job.body) if job.body is not None else open(job.path, "rb")) as fh:
+                        cache_tar.addfile(member, fh)
+                cache_policy.apply([job])
+                by_key[key] = job
+                result.jobs.append(job)
+                if job.body is None:
+                    spilled.append(job)
+                elif _is_deferred(key):
+                    # entry HTML is held back until every asset is up; it is small, so not budgeted
+                    policy.release(member.size)
+                    deferred.append(job)
+                    if result.index_key is None or key.count("/") < result.index_key.count("/"):
+                        result.index_key, result.index_html = key, job.body
+                else:
+                    pool.submit(_send, job, member.size)
+
+        result.saved += compress_jobs(spilled, compression).saved
+        result.compressed += sum("ContentEncoding" in j.extra_args for j in spilled)
+        hash_jobs(spilled, concurrency)
+        for job in split_changed(spilled, remote)[1]:
+            job.copy_source = base_prefix + job.key
+            job.copy_bucket = base_bucket or ""
+            result.unchanged += 1
+            result.unchanged_bytes += job.size
+        _stage(spilled)
+
+        copies = []
+        for key, target in links:
+            source = by_key.get(target)
+            if source is None:
+                continue  # dangling or pointing outside the output, as with a copied folder
+            if cache_tar is not None:
+                entry = tarfile.TarInfo(key)
+                entry.type, entry.linkname = tarfile.LNKTYPE, target
+                cache_tar.addfile(entry)
+            job = UploadJob(key, source.path, source.size, dict(source.extra_args), source.md5)
+            if source.body is not None:
+                job.body = source.body
+                deferred.append(job)
+            else:
+                job.copy_source = prefix + target
+                copies.append(job)
+            result.jobs.append(job)
+        _stage(copies)
+
+        for job in deferred:
+            _prepare(job)
+        _stage(deferred)
+    finally:
+        shutil.rmtree(spill_dir, ignore_errors=True)
+    return result
@@ -0,0 +1,222 @@
+"""
+Concurrent S3 upload engine used by `minfy deploy`.
+
+Files are pushed through a bounded thread pool that shares a single
+connection-pooled client. HTML entry points (`index.html`) are always sent
+last, so a deploy that fails half-way never serves new HTML pointing at
+chunks that were not uploaded. Jobs with a `copy_source` are copied
+server-side (from `copy_bucket`, or within the bucket) instead of being uploaded,
+and jobs with a `body` are sent from memory rather than from `path`.
+"""
+import math
+import mimetypes
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable
+
+from boto3.s3.transfer import TransferConfig
+
+DEFAULT_CONCURRENCY = 16
+MAX_ATTEMPTS = 3
+DEFERRED_NAMES = ("index.html",)
+
+for _ext, _type in ((".mjs", "text/javascript"), (".map", "application/json"),
+                   (".webmanifest", "application/manifest+json"), (".wasm", "application/wasm")):
+    mimetypes.add_type(_type, _ext)
+
+MB = 1024 * 1024
+MIN_PART_SIZE = 8 * MB
+MAX_PART_SIZE = 5 * 1024 * MB
+MAX_PARTS = 10_000
+DEFAULT_TRANSFER = {
+    "multipart_threshold_mb": 16,
+    "max_part_concurrency": 8,
+    "max_memory_mb": 256,
+    "target_parts": 1000,
+}
+
+
+@dataclass
+class UploadJob:
+    key: str
+    path: Path
+    size: int = 0
+    extra_args: dict = field(default_factory=dict)
+    md5: str = ""
+    copy_source: str = ""
+    copy_bucket: str = ""  # defaults to the destination bucket
+    body: bytes | None = None
+
+
+@dataclass
+class UploadReport:
+    uploaded: int = 0
+    bytes: int = 0
+    copied: int = 0
+    failed: dict[str, str] = field(default_factory=dict)
+
+    @property
+    def ok(self) -> bool:
+        return not self.failed
+
+
+def content_type(name: str) -> str:
+    return mimetypes.guess_type(name)[0] or "application/octet-stream"
+
+
+class TransferPolicy:
+    """
+    Picks a boto3 TransferConfig per file.
+
+    Small files go up in a single PUT without spawning transfer threads (the
+    worker pool already provides the parallelism). Files above the multipart
+    threshold get a part size scaled to the file so the part count stays near
+    `target_parts`, and every large upload reserves its in-flight buffer
+    (`part_size * part_concurrency`) against a shared `max_memory_mb` budget.
+    """
+
+    def __init__(self, settings: dict | None = None):
+        cfg = {**DEFAULT_TRANSFER, **(settings or {})}
+        self.threshold = int(cfg["multipart_threshold_mb"] * MB)
+        self.part_concurrency = max(1, int(cfg["max_part_concurrency"]))
+        self.memory = max(MIN_PART_SIZE, int(cfg["max_memory_mb"] * MB))
+        self.target_parts = max(1, int(cfg["target_parts"]))
+        self._small = TransferConfig(multipart_threshold=MAX_PART_SIZE, use_threads=False)
+        self._budget = self.memory
+        self._cond = threading.Condition()
+
+    def part_size(self, size: int) -> int:
+        wanted = max(math.ceil(size / self.target_parts), math.ceil(size / MAX_PARTS), MIN_PART_SIZE)
+        return min(MAX_PART_SIZE, math.ceil(wanted / MB) * MB)
+
+    def plan(self, size: int) -> tuple[TransferConfig, int]:
+        """Return the TransferConfig for a file and the buffer bytes it must reserve."""
+        if size < self.threshold:
+            return self._small, 0
+        part = self.part_size(size)
+        if part > self.memory:
+            # more, smaller parts than `target_parts` rather than a buffer over the budget
+            part = max(MIN_PART_SIZE, math.ceil(size / MAX_PARTS / MB) * MB, self.memory // MB * MB)
+            if part > self.memory:
+                # a file this big can't be sent in MAX_PARTS parts that fit; one part has to
+                self._raise_budget(part)
+        parts = min(self.part_concurrency, max(1, self.memory // part), math.ceil(size / part))
+        config = TransferConfig(
+            multipart_threshold=self.threshold,
+            multipart_chunksize=part,
+            max_concurrency=parts,
+        )
+        # s3transfer buffers this many parts per upload; keep it in line with the budget
+        config.max_in_memory_upload_chunks = parts
+        return config, part * parts
+
+    def _raise_budget(self, memory: int):
+        with self._cond:
+            if memory > self.memory:
+                self._budget += memory - self.memory
+                self.memory = memory
+                self._cond.notify_all()
+
+    def acquire(self, nbytes: int):
+        if not nbytes:
+            return
+        with self._cond:
+            self._cond.wait_for(lambda: self._budget >= nbytes)
+            self._budget -= nbytes
+
+    def release(self, nbytes: int):
+        if not nbytes:
+            return
+        with self._cond:
+            self._budget += nbytes
+            self._cond.notify_all()
+
+
+def jobs_for_directory(source: Path) -> list[UploadJob]:
+    jobs = []
+    for f in source.rglob("*"):
+        if not f.is_file():
+            continue
+        jobs.append(UploadJob(
+            key=f.relative_to(source).as_posix(),
+            path=f,
+            size=f.stat().st_size,
+            extra_args={"ContentType": content_type(f.name)},
+        ))
+    return jobs
+
+
+def _is_deferred(key: str) -> bool:
+    return key.rsplit("/", 1)[-1] in DEFERRED_NAMES
+
+
+def _upload_one(s3, bucket: str, job: UploadJob, policy: TransferPolicy, prefix: str):
+    config, reserve = policy.plan(job.size)
+    if job.copy_source or job.body is not None:
+        reserve = 0  # server-side copies buffer nothing, in-memory bodies are already accounted for
+    policy.acquire(reserve)
+    try:
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            try:
+                if job.copy_source:
+                    s3.copy({"Bucket": job.copy_bucket or bucket, "Key": job.copy_source}, bucket,
+                            prefix + job.key, Config=config)
+                elif job.body is not None:
+                    s3.put_object(Bucket=bucket, Key=prefix + job.key, Body=job.body, **job.extra_args)
+                else:
+                    s3.upload_file(str(job.path), bucket, prefix + job.key,
+                                   ExtraArgs=job.extra_args, Config=config)
+                return
+            except Exception:
+                if attempt == MAX_ATTEMPTS:
+                    raise
+                time.sleep(0.5 * 2 ** (attempt - 1) + random.uniform(0, 0.25))
+    finally:
+        policy.release(reserve)
+
+
+def _run(s3, bucket: str, jobs: list[UploadJob], concurrency: int, policy: TransferPolicy,
+         prefix: str, report: UploadReport, on_done: Callable[[UploadJob], None] | None):
+    if not jobs:
+        return
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        futures = {pool.submit(_upload_one, s3, bucket, job, policy, prefix): job for job in jobs}
+        for fut in as_completed(futures):
+            job = futures[fut]
+            err = fut.exception()
+            if err is None and job.copy_source:
+                report.copied += 1
+            elif err is None:
+                report.uploaded += 1
+                report.bytes += job.size
+            else:
+                report.failed[job.key] = str(err)
+            if on_done:
+                on_done(job)
+
+
+def upload_jobs(s3, bucket: str, jobs: list[UploadJob],
+                concurrency: int = DEFAULT_CONCURRENCY,
+                on_done: Callable[[UploadJob], None] | None = None,
+                policy: TransferPolicy | None = None, prefix: str = "") -> UploadReport:
+    """Upload `jobs` under `prefix`; entry-point HTML goes last and only if everything else succeeded."""
+    policy = policy or TransferPolicy()
+    report = UploadReport()
+    assets = sorted((j for j in jobs if not _is_deferred(j.key)),
+                    key=lambda j: j.size, reverse=True)
+    nested = [j for j in jobs if _is_deferred(j.key) and "/" in j.key]
+    root = [j for j in jobs if _is_deferred(j.key) and "/" not in j.key]
+
+    for stage in (assets, nested, root):
+        if report.failed:
+            for job in stage:
+                report.failed[job.key] = "skipped: earlier uploads failed"
+                if on_done:
+                    on_done(job)
+            continue
+        _run(s3, bucket, stage, concurrency, policy, prefix, report, on_done)
+    return report
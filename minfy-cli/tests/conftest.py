@@ -0,0 +1,35 @@
+import boto3
+import pytest
+from moto import mock_aws
+
+REGION = "ap-south-1"
+
+
+@pytest.fixture
+def aws_env(monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", REGION)
+    monkeypatch.delenv("AWS_PROFILE", raising=False)
+    monkeypatch.delenv("MINFY_ENDPOINT_URL", raising=False)
+
+
+@pytest.fixture
+def s3(aws_env):
+    with mock_aws():
+        client = boto3.client("s3", region_name=REGION)
+        client.create_bucket(Bucket="minfy-test",
+                             CreateBucketConfiguration={"LocationConstraint": REGION})
+        yield client
+
+
+def make_files(root, count: int, size: int) -> list:
+    """`count` files of `size` bytes spread over a few folders, like a bundler's output."""
+    from minfy.upload import jobs_for_directory
+
+    for i in range(count):
+        path = root / f"assets/chunk-{i % 8}" / f"file-{i}.js"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(bytes([i % 251]) * size)
+    (root / "index.html").write_text("<html></html>")
+    return jobs_for_directory(root)
@@ -0,0 +1,35 @@
+import boto3
+import pytest
+from moto import mock_aws
+
+from minfy import aws
+from minfy.aws import website_url
+from minfy.config import AWSAuth, save_global
+from minfy.commands.deploy import ensure_bucket_exists
+
+
+@pytest.mark.parametrize("region", ["us-east-1", "ap-south-1", "eu-west-1"])
+def test_bucket_created_in_any_region(aws_env, region):
+    with mock_aws():
+        s3 = boto3.client("s3", region_name=region)
+        ensure_bucket_exists(s3, "minfy-dev-app", region)
+        location = s3.get_bucket_location(Bucket="minfy-dev-app")["LocationConstraint"]
+        assert (location or "us-east-1") == region
+        assert s3.get_bucket_website(Bucket="minfy-dev-app")["IndexDocument"]["Suffix"] == "index.html"
+
+
+def test_website_url_forms():
+    assert website_url("b", "us-east-1") == "http://b.s3-website-us-east-1.amazonaws.com"
+    assert website_url("b", "eu-west-1") == "http://b.s3-website-eu-west-1.amazonaws.com"
+    assert website_url("b", "ap-south-1") == "http://b.s3-website.ap-south-1.amazonaws.com"
+
+
+def test_region_env_overrides_saved_config(aws_env, monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(aws, "_session", None)
+    monkeypatch.delenv("AWS_DEFAULT_REGION")
+    save_global(AWSAuth(aws_access_key_id="k", aws_secret_access_key="s", region="eu-west-1"))
+    assert aws.region() == "eu-west-1"
+    monkeypatch.setenv("AWS_REGION", "us-west-2")
+    assert aws.region() == "us-west-2"
+    assert aws.session().region_name == "us-west-2"
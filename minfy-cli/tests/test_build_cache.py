@@ -0,0 +1,91 @@
+import json
+import os
+import subprocess
+import time
+
+import pytest
+
+from minfy import build_cache
+from minfy.build_cache import BuildCache, build_key
+
+
+def _git(repo, *args):
+    subprocess.run(["git", "-C", str(repo), *args], check=True, capture_output=True)
+
+
+def _write(repo, path: str, content):
+    target = repo / path
+    target.parent.mkdir(parents=True, exist_ok=True)
+    target.write_text(json.dumps(content) if isinstance(content, dict) else content)
+
+
+def _commit(repo, message="change"):
+    _git(repo, "add", "-A")
+    _git(repo, "-c", "user.name=t", "-c", "user.email=t@t", "commit", "-qm", message)
+
+
+@pytest.fixture
+def monorepo(tmp_path):
+    repo = tmp_path / "repo"
+    repo.mkdir()
+    _git(repo, "init", "-q")
+    _write(repo, "pnpm-workspace.yaml", "packages: ['apps/*', 'packages/*']\n")
+    _write(repo, "pnpm-lock.yaml", "lockfileVersion: 9\n")
+    _write(repo, "apps/web/package.json", {"name": "web", "dependencies": {"@x/ui": "workspace:*"}})
+    _write(repo, "apps/web/src/main.js", "import '@x/ui';\n")
+    _write(repo, "packages/ui/package.json", {"name": "@x/ui"})
+    _write(repo, "packages/ui/index.js", "export const a = 1;\n")
+    _write(repo, "packages/unused/package.json", {"name": "@x/unused"})
+    _commit(repo, "init")
+    return repo
+
+
+def _key(repo, plan=None):
+    info = {"local_path": str(repo), "app_subdir": "apps/web"}
+    return build_key(info, plan or {"output_dir": "dist", "build_cmd": "npm run build"}, {}, False)
+
+
+def test_workspace_dependency_changes_the_key(monorepo):
+    before = _key(monorepo)
+    _write(monorepo, "packages/ui/index.js", "export const a = 2;\n")
+    assert _key(monorepo) is None  # uncommitted changes are never cached
+    _commit(monorepo)
+    assert _key(monorepo) not in (None, before)
+
+
+def test_root_lockfile_changes_the_key(monorepo):
+    before = _key(monorepo)
+    _write(monorepo, "pnpm-lock.yaml", "lockfileVersion: 9\n# bumped\n")
+    _commit(monorepo)
+    assert _key(monorepo) != before
+
+
+def test_unrelated_changes_keep_the_key(monorepo):
+    before = _key(monorepo)
+    _write(monorepo, "packages/unused/index.js", "x\n")
+    _commit(monorepo)
+    assert _key(monorepo) == before
+    plan = {"output_dir": "dist", "build_cmd": "npm run build", "transfer": {"max_memory_mb": 64},
+            "compression": {"brotli": True}}
+    assert _key(monorepo, plan) == before
+
+
+def test_entries_in_use_are_not_evicted(tmp_path, monkeypatch):
+    root = tmp_path / "cache"
+    monkeypatch.setattr(build_cache, "CACHE_DIR", root)
+    monkeypatch.setattr(build_cache, "LOCK_FILE", root / "cache.lock")
+    site = tmp_path / "dist"
+    site.mkdir()
+    (site / "index.html").write_text("<html></html>")
+    cache = BuildCache({"max_entries": 1})
+    cache.store("a", site)
+    in_use = cache.lookup("a")
+    cache.store("b", site)
+    # another deploy is still uploading from "a", which was used moments ago
+    assert (in_use / "index.html").exists()
+
+    past = time.time() - 2 * build_cache.EVICT_MIN_AGE
+    os.utime(root / "a.tar.gz", (past, past))
+    cache.store("c", site)
+    assert not in_use.exists() and cache.lookup("a") is None
+    assert cache.lookup("b") and cache.lookup("c")
@@ -0,0 +1,48 @@
+import json
+
+import pytest
+from click.testing import CliRunner
+from moto import mock_aws
+
+from minfy import aws
+from minfy.commands.cleanup import cleanup_cmd
+
+REPO = "https://github.com/acme/shop.git"
+
+
+@pytest.fixture
+def project(aws_env, monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(aws, "_session", None)
+    monkeypatch.setattr(aws, "_clients", {})
+    (tmp_path / ".minfy.json").write_text(json.dumps(
+        {"repo": REPO, "local_path": str(tmp_path), "app_subdir": "web", "current_env": "dev"}))
+    with mock_aws():
+        s3 = aws.client("s3")
+        s3.create_bucket(Bucket="minfy-dev-shop-web", **aws.bucket_location(aws.region()))
+        yield s3
+
+
+def _buckets(s3):
+    return sorted(b["Name"] for b in s3.list_buckets()["Buckets"])
+
+
+def test_without_a_terminal_cleanup_needs_yes(project):
+    result = CliRunner().invoke(cleanup_cmd, [])
+    assert result.exit_code == 1 and "--yes" in result.output
+    assert _buckets(project) == ["minfy-dev-shop-web"]
+
+    result = CliRunner().invoke(cleanup_cmd, ["--yes"])
+    assert result.exit_code == 0, result.output
+    assert _buckets(project) == []
+
+
+def test_buckets_of_every_monorepo_app_are_removed(project, tmp_path):
+    (tmp_path / "build.json").write_text(json.dumps({"apps": {"web": {}, "admin": {}, "docs": {}}}))
+    location = aws.bucket_location(aws.region())
+    for name in ("minfy-prod-shop-web", "minfy-dev-shop-admin", "minfy-staging-shop-docs",
+                 "minfy-dev-other-web"):
+        project.create_bucket(Bucket=name, **location)
+    result = CliRunner().invoke(cleanup_cmd, ["--yes"])
+    assert result.exit_code == 0, result.output
+    assert _buckets(project) == ["minfy-dev-other-web"]
@@ -0,0 +1,52 @@
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from minfy import compress
+from minfy.upload import jobs_for_directory
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    root = tmp_path / "cache"
+    monkeypatch.setattr(compress, "CACHE_DIR", root)
+    monkeypatch.setattr(compress, "INDEX_FILE", root / "index.json")
+    monkeypatch.setattr(compress, "LOCK_FILE", root / "index.lock")
+    return root
+
+
+def _site(root, name: str, count: int):
+    for i in range(count):
+        path = root / name / f"{i}.js"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(f"console.log('{name}-{i}');\n" * 200)
+    return jobs_for_directory(root / name)
+
+
+def test_concurrent_runs_keep_every_index_entry(cache, tmp_path):
+    sites = [_site(tmp_path, f"app{n}", 5) for n in range(4)]
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        list(pool.map(compress.compress_jobs, sites))
+    index = json.loads((cache / "index.json").read_text())
+    assert len(index) == 20
+    assert not list(cache.glob("*.tmp"))
+    again = compress.compress_jobs(_site(tmp_path, "app0", 5))
+    assert again.cached == 5 and again.compressed == 0
+
+
+def test_recent_blobs_are_not_evicted(cache, tmp_path):
+    compress.compress_jobs(_site(tmp_path, "old", 3))
+    old_blobs = list(cache.glob("*.gz"))
+    for blob in old_blobs:
+        past = time.time() - 2 * compress.EVICT_MIN_AGE
+        os.utime(blob, (past, past))
+    # a limit of 0 would evict everything that is allowed to go
+    compress.compress_jobs(_site(tmp_path, "new", 3), {"cache_mb": 0})
+    left = set(cache.glob("*.gz"))
+    assert not left & set(old_blobs)
+    assert len(left) == 3
+    index = json.loads((cache / "index.json").read_text())
+    assert len(index) == 3
@@ -0,0 +1,34 @@
+import shutil
+
+from minfy.commands.deploy import _inject_env_into_dockerfile
+
+
+def _inject(tmp_path, text: str) -> list[str]:
+    src = tmp_path / "Dockerfile.build"
+    src.write_text(text)
+    out = _inject_env_into_dockerfile(src, ["API_URL"])
+    try:
+        return out.read_text().splitlines()
+    finally:
+        shutil.rmtree(out.parent)
+
+
+def test_injected_after_single_line_install(tmp_path):
+    lines = _inject(tmp_path, "FROM node:20 AS build\nCOPY package*.json ./\nRUN npm ci\nCOPY . .\nRUN npm run build\n")
+    assert lines[3:5] == ["ARG API_URL", "ENV API_URL=$API_URL"]
+    assert lines[2] == "RUN npm ci"
+
+
+def test_injected_after_continued_install(tmp_path):
+    lines = _inject(tmp_path, "FROM node:20 AS build\nCOPY package*.json ./\n"
+                              "RUN npm ci && \\\n    # keep the image small\n    npm cache clean --force\n"
+                              "COPY . .\nRUN npm run build")
+    at = lines.index("ARG API_URL")
+    assert lines[at - 1] == "    npm cache clean --force"
+    assert lines[at + 2] == "COPY . ."
+    assert lines[-1] == "RUN npm run build"
+
+
+def test_install_on_a_continuation_line_is_found(tmp_path):
+    lines = _inject(tmp_path, "FROM node:20 AS build\nRUN apk add git && \\\n    npm ci\nCOPY . .\n")
+    assert lines.index("ARG API_URL") == 3
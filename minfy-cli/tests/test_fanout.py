@@ -0,0 +1,59 @@
+"""--envs fan-out: followers of a Docker build copy the leader's release and never touch Docker."""
+import contextlib
+import io
+import tarfile
+
+import pytest
+from moto import mock_aws
+
+from minfy import aws
+from minfy.commands import deploy
+from minfy.stream import ContainerOutput
+
+
+@pytest.fixture
+def moto_clients(aws_env, monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(aws, "_session", None)
+    monkeypatch.setattr(aws, "_clients", {})
+    with mock_aws():
+        yield
+
+
+def _container_tar(files: dict[str, bytes]):
+    def _fake(image, path):
+        buf = io.BytesIO()
+        with tarfile.open(fileobj=buf, mode="w") as tar:
+            for name, data in files.items():
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                tar.addfile(info, io.BytesIO(data))
+        buf.seek(0)
+        return contextlib.nullcontext(buf)
+    return _fake
+
+
+def test_follower_copies_leader_release_without_docker(moto_clients, monkeypatch, tmp_path):
+    html = b"<html><head><script src='/assets/app.js'></script></head>" + b"<p>hi</p>" * 500 + b"</html>"
+    files = {"index.html": html, "assets/app.js": b"console.log(1);" * 200, "sw.js": b"self.x=1"}
+    monkeypatch.setattr(deploy, "container_tar", _container_tar(files))
+    info = {"local_path": str(tmp_path), "app_subdir": "web", "repo": "https://x/site.git"}
+    plan = {"builder": "vite", "build_cache": {"enabled": False}}
+    output = ContainerOutput("sha256:abc", "/static")
+
+    leader = deploy.publish_app({**info, "current_env": "dev"}, plan, output)
+
+    def _no_docker(*args, **kwargs):
+        raise AssertionError("follower touched the build image")
+    monkeypatch.setattr(deploy, "container_tar", _no_docker)
+    follower = deploy.publish_app({**info, "current_env": "prod"}, plan, output,
+                                  seed=(leader.bucket, leader.prefix))
+
+    s3 = aws.client("s3")
+    keys = {o["Key"] for o in s3.list_objects_v2(Bucket=follower.bucket, Prefix=follower.prefix)["Contents"]}
+    assert {follower.prefix + k for k in files} <= keys
+    assert follower.prefix + deploy.MANIFEST_KEY in keys
+    assert follower.report.copied == len(files)
+    entry = s3.get_object(Bucket=follower.bucket, Key=follower.prefix + deploy.ENTRY_KEY)
+    body = deploy.decompress_body(entry["Body"].read(), entry.get("ContentEncoding"))
+    assert f"/{follower.prefix}assets/app.js".encode() in body
@@ -0,0 +1,101 @@
+"""GrafanaClient against a local stub: keep-alive reuse, skipped re-imports, no resent POSTs."""
+import http.client
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from minfy.grafana import GrafanaClient
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def _reply(self, status: int, body: dict):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _handle(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        self.rfile.read(length)
+        with self.server.lock:
+            self.server.requests.append((self.command, self.path))
+            drop = self.server.drop > 0
+            self.server.drop -= drop
+        if drop:
+            # close without answering, as a restarting Grafana would
+            self.close_connection = True
+            return
+        if self.path.startswith("/api/datasources/name/"):
+            self._reply(404, {"message": "Data source not found"})
+        elif self.path == "/api/datasources":
+            self._reply(200, {"datasource": {"uid": "ds1"}})
+        else:
+            self._reply(200, {"status": "success"})
+
+    do_GET = do_POST = do_PUT = _handle
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def grafana():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    server.lock = threading.Lock()
+    server.connections = 0
+    server.requests = []
+    server.drop = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _posts(server):
+    return [path for method, path in server.requests if method == "POST"]
+
+
+def test_one_connection_and_unchanged_dashboards_are_skipped(grafana, tmp_path):
+    state = tmp_path / "grafana.json"
+    dashboards = {f"d{i}": {"uid": f"d{i}", "title": f"D{i}", "panels": []} for i in range(5)}
+    client = GrafanaClient(grafana.url, state_file=state)
+    assert client.ensure_datasource({"name": "minfy", "type": "prometheus"}) == ("ds1", True)
+    assert all(client.import_dashboard(d) for d in dashboards.values())
+    client.save_state()
+    client.close()
+    assert grafana.connections == 1
+    assert len(grafana.requests) == 7 and len(_posts(grafana)) == 6
+
+    again = GrafanaClient(grafana.url, state_file=state)
+    assert again.ensure_datasource({"name": "minfy", "type": "prometheus"}) == ("ds1", False)
+    assert set(again.import_dashboards(dashboards, workers=1).values()) == {"unchanged"}
+    assert again.import_dashboard(dashboards["d0"]) is False
+    assert len(grafana.requests) == 7
+    assert grafana.connections == 1
+
+
+def test_post_is_not_resent_after_a_dropped_connection(grafana):
+    client = GrafanaClient(grafana.url)
+    grafana.drop = 1
+    with pytest.raises((http.client.HTTPException, OSError)):
+        client.import_dashboard({"uid": "d", "title": "D"})
+    assert _posts(grafana) == ["/api/dashboards/db"]
+
+
+def test_get_is_retried_once_after_a_dropped_connection(grafana):
+    client = GrafanaClient(grafana.url)
+    grafana.drop = 1
+    assert client.request("GET", "/api/health") == {"status": "success"}
+    assert grafana.requests == [("GET", "/api/health")] * 2
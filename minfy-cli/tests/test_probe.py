@@ -0,0 +1,92 @@
+"""The latency prober against a local HTTP server and a closed port."""
+import asyncio
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from click.testing import CliRunner
+
+from minfy import probe
+from minfy.commands.monitor import monitor_grp
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = b"hello" * 100
+        self.send_response(200 if self.path == "/" else 404)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def site():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def _closed_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_probe_once_times_every_phase(site):
+    timing = asyncio.run(probe.probe_once(site + "/", 5))
+    assert timing.ok and timing.status == 200 and not timing.error
+    assert timing.tls is None
+    assert 0 <= timing.dns <= timing.total and 0 <= timing.connect <= timing.total
+    assert 0 < timing.ttfb <= timing.total
+
+    missing = asyncio.run(probe.probe_once(site + "/missing", 5))
+    assert missing.status == 404 and not missing.ok
+
+
+def test_probe_once_records_a_refused_connection():
+    timing = asyncio.run(probe.probe_once(f"http://127.0.0.1:{_closed_port()}/", 5))
+    assert not timing.ok and timing.error
+    assert timing.dns is not None and timing.connect is None and timing.total is None
+
+
+def test_quantile_interpolates_inside_the_bucket():
+    hist = probe.Histogram((0.1, 0.2, 0.4))
+    assert hist.quantile(0.5) is None
+    for value in (0.05, 0.15, 0.15, 0.3):
+        hist.observe(value)
+    assert hist.cumulative() == [1, 3, 4, 4]
+    assert hist.quantile(0.25) == pytest.approx(0.1)
+    assert hist.quantile(0.5) == pytest.approx(0.15)
+    assert hist.quantile(1.0) == pytest.approx(0.4)
+    hist.observe(9)
+    assert hist.counts[-1] == 1 and hist.quantile(1.0) == 0.4
+
+
+def test_render_exposes_cumulative_buckets_and_results(site):
+    ok, down = probe.Target("ok", site + "/"), probe.Target("down", f"http://127.0.0.1:{_closed_port()}/")
+    asyncio.run(probe.run([ok, down], interval=0.1, timeout=0.1, rounds=2))
+    text = probe.render([ok, down])
+    labels = f'target="ok",url="{site}/",phase="total"'
+    assert f'minfy_probe_duration_seconds_bucket{{{labels},le="+Inf"}} 2' in text
+    assert f"minfy_probe_duration_seconds_count{{{labels}}} 2" in text
+    buckets = [int(line.rsplit(" ", 1)[1]) for line in text.splitlines()
+               if line.startswith(f"minfy_probe_duration_seconds_bucket{{{labels},")]
+    assert len(buckets) == len(probe.BUCKETS) + 1 and buckets == sorted(buckets)
+    assert f'minfy_probes_total{{target="ok",url="{site}/",result="success"}} 2' in text
+    assert f'minfy_probes_total{{target="down",url="{down.url}",result="failure"}} 2' in text
+    assert f'minfy_probe_success{{target="ok",url="{site}/"}} 1' in text
+    assert f'minfy_probe_success{{target="down",url="{down.url}"}} 0' in text
+    assert f'minfy_probe_http_status{{target="ok",url="{site}/"}} 200' in text
+
+
+def test_timeout_longer_than_interval_is_rejected(site):
+    with pytest.raises(ValueError):
+        asyncio.run(probe.run([probe.Target("ok", site)], interval=1, timeout=2, rounds=1))
+    result = CliRunner().invoke(monitor_grp, ["probe", "--url", site, "--interval", "1", "--timeout", "2"])
+    assert result.exit_code == 1 and "--timeout" in result.output
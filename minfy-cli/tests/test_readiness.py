@@ -0,0 +1,74 @@
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from minfy.readiness import Component, wait_for_stack
+
+
+class _Handler(BaseHTTPRequestHandler):
+    status = 200
+
+    def do_GET(self):
+        self.send_response(self.server.status)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub():
+    """HTTP server on an ephemeral port; set `.status` to change what it answers."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    server.status = 200
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _closed_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_ready_component(stub):
+    component = Component("stub", stub.server_address[1], "/health")
+    [result] = wait_for_stack("127.0.0.1", components=(component,), timeout=5)
+    assert result.ready and result.attempts == 1 and result.seconds is not None
+
+
+def test_never_ready_times_out(stub):
+    stub.status = 503
+    component = Component("stub", stub.server_address[1], "/health")
+    [result] = wait_for_stack("127.0.0.1", components=(component,), timeout=1, base_delay=0.1)
+    assert not result.ready and result.attempts > 1
+    assert "503" in result.error
+
+
+def test_connection_refused(stub):
+    refused = Component("down", _closed_port(), "/health")
+    up = Component("stub", stub.server_address[1], "/health")
+    results = wait_for_stack("127.0.0.1", components=(refused, up), timeout=0.5, base_delay=0.1)
+    by_name = {r.component.name: r for r in results}
+    assert by_name["stub"].ready
+    assert not by_name["down"].ready and by_name["down"].error
+
+
+def test_becomes_ready_after_retries(stub):
+    stub.status = 503
+
+    def _recover():
+        stub.status = 200
+    timer = threading.Timer(0.4, _recover)
+    timer.start()
+    component = Component("stub", stub.server_address[1], "/health")
+    [result] = wait_for_stack("127.0.0.1", components=(component,), timeout=5, base_delay=0.1, max_delay=0.2)
+    timer.cancel()
+    assert result.ready and result.attempts > 1
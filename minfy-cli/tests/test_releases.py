@@ -0,0 +1,80 @@
+from botocore.exceptions import ClientError
+
+from minfy.releases import (ENTRY_KEY, MAX_ROUTING_RULES, MISSING_CODES, activate, release_prefix,
+                            split_entries, write_release_meta)
+
+
+def test_folders_are_redirected_and_root_files_copied():
+    keys = ["index.html", "service-worker.js", "favicon.ico", "about/index.html", "about/team.png",
+            "_next/static/chunk.js", "assets/app.js", "__minfy_manifest.json"]
+    redirected, root_files, overflow = split_entries(keys)
+    assert redirected == ["_next/", "about/", "assets/"]
+    assert root_files == ["favicon.ico", "service-worker.js"]
+    assert overflow == []
+
+
+def test_folders_over_the_rule_limit_are_reported():
+    keys = [f"page{i:03}/index.html" for i in range(60)] + ["big/a.js", "big/b.js"]
+    redirected, root_files, overflow = split_entries(keys)
+    assert len(redirected) == MAX_ROUTING_RULES - len(MISSING_CODES)
+    assert "big/" in redirected  # the largest folders keep their rule
+    assert len(redirected) + len(overflow) == 61
+    assert root_files == []
+
+
+def _release(s3, rid: str, files: dict[str, bytes]):
+    prefix = release_prefix(rid)
+    for key, body in {**files, ENTRY_KEY: f"<html>{rid}</html>".encode()}.items():
+        s3.put_object(Bucket="minfy-test", Key=prefix + key, Body=body)
+    return write_release_meta(s3, "minfy-test", rid, list(files), len(files), 0)
+
+
+def _fetch(s3, path: str) -> tuple[int, bytes, list[str]]:
+    """GET `path` the way the S3 website endpoint serves it; returns (status, body, redirects)."""
+    cfg = s3.get_bucket_website(Bucket="minfy-test")
+    key, redirects = path.lstrip("/"), []
+    for _ in range(5):
+        if not key or key.endswith("/"):
+            key += cfg["IndexDocument"]["Suffix"]
+        try:
+            body, code = s3.get_object(Bucket="minfy-test", Key=key)["Body"].read(), None
+        except ClientError:
+            # the bucket policy grants s3:GetObject only, so S3 denies missing keys
+            body, code = None, "403"
+        for rule in cfg.get("RoutingRules", []):
+            cond = rule["Condition"]
+            if key.startswith(cond.get("KeyPrefixEquals", "")) \
+                    and cond.get("HttpErrorCodeReturnedEquals", code) == code:
+                key = rule["Redirect"]["ReplaceKeyPrefixWith"] + key[len(cond["KeyPrefixEquals"]):]
+                redirects.append(key)
+                break
+        else:
+            if code:
+                error = s3.get_object(Bucket="minfy-test", Key=cfg["ErrorDocument"]["Key"])
+                return int(code), error["Body"].read(), redirects
+            return 200, body, redirects
+    raise AssertionError(f"redirect loop: {redirects}")
+
+
+def test_activate_switches_by_pointer_and_old_tabs_load_missing_chunks(s3):
+    old = "20250101000000-aaaaaa"
+    new = "20250102000000-bbbbbb"
+    _release(s3, old, {"index.html": b"1", "sw.js": b"sw1", "old.txt": b"o", "blog/index.html": b"blog",
+                       "assets/old.js": b"old chunk"})
+    meta = _release(s3, new, {"index.html": b"2", "sw.js": b"sw2", "assets/new.js": b"new chunk"})
+    activate(s3, "minfy-test", old)
+    assert _fetch(s3, "/blog/")[:2] == (200, b"blog")
+
+    activate(s3, "minfy-test", new, meta, fallback=old)
+    keys = {o["Key"] for o in s3.list_objects_v2(Bucket="minfy-test")["Contents"]}
+    assert not {k for k in keys if "/" in k and not k.startswith("releases/")}  # no folder copies
+    assert "old.txt" not in keys
+    assert _fetch(s3, "/sw.js") == (200, b"sw2", [])
+    assert _fetch(s3, "/")[:2] == (200, f"<html>{new}</html>".encode())
+    assert _fetch(s3, "/assets/new.js")[:2] == (200, b"new chunk")
+    # a tab still running the old build asks for a chunk the new release doesn't have
+    status, body, redirects = _fetch(s3, "/assets/old.js")
+    assert (status, body) == (200, b"old chunk")
+    assert redirects == [release_prefix(new) + "assets/old.js", release_prefix(old) + "assets/old.js"]
+    # SPA deep links still get the entry HTML
+    assert _fetch(s3, "/settings/profile")[:2] == (403, f"<html>{new}</html>".encode())
@@ -0,0 +1,65 @@
+"""`minfy --help` must stay cheap: no AWS, rich, yaml or pydantic imports before a command runs."""
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+SRC = Path(__file__).resolve().parents[1] / "src"
+HEAVY = ("boto3", "botocore", "rich", "yaml", "pydantic")
+# on top of a bare interpreter; click and the CLI module take about 35 ms, boto3 alone 250 ms
+STARTUP_BUDGET = 0.1
+SCRIPT = """
+import json, sys
+import minfy.cli
+try:
+    minfy.cli.cli.main(args={args!r}, prog_name="minfy", standalone_mode=False)
+except SystemExit:
+    pass
+print(json.dumps({{"modules": sorted(m for m in sys.modules if m.split(".")[0] in {heavy!r}),
+                   "minfy": sorted(m for m in sys.modules if m.startswith("minfy"))}}))
+"""
+
+
+def _run(args: list[str]) -> dict:
+    env = os.environ | {"PYTHONPATH": str(SRC)}
+    out = subprocess.run([sys.executable, "-c", SCRIPT.format(args=args, heavy=HEAVY)],
+                         capture_output=True, text=True, env=env, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def _wall(code: str) -> float:
+    """Best of a few runs, so a busy machine doesn't fail the test."""
+    env = os.environ | {"PYTHONPATH": str(SRC)}
+    best = float("inf")
+    for _ in range(5):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], capture_output=True, env=env, check=True)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+@pytest.mark.parametrize("args", [["--help"], ["config", "--help"]])
+def test_help_imports_no_heavy_modules(args):
+    assert _run(args)["modules"] == []
+
+
+@pytest.mark.parametrize("args", [["--help"], ["config", "--help"]])
+def test_help_startup_time(args):
+    baseline = _wall("pass")
+    seconds = _wall(f"import minfy.cli; minfy.cli.cli.main(args={args!r}, prog_name='minfy')")
+    assert seconds - baseline < STARTUP_BUDGET, f"{seconds - baseline:.3f}s over a bare interpreter"
+
+
+def test_top_level_help_loads_no_command_module():
+    assert _run(["--help"])["minfy"] == ["minfy", "minfy.cli"]
+
+
+def test_every_command_still_loads():
+    from minfy.cli import COMMANDS, cli
+
+    for name in COMMANDS:
+        assert cli.get_command(None, name) is not None, name
@@ -0,0 +1,33 @@
+import io
+import tarfile
+
+from minfy.delta import load_remote_state, write_manifest
+from minfy.stream import stream_upload
+
+
+def _tar(files: dict[str, bytes]) -> io.BytesIO:
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode="w") as tar:
+        for name, data in files.items():
+            info = tarfile.TarInfo(f"./{name}")
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    buf.seek(0)
+    return buf
+
+
+def test_unchanged_files_and_bytes_are_reported(s3):
+    files = {"index.html": b"<html></html>", "assets/a.js": b"a" * 3000, "assets/b.js": b"b" * 5000}
+    first = stream_upload(s3, "minfy-test", _tar(files), "r1/")
+    assert first.report.ok and first.unchanged == 0
+    write_manifest(s3, "minfy-test", first.jobs, "r1/")
+
+    remote, _ = load_remote_state(s3, "minfy-test", "r1/")
+    second = stream_upload(s3, "minfy-test", _tar({**files, "assets/b.js": b"c" * 5000}), "r2/",
+                           remote, base_prefix="r1/")
+    assert second.report.ok
+    unchanged = [j for j in second.jobs if j.copy_source]
+    assert {j.key for j in unchanged} == {"index.html", "assets/a.js"}
+    assert second.unchanged == 2
+    assert second.unchanged_bytes == sum(j.size for j in unchanged)
+    assert second.index_key == "index.html"
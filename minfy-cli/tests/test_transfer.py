@@ -0,0 +1,105 @@
+"""TransferPolicy: part sizing, the shared memory ceiling and large-object throughput, against moto.
+
+The throughput benchmark runs against a moto server over HTTP and prints MB/s
+(`pytest -s`). Sizes over `MINFY_BENCH_MAX_MB` (default 100) are skipped;
+`MINFY_BENCH_MAX_MB=2048 pytest -s -k large_object` runs the whole range.
+"""
+import os
+import threading
+import time
+
+import pytest
+from moto.server import ThreadedMotoServer
+
+from minfy import aws
+from minfy.upload import MAX_PARTS, MB, TransferPolicy, UploadJob, upload_jobs
+
+BENCH_MAX_MB = int(os.environ.get("MINFY_BENCH_MAX_MB", "100"))
+
+
+class _Tracking(TransferPolicy):
+    """Records the most buffer bytes that were ever reserved at once."""
+
+    def __init__(self, settings):
+        super().__init__(settings)
+        self.in_use = self.peak = 0
+        self._track = threading.Lock()
+
+    def acquire(self, nbytes):
+        super().acquire(nbytes)
+        with self._track:
+            self.in_use += nbytes
+            self.peak = max(self.peak, self.in_use)
+
+    def release(self, nbytes):
+        with self._track:
+            self.in_use -= nbytes
+        super().release(nbytes)
+
+
+def test_concurrent_multipart_uploads_stay_within_budget(s3, tmp_path):
+    policy = _Tracking({"multipart_threshold_mb": 8, "max_part_concurrency": 4, "max_memory_mb": 32})
+    jobs = []
+    for i in range(6):
+        path = tmp_path / f"video-{i}.bin"
+        path.write_bytes(bytes([i]) * (20 * MB))
+        jobs.append(UploadJob(path.name, path, path.stat().st_size))
+    report = upload_jobs(s3, "minfy-test", jobs, concurrency=6, policy=policy)
+    assert report.ok, report.failed
+    assert 0 < policy.peak <= policy.memory == 32 * MB
+    assert policy.in_use == 0
+    head = s3.head_object(Bucket="minfy-test", Key="video-0.bin")
+    assert head["ContentLength"] == 20 * MB and "-" in head["ETag"]  # really multipart
+
+
+def test_part_larger_than_budget_is_shrunk():
+    policy = TransferPolicy({"max_memory_mb": 16, "target_parts": 1000})
+    size = 24 * 1024 * MB  # 24 MB parts at target_parts
+    config, reserve = policy.plan(size)
+    assert config.multipart_chunksize == 16 * MB
+    assert reserve <= policy.memory == 16 * MB
+
+
+def test_budget_raised_when_no_part_fits():
+    policy = TransferPolicy({"max_memory_mb": 16})
+    size = MAX_PARTS * 20 * MB  # needs 20 MB parts even at MAX_PARTS
+    config, reserve = policy.plan(size)
+    assert config.multipart_chunksize >= 20 * MB
+    assert reserve == config.multipart_chunksize <= policy.memory
+    policy.acquire(reserve)  # would block forever if the budget were smaller than the reservation
+    policy.release(reserve)
+
+
+@pytest.fixture(scope="module")
+def moto_server():
+    server = ThreadedMotoServer(ip_address="127.0.0.1", port=0, verbose=False)
+    server.start()
+    host, port = server.get_host_and_port()
+    yield f"http://{host}:{port}"
+    server.stop()
+
+
+@pytest.mark.parametrize("size_mb", [10, 100, 512, 2048])
+def test_large_object_throughput(size_mb, moto_server, aws_env, monkeypatch, tmp_path):
+    if size_mb > BENCH_MAX_MB:
+        pytest.skip(f"{size_mb} MB is over MINFY_BENCH_MAX_MB={BENCH_MAX_MB}")
+    monkeypatch.setenv("MINFY_ENDPOINT_URL", moto_server)
+    monkeypatch.setattr(aws, "_session", None)
+    monkeypatch.setattr(aws, "_clients", {})
+    s3 = aws.client("s3")
+    bucket = f"minfy-bench-{size_mb}"
+    s3.create_bucket(Bucket=bucket, **aws.bucket_location(aws.region()))
+    path = tmp_path / "bundle.wasm"
+    with open(path, "wb") as fh:
+        block = os.urandom(MB)
+        for _ in range(size_mb):
+            fh.write(block)
+    policy = TransferPolicy()
+    start = time.perf_counter()
+    report = upload_jobs(s3, bucket, [UploadJob(path.name, path, size_mb * MB)], policy=policy)
+    elapsed = time.perf_counter() - start
+    assert report.ok, report.failed
+    assert s3.head_object(Bucket=bucket, Key=path.name)["ContentLength"] == size_mb * MB
+    config, _ = policy.plan(size_mb * MB)
+    print(f"\n{size_mb} MB in {elapsed:.2f}s ({size_mb / elapsed:.1f} MB/s, "
+          f"{config.multipart_chunksize // MB} MB parts x {config.max_concurrency})")
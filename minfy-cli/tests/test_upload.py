@@ -0,0 +1,43 @@
+"""Upload engine against moto: correctness and a throughput figure (`pytest -s` to see it)."""
+import os
+import time
+
+from conftest import make_files
+
+from minfy.upload import upload_jobs
+
+BENCH_FILES = int(os.environ.get("MINFY_BENCH_FILES", "200"))
+BENCH_SIZE = int(os.environ.get("MINFY_BENCH_SIZE", str(16 * 1024)))
+
+
+def test_upload_throughput(s3, tmp_path):
+    jobs = make_files(tmp_path, BENCH_FILES, BENCH_SIZE)
+    for concurrency in (1, 16):
+        prefix = f"c{concurrency}/"
+        start = time.perf_counter()
+        report = upload_jobs(s3, "minfy-test", jobs, concurrency=concurrency, prefix=prefix)
+        elapsed = time.perf_counter() - start
+        assert report.ok, report.failed
+        assert report.uploaded == len(jobs)
+        print(f"\nupload_jobs concurrency={concurrency}: {len(jobs)} files, {report.bytes} bytes "
+              f"in {elapsed:.2f}s ({len(jobs) / elapsed:.0f} files/s, "
+              f"{report.bytes / elapsed / 1024 / 1024:.1f} MB/s)")
+    keys = {o["Key"] for o in s3.list_objects_v2(Bucket="minfy-test", Prefix="c16/")["Contents"]}
+    assert keys == {f"c16/{j.key}" for j in jobs}
+
+
+def test_index_html_goes_last(s3, tmp_path):
+    jobs = make_files(tmp_path, 20, 100)
+    order = []
+    upload_jobs(s3, "minfy-test", jobs, concurrency=8, on_done=lambda job: order.append(job.key))
+    assert order[-1] == "index.html"
+
+
+def test_failed_asset_keeps_html_back(s3, tmp_path):
+    jobs = make_files(tmp_path, 5, 100)
+    next(j for j in jobs if j.key != "index.html").path = tmp_path / "missing.js"
+    report = upload_jobs(s3, "minfy-test", jobs, concurrency=4)
+    assert not report.ok
+    assert report.failed["index.html"] == "skipped: earlier uploads failed"
+    keys = {o["Key"] for o in s3.list_objects_v2(Bucket="minfy-test").get("Contents", [])}
+    assert "index.html" not in keys